@@ -6,3 +6,6 @@ from . import test_picking
 from . import test_picking_with_background_data
 from . import test_outbound
 from . import test_outbound_with_background_data
+from . import test_pick_path
+from . import test_empty_locations
+from . import test_package_level
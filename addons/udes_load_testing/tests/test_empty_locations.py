@@ -0,0 +1,67 @@
+# -*- coding: utf-8 -*-
+
+from .common import LoadRunner, parameterized
+from .config import config
+
+
+class EmptyLocations(LoadRunner):
+
+    xlabel = 'Number of Locations'
+
+    def time_setup(self, n):
+        """ Create n putaway locations under the putaway destination, with
+            stock in every other one
+        """
+        Location = self.env['stock.location']
+        parent = self.picking_type_putaway.default_location_dest_id
+
+        for i in range(n):
+            location = Location.create({
+                'name': 'TEST EMPTY LOCATION %0.6i' % i,
+                'barcode': 'LTESTEMPTY%0.6i' % i,
+                'location_id': parent.id,
+            })
+            if i % 2:
+                self.create_quant(self.apple.id, location.id, 1)
+
+    def time_quant_ids_search(self, picking):
+        """ The empty location search before the occupancy was stored """
+        Location = self.env['stock.location']
+        return Location.search([
+            ('id', 'child_of', picking.location_dest_id.id),
+            ('u_blocked', '=', False),
+            ('barcode', '!=', False),
+            ('quant_ids', '=', False),
+        ])
+
+    def time_get_empty_locations(self, picking):
+        return picking.get_empty_locations()
+
+    def _load_test_empty_locations(self, n):
+        Picking = self.env['stock.picking']
+
+        self.time_setup(n)
+        picking = Picking.create({
+            'picking_type_id': self.picking_type_putaway.id,
+            'location_id': self.picking_type_putaway.default_location_src_id.id,
+            'location_dest_id': self.picking_type_putaway.default_location_dest_id.id,
+        })
+        self.assertEqual(self.time_quant_ids_search(picking),
+                         self.time_get_empty_locations(picking))
+
+        self._process_results(
+            n,
+            self.time_setup,
+            self.time_quant_ids_search,
+            self.time_get_empty_locations,
+        )
+
+
+class TestEmptyLocations(EmptyLocations):
+
+    @parameterized.expand(config.TestEmptyLocations or config.default)
+    def test_empty_locations(self, n):
+        self._load_test_empty_locations(n)
+
+    def test_report(self):
+        self._report()
@@ -0,0 +1,61 @@
+# -*- coding: utf-8 -*-
+
+from .common import LoadRunner, parameterized
+from .config import config
+
+
+class PackageLevel(LoadRunner):
+
+    xlabel = 'Number of Packages'
+
+    def time_setup(self, n):
+        """ Create a pick of n packages, each one packed into itself, to
+            be put on a pallet
+        """
+        Package = self.env['stock.quant.package']
+
+        self.picking_type_pick.u_target_storage_format = 'pallet_packages'
+        for i in range(n):
+            package = Package.get_package('TEST LEVEL PACKAGE %0.6i' % i,
+                                          create=True)
+            self.create_quant(self.apple.id, self.test_location_01.id, 1,
+                              package_id=package.id)
+
+        picking = self.create_picking(self.picking_type_pick,
+                                      products_info=[{'product': self.apple,
+                                                      'qty': n}],
+                                      confirm=True,
+                                      assign=True)
+        for ml in picking.move_line_ids:
+            ml.result_package_id = ml.package_id
+        pallet = Package.get_package('TEST LEVEL PALLET', create=True)
+
+        return picking.move_line_ids, pallet
+
+    def time_put_on_pallet(self, mls, pallet):
+        mls.write({'u_result_parent_package_id': pallet.id})
+
+    def time_check_resultant_package_level(self, mls):
+        mls._check_resultant_package_level()
+
+    def _load_test_package_level(self, n):
+        mls, pallet = self.time_setup(n)
+        self.time_put_on_pallet(mls, pallet)
+        self.time_check_resultant_package_level(mls)
+
+        self._process_results(
+            n,
+            self.time_setup,
+            self.time_put_on_pallet,
+            self.time_check_resultant_package_level,
+        )
+
+
+class TestPackageLevel(PackageLevel):
+
+    @parameterized.expand(config.TestPackageLevel or config.default)
+    def test_package_level(self, n):
+        self._load_test_package_level(n)
+
+    def test_report(self):
+        self._report()
@@ -0,0 +1,91 @@
+# -*- coding: utf-8 -*-
+
+import random
+
+from odoo.addons.udes_stock import pick_path
+from .common import LoadRunner, parameterized
+from .config import config
+
+AISLE_LENGTH = 30
+LEVELS = 3
+AISLE_WIDTH = 3
+
+
+class PickPath(LoadRunner):
+
+    xlabel = 'Number of Locations'
+
+    def time_setup(self, n):
+        """ Create n pick locations spread over aisles, named by aisle, bay
+            and level so that name order walks every aisle from the front
+        """
+        Location = self.env['stock.location']
+        rnd = random.Random(n)
+        num_aisles = max(1, n // AISLE_LENGTH)
+        faces = set()
+        while len(faces) < n:
+            faces.add((rnd.randrange(num_aisles),
+                       rnd.randrange(AISLE_LENGTH),
+                       rnd.randrange(LEVELS)))
+
+        locations = Location.browse()
+        for aisle, bay, level in faces:
+            locations |= Location.create({
+                'name': 'PATH-A%02d-%02d-%d' % (aisle, bay, level),
+                'barcode': 'LPATHA%02d%02d%d' % (aisle, bay, level),
+                'location_id': self.stock_location.id,
+                'posx': (aisle + 1) * AISLE_WIDTH,
+                'posy': bay + 1,
+                'posz': level,
+            })
+        return locations
+
+    def time_name_order(self, locations):
+        return locations.sorted(key=lambda l: l.name)
+
+    def time_s_shape(self, locations):
+        return locations.get_pick_path('s_shape')
+
+    def time_largest_gap(self, locations):
+        return locations.get_pick_path('largest_gap')
+
+    def time_nearest_neighbour(self, locations):
+        return locations.get_pick_path('nearest_neighbour')
+
+    def _route_length(self, route):
+        points = {l.id: (l.posx, l.posy, l.posz) for l in route}
+        return pick_path.route_length(route.ids, points)
+
+    def _load_test_pick_path(self, n):
+        """ Time each strategy and record the length of its route next to
+            the length of the route in name order
+        """
+        locations = self.time_setup(n)
+        routes = [
+            ('name_order', self.time_name_order(locations)),
+            ('s_shape', self.time_s_shape(locations)),
+            ('largest_gap', self.time_largest_gap(locations)),
+            ('nearest_neighbour', self.time_nearest_neighbour(locations)),
+        ]
+        for name, route in routes:
+            self.write_line('route_length_%s' % name, n,
+                            self._route_length(route))
+
+        self._process_results(
+            n,
+            self.time_setup,
+            self.time_name_order,
+            self.time_s_shape,
+            self.time_largest_gap,
+            self.time_nearest_neighbour,
+        )
+
+
+class TestPickPath(PickPath):
+
+    @parameterized.expand(config.TestPickPath or config.default)
+    def test_pick_path(self, n):
+        self._load_test_pick_path(n)
+
+    def test_report(self):
+        self._report()
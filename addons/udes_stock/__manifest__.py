@@ -50,6 +50,8 @@
         'views/stock_picking_print_strategy_views.xml',
         'views/stock_quant_views.xml',
         'views/stock_quant_package_views.xml',
+        'views/stock_reservation_stat_views.xml',
+        'views/stock_validation_job_views.xml',
         'views/stock_warehouse.xml',
         'views/create_planned_transfer_asset.xml',
         'views/web.xml',
@@ -1,4 +1,6 @@
 # -*- coding: utf-8 -*-
+from contextlib import contextmanager
+
 from odoo.exceptions import ValidationError
 from odoo.tools.translate import _
 
@@ -14,3 +16,86 @@ def check_many2one_validity(field, obj, id_):
     if not obj.search([('id', '=', id_)]):
         raise ValidationError(_('The %s supplied (%s) is not valid, '
                                 'it does not exist.') % (field, id_))
+
+
+@contextmanager
+def profile_phase(records, profile, phase):
+    """
+    Add the time and number of queries spent in the block to the phase of
+    the profile dictionary, if a profile is given
+    :param records: (recordset) used to collect the statistics
+    :param profile: (dict) mapping phase names to their totals, or None
+    :param phase: (str) name of the phase being profiled
+    """
+    if profile is None:
+        yield
+        return
+
+    with records.statistics() as stats:
+        yield
+    totals = profile.setdefault(phase, {'elapsed': 0.0, 'count': 0})
+    totals['elapsed'] += stats.elapsed
+    totals['count'] += stats.count
+
+
+def with_info_cache(records):
+    """
+    Return records with an info cache in their context, unless they already
+    have one. While the cache is set, the info of each distinct record is
+    only prepared once, see cached_info
+    :param records: (recordset)
+    :return: (recordset)
+    """
+    if records.env.context.get('info_cache') is not None:
+        return records
+    return records.with_context(info_cache={})
+
+
+def cached_info(record, prepare, **kwargs):
+    """
+    Return a copy of the info prepared by prepare(**kwargs) for the record,
+    preparing it only once per record and arguments while an info cache is
+    set in the context, see with_info_cache
+    :param record: (record) singleton the info is prepared for
+    :param prepare: (callable) the _prepare_info method of the record
+    :return: (dict)
+    """
+    cache = record.env.context.get('info_cache')
+    if cache is None:
+        return prepare(**kwargs)
+
+    key = (record._name, record.id, repr(sorted(kwargs.items())))
+    if key not in cache:
+        cache[key] = prepare(**kwargs)
+    return dict(cache[key])
+
+
+def parse_fields_to_fetch(fields_to_fetch):
+    """
+    Split the dotted field paths in fields_to_fetch into the top level
+    fields and the paths to fetch from each of their related records, e.g.
+    ['id', 'moves_lines.product_id.barcode'] gives
+    ({'id', 'moves_lines'}, {'moves_lines': ['product_id.barcode']})
+    A field requested without a path is fetched in full, so it has no
+    nested paths.
+    :param fields_to_fetch: (list) of field paths, or None for all fields
+    :return: (set, dict) the top level fields, or None for all fields,
+        and the nested paths by field
+    """
+    if not fields_to_fetch:
+        return None, {}
+
+    top_level = set()
+    nested = {}
+    full = set()
+    for path in fields_to_fetch:
+        field, _dot, rest = path.partition('.')
+        top_level.add(field)
+        if rest:
+            nested.setdefault(field, []).append(rest)
+        else:
+            full.add(field)
+    for field in full:
+        nested.pop(field, None)
+
+    return top_level, nested
@@ -76,6 +76,26 @@ class Location(UdesApi):
 
         return location.process_perpetual_inventory_request(pi_request)
 
+    @http.route('/api/stock-location-pi-count/bulk/',
+                type='json', methods=['POST'], auth='user')
+    def pi_count_bulk(self, pi_requests):
+        """
+            Process the Perpetual Inventory (PI) count requests of
+            several locations, as /api/stock-location-pi-count/ does
+            for a single location.
+
+            Returns a list with an object per request, in order,
+            with the "location_id", "success" and "error" entries.
+            An invalid request is reported in its object without
+            preventing the other requests from being processed.
+
+            @param pi_requests is a list of JSON objects with the
+            same entries as the pi_request of a PI count request
+        """
+        Location = request.env['stock.location']
+
+        return Location.process_perpetual_inventory_requests(pi_requests)
+
     @http.route('/api/stock-location/block/',
                 type='json', methods=['POST'], auth='user')
     def block(self, reason,
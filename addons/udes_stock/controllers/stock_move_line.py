@@ -26,7 +26,7 @@ class StockMoveLineApi(UdesApi):
 
         for pick in mls.mapped('picking_id'):
             pick_mls = mls.filtered(lambda ml: ml.picking_id == pick)
-            pick_locs = pick.get_suggested_locations(pick_mls)
+            pick_locs = pick.get_suggested_locations(pick_mls, hold=True)
             locations = pick_locs if locations is None \
                         else locations & pick_locs
 
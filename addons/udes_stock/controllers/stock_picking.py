@@ -1,7 +1,9 @@
 # -*- coding: utf-8 -*-
 
-from odoo import http, _
-from odoo.http import request
+import json
+
+from odoo import api, http, models, registry, _
+from odoo.http import Response, request
 from odoo.exceptions import ValidationError
 
 from .main import UdesApi
@@ -14,18 +16,84 @@ class PickingApi(UdesApi):
 
     @http.route('/api/stock-picking/',
                 type='json', methods=['GET'], auth='user')
-    def get_pickings(self, fields_to_fetch=None, **kwargs):
+    def get_pickings(self, fields_to_fetch=None, limit=None, cursor=None,
+                     **kwargs):
         """ Search for pickings by various criteria and return an
             array of stock.picking objects that match a given criteria.
 
             @param fields_to_fetch: Array (string)
                 Subset of the default returned fields to return.
+                Dotted paths restrict the nested info as well, e.g.
+                moves_lines.moves_line_ids.qty_done
+            @param (optional) limit: int
+                Page size. When set, a dictionary is returned instead with
+                the page of pickings and the cursor of the next page:
+                {'pickings': [...], 'next_cursor': string or None}
+            @param (optional) cursor: string
+                Cursor returned with the previous page
         """
         Picking = request.env['stock.picking']
 
-        pickings = Picking.get_pickings(**kwargs)
-
-        return pickings.get_info(fields_to_fetch=fields_to_fetch)
+        if limit is None:
+            pickings = Picking.get_pickings(**kwargs)
+            return pickings.get_info(fields_to_fetch=fields_to_fetch)
+
+        pickings, next_cursor = Picking.get_pickings_page(
+            limit, cursor=cursor, **kwargs)
+
+        return {
+            'pickings': pickings.get_info(fields_to_fetch=fields_to_fetch),
+            'next_cursor': next_cursor,
+        }
+
+    @http.route('/api/stock-picking/stream',
+                type='http', methods=['GET'], auth='user')
+    def stream_pickings(self, params='{}', page_size='100'):
+        """ Search for pickings like get_pickings and stream the info of
+            all the matching pickings as newline delimited JSON, one
+            picking per line.
+
+            @param params: string
+                JSON object with the search criteria of get_pickings and
+                optionally fields_to_fetch
+            @param (optional) page_size: string
+                Number of pickings read from the database at a time
+        """
+        try:
+            kwargs = json.loads(params)
+            page_size = int(page_size)
+        except ValueError:
+            raise ValidationError(_('Invalid stream parameters'))
+        if not isinstance(kwargs, dict):
+            raise ValidationError(_('Invalid stream parameters'))
+        fields_to_fetch = kwargs.pop('fields_to_fetch', None)
+
+        # Validate the criteria before the response starts
+        request.env['stock.picking'].get_pickings_page(1, **kwargs)
+
+        # The response is iterated after the request cursor is closed,
+        # so the pages are read with a cursor of their own
+        dbname = request.env.cr.dbname
+        uid = request.env.uid
+        context = dict(request.env.context)
+
+        def generate():
+            with api.Environment.manage(), registry(dbname).cursor() as cr:
+                Picking = api.Environment(cr, uid, context)['stock.picking']
+                cursor = None
+                while True:
+                    pickings, cursor = Picking.get_pickings_page(
+                        page_size, cursor=cursor, **kwargs)
+                    for info in pickings.get_info(
+                            fields_to_fetch=fields_to_fetch):
+                        yield json.dumps(info, default=str) + '\n'
+                    if cursor is None:
+                        break
+                    # Do not keep the records of the streamed pages around
+                    Picking.invalidate_cache()
+
+        return Response(generate(), mimetype='application/x-ndjson',
+                        direct_passthrough=True)
 
     @http.route('/api/stock-picking/',
                 type='json', methods=['POST'], auth='user')
@@ -49,15 +117,21 @@ class PickingApi(UdesApi):
             raise ValidationError(_('Cannot find stock.picking with id %s') % ident)
 
         with picking.statistics() as stats:
-            picking.update_picking(**kwargs)
+            res = picking.update_picking(**kwargs)
         _logger.info("Updating picking(s) (user %s) in %.2fs, %d queries, %s",
                      request.env.uid, stats.elapsed, stats.count, picking.ids)
 
+        # The picking type validates asynchronously, the job tracks the
+        # validation
+        job = res if isinstance(res, models.BaseModel) else None
 
         # If refactoring deletes our original picking, info may not be available
         # in case this has happened return true
         if picking.exists():
-            return picking.get_info()[0]
+            info = picking.get_info()[0]
+            if job:
+                info['validation_job_id'] = job.id
+            return info
         return True
 
     @http.route('/api/stock-picking/<ident>/is_compatible_package/<package_name>',
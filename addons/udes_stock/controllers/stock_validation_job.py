@@ -0,0 +1,31 @@
+# -*- coding: utf-8 -*-
+
+from odoo import http, _
+from odoo.exceptions import ValidationError
+from odoo.http import request
+
+from .main import UdesApi
+
+
+class ValidationJobApi(UdesApi):
+
+    @http.route('/api/stock-validation-job/<ident>',
+                type='json', methods=['GET'], auth='user')
+    def get_validation_job(self, ident):
+        """ Return the status of the validation job with id <ident>:
+            its state (queued, done or failed), pickings, number of
+            attempts and the error of the last failed attempt.
+            Users can only follow their own jobs, stock managers any job.
+        """
+        ValidationJob = request.env['stock.validation.job']
+
+        domain = [('id', '=', int(ident))]
+        if not request.env.user.has_group('stock.group_stock_manager'):
+            domain.append(('user_id', '=', request.env.uid))
+        job = ValidationJob.search(domain)
+
+        if not job:
+            raise ValidationError(
+                _('Cannot find stock.validation.job with id %s') % ident)
+
+        return job.get_info()[0]
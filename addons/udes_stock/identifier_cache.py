@@ -0,0 +1,289 @@
+# -*- coding: utf-8 -*-
+"""
+Identifier resolution cache
+
+Scanned identifiers (barcodes and names) are resolved to record ids through
+a bounded LRU cache per database and model, shared by all the requests of
+the process.
+
+- Identifiers are dropped when the identifying fields of their records are
+  written or the records are deleted, see invalidate. Each invalidated
+  identifier is recorded in stock.identifier.invalidation, which every
+  transaction reads once, on its first lookup, to drop the identifiers
+  invalidated since the last read of the worker, see _get_transaction. The
+  other workers thus drop them once the invalidating transaction is
+  committed.
+- Records created are not invalidated: records created or written by the
+  current transaction are not cached, as the changes are lost if it is
+  rolled back.
+- Entries are kept per user, company, language and active_test, which
+  change the records found.
+- Hits and misses are counted per model, see get_stats.
+"""
+
+import logging
+import threading
+from collections import defaultdict
+
+from odoo.tools.lru import LRU
+
+_logger = logging.getLogger(__name__)
+
+# Number of identifiers cached per database and model
+CACHE_SIZE = 4096
+
+# Number of invalidations a worker can lag behind before all its caches are
+# dropped, also the number of invalidations kept by gc_invalidations
+MAX_PENDING = 10000
+
+# Log the statistics of a model every STATS_LOG_INTERVAL lookups
+STATS_LOG_INTERVAL = 1000
+
+# Key of the state of the transaction in the cache of the cursor
+TRANSACTION_KEY = "identifier_cache"
+
+_states = {}
+_stats = defaultdict(lambda: {"hits": 0, "misses": 0})
+_lock = threading.RLock()
+
+
+def _get_state(db_name):
+    """ Return the state of the caches of the database:
+        - last: the id of the last invalidation read, None until read
+        - pending: set of ids below last not read yet, i.e. invalidations
+          of transactions not committed yet, or rolled back
+        - caches: dictionary of model name: LRU cache of identifier:
+          {prefix: tuple of ids}
+    """
+    with _lock:
+        state = _states.get(db_name)
+        if state is None:
+            state = _states[db_name] = {"last": None, "pending": set(), "caches": {}}
+        return state
+
+
+def _drop(state, model_name, identifier):
+    cache = state["caches"].get(model_name)
+    if cache is not None and identifier in cache:
+        del cache[identifier]
+
+
+def _sync(env):
+    """ Drop the identifiers invalidated since the last sync of the worker
+        and return whether the transaction sees all the invalidations read
+        by the worker, i.e. whether it may fill the caches.
+    """
+    cr = env.cr
+    state = _get_state(cr.dbname)
+
+    cr.execute("SELECT COALESCE(MAX(id), 0) FROM stock_identifier_invalidation")
+    visible = cr.fetchone()[0]
+    with _lock:
+        last, pending = state["last"], sorted(state["pending"])
+    if last is None or visible - last > MAX_PENDING:
+        rows = []
+    else:
+        cr.execute(
+            """
+            SELECT id, model, identifier
+            FROM stock_identifier_invalidation
+            WHERE id > %s OR id = ANY(%s)
+            """,
+            (last, pending),
+        )
+        rows = cr.fetchall()
+
+    with _lock:
+        if state["last"] is None or visible - state["last"] > MAX_PENDING:
+            # Too far behind to know what changed, start again
+            state["caches"].clear()
+            state["pending"].clear()
+            state["last"] = visible
+        elif visible > state["last"]:
+            state["pending"].update(range(state["last"] + 1, visible + 1))
+            state["last"] = visible
+        for invalidation_id, model_name, identifier in rows:
+            if invalidation_id in state["pending"]:
+                state["pending"].discard(invalidation_id)
+                _drop(state, model_name, identifier)
+        # Forget the invalidations of transactions that were rolled back
+        state["pending"] = {i for i in state["pending"] if i > state["last"] - MAX_PENDING}
+        return visible >= state["last"]
+
+
+def _get_transaction(env):
+    """ Return the state of the transaction of env, read once per
+        transaction and kept in the cache of the cursor until it is
+        committed or rolled back:
+        - current: whether the transaction may fill the caches, see _sync
+        - invalidated: set of (model name, identifier) invalidated by the
+          transaction, which it does not look up in the caches
+    """
+    cr = env.cr
+    transaction = cr.cache.get(TRANSACTION_KEY)
+    if transaction is None:
+        transaction = cr.cache[TRANSACTION_KEY] = {
+            "current": _sync(env),
+            "invalidated": set(),
+        }
+
+        def reset():
+            cr.cache.pop(TRANSACTION_KEY, None)
+
+        cr.after("commit", reset)
+        cr.after("rollback", reset)
+    return transaction
+
+
+def _get_cache(model):
+    """ Return the LRU cache of the model """
+    state = _get_state(model.pool.db_name)
+    with _lock:
+        cache = state["caches"].get(model._name)
+        if cache is None:
+            cache = state["caches"][model._name] = LRU(CACHE_SIZE)
+        return cache
+
+
+def invalidate(records, fields):
+    """ Drop the values of fields of the records from the cached
+        identifiers of their model, in every worker once the transaction is
+        committed. Called with the values before and after they change.
+    """
+    identifiers = {record[field] for record in records.sudo() for field in fields}
+    identifiers.discard(False)
+    if not identifiers:
+        return
+
+    # Read the invalidations before adding to them
+    transaction = _get_transaction(records.env)
+    transaction["invalidated"].update((records._name, identifier) for identifier in identifiers)
+    records.env.cr.execute(
+        """
+        INSERT INTO stock_identifier_invalidation (model, identifier)
+        SELECT %s, unnest(%s)
+        """,
+        (records._name, sorted(identifiers)),
+    )
+
+
+def _count(model, hits, misses):
+    key = (model.pool.db_name, model._name)
+    with _lock:
+        stats = _stats[key]
+        before = stats["hits"] + stats["misses"]
+        stats["hits"] += hits
+        stats["misses"] += misses
+        after = stats["hits"] + stats["misses"]
+    if before // STATS_LOG_INTERVAL != after // STATS_LOG_INTERVAL:
+        _logger.info(
+            "Identifier cache of %s: %d hits, %d misses", model._name, stats["hits"], stats["misses"]
+        )
+
+
+def get_stats(env):
+    """ Return a dictionary of model name: {'hits': int, 'misses': int} of
+        the database of env
+    """
+    with _lock:
+        return {
+            model_name: dict(stats)
+            for (db_name, model_name), stats in _stats.items()
+            if db_name == env.cr.dbname
+        }
+
+
+def _get_prefix(model, key):
+    """ Return the part of the cache keys depending on the environment """
+    env = model.env
+    context = env.context
+    return (
+        env.uid,
+        context.get("force_company") or env.user.company_id.id,
+        context.get("lang"),
+        context.get("active_test", True),
+    ) + tuple(key)
+
+
+def resolve(model, identifiers, fields, domain=None, key=()):
+    """
+    Return a dictionary of identifier: list of ids of the records of model
+    whose value of one of fields is the identifier. Identifiers not in the
+    cache are searched for together in one query.
+    :param model: (recordset) empty recordset of the model to search
+    :param identifiers: (iterable of str)
+    :param fields: (list of str) stored fields identifying the records
+    :param domain: (list) restricts the records searched, e.g. lots of a
+        product
+    :param key: (tuple) distinguishes the entries of the same identifier
+        searched with different domains
+    """
+    transaction = _get_transaction(model.env)
+    invalidated = {
+        identifier
+        for model_name, identifier in transaction["invalidated"]
+        if model_name == model._name
+    }
+    cache = _get_cache(model)
+    prefix = _get_prefix(model, key)
+
+    res = {}
+    missing = []
+    with _lock:
+        for identifier in identifiers:
+            entry = None if identifier in invalidated else cache.get(identifier)
+            ids = entry.get(prefix) if entry else None
+            if ids is None:
+                missing.append(identifier)
+            else:
+                res[identifier] = list(ids)
+    _count(model, len(res), len(missing))
+
+    if not missing:
+        return res
+
+    search_domain = list(domain or [])
+    search_domain += ["|"] * (len(fields) - 1)
+    search_domain += [(field, "in", missing) for field in fields]
+
+    query = model._where_calc(search_domain)
+    model._apply_ir_rules(query, "read")
+    from_clause, where_clause, params = query.get_sql()
+    model.env.cr.execute(
+        """
+        SELECT "{table}".id,
+               "{table}".write_date >= (now() at time zone 'UTC')
+        FROM {from_clause}
+        WHERE {where}
+        ORDER BY "{table}".id
+        """.format(table=model._table, from_clause=from_clause, where=where_clause or "TRUE"),
+        params,
+    )
+    rows = model.env.cr.fetchall()
+
+    found = defaultdict(list)
+    changed_ids = set()
+    records = model.browse([row[0] for row in rows])
+    for (record_id, is_changed), record in zip(rows, records):
+        if is_changed:
+            changed_ids.add(record_id)
+        for value in {record[field] for field in fields}:
+            if value in missing:
+                found[value].append(record_id)
+
+    with _lock:
+        for identifier in missing:
+            ids = found.get(identifier, [])
+            res[identifier] = ids
+            if (
+                ids
+                and transaction["current"]
+                and identifier not in invalidated
+                and not changed_ids.intersection(ids)
+            ):
+                entry = cache.get(identifier)
+                if entry is None:
+                    entry = cache[identifier] = {}
+                entry[prefix] = tuple(ids)
+
+    return res
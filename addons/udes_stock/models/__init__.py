@@ -8,8 +8,10 @@ from . import product_product
 from . import product_template
 from . import res_groups
 from . import res_users
+from . import stock_identifier_invalidation
 from . import stock_inventory
 from . import stock_location
+from . import stock_location_hold
 from . import stock_location_category
 from . import stock_location_path
 from . import stock_move
@@ -21,4 +23,7 @@ from . import stock_picking_print_strategy
 from . import stock_production_lot
 from . import stock_quant
 from . import stock_quant_package
+from . import stock_reservation_stat
+from . import stock_reservation_trigger
+from . import stock_validation_job
 from . import stock_warehouse
@@ -1,8 +1,11 @@
 # -*- coding: utf-8 -*-
 
-from odoo import fields, models, _
+from odoo import api, fields, models, _
 from odoo.exceptions import ValidationError
 
+from .. import identifier_cache
+from ..common import cached_info
+
 BASE_PRODUCT_IMAGE_URL = '/web/image/product.product/%i'
 
 
@@ -44,7 +47,8 @@ class ProductProduct(models.Model):
         self.ensure_one()
 
         def _prepare_image_urls(p):
-            if p.image:
+            # bin_size only fetches the size of the image, not its content
+            if p.with_context(bin_size=True).image:
                 base_url = BASE_PRODUCT_IMAGE_URL % p.id
                 image_urls = {
                     'large': base_url + '/image',
@@ -73,7 +77,7 @@ class ProductProduct(models.Model):
         """
         res = []
         for prod in self:
-            res.append(prod._prepare_info(**kwargs))
+            res.append(cached_info(prod, prod._prepare_info, **kwargs))
 
         return res
 
@@ -81,17 +85,46 @@ class ProductProduct(models.Model):
         """ Get product from a name, barcode, or id.
         """
         if isinstance(product_identifier, int):
-            domain = [('id', '=', product_identifier)]
+            results = self.search([('id', '=', product_identifier)])
         elif isinstance(product_identifier, str):
-            domain = ['|', ('barcode', '=', product_identifier),
-                           ('name', '=', product_identifier)]
+            results = self.browse(identifier_cache.resolve(
+                self, [product_identifier], ['barcode', 'name']
+            )[product_identifier])
         else:
             raise ValidationError(_('Unable to create domain for product search from identifier of type %s') % type(product_identifier))
-
-        results = self.search(domain)
         if not results:
             raise ValidationError(_('Invalid product scanned: %s') % str(product_identifier))
         if  len(results) > 1:
             raise ValidationError(_('Too many products found for identifier %s') % str(product_identifier))
 
         return results
+
+    def get_products(self, product_identifiers):
+        """ Get the products of a list of names or barcodes, resolved
+            together. Raise an error when any of them matches no product
+            or several products.
+        """
+        resolved = identifier_cache.resolve(
+            self, set(product_identifiers), ['barcode', 'name'])
+        for identifier, ids in resolved.items():
+            if not ids:
+                raise ValidationError(_('Invalid product scanned: %s') % identifier)
+            if len(ids) > 1:
+                raise ValidationError(_('Too many products found for identifier %s') % identifier)
+
+        return self.browse([resolved[i][0] for i in product_identifiers])
+
+    @api.multi
+    def write(self, values):
+        changed = {'barcode', 'name', 'active'} & set(values)
+        if changed:
+            identifier_cache.invalidate(self, ['barcode', 'name'])
+        res = super(ProductProduct, self).write(values)
+        if changed:
+            identifier_cache.invalidate(self, ['barcode', 'name'])
+        return res
+
+    @api.multi
+    def unlink(self):
+        identifier_cache.invalidate(self, ['barcode', 'name'])
+        return super(ProductProduct, self).unlink()
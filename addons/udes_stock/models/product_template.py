@@ -5,10 +5,25 @@ from odoo.addons import decimal_precision as dp
 from odoo.exceptions import ValidationError
 from odoo.tools.translate import _
 
+from .. import identifier_cache
+
 
 class ProductTemplate(models.Model):
     _inherit = "product.template"
 
+    @api.multi
+    def write(self, values):
+        # Products are identified by the name of their template
+        if not {'name', 'active'} & set(values):
+            return super(ProductTemplate, self).write(values)
+
+        products = self.with_context(active_test=False).mapped(
+            'product_variant_ids')
+        identifier_cache.invalidate(products, ['barcode', 'name'])
+        res = super(ProductTemplate, self).write(values)
+        identifier_cache.invalidate(products, ['barcode', 'name'])
+        return res
+
     def _domain_product_category(self, category):
         """Domain for product categories, not including category itself"""
         return [('id', 'child_of', category.id), ('id', '!=', category.id)]
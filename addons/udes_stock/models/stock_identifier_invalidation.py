@@ -0,0 +1,34 @@
+# -*- coding: utf-8 -*-
+
+from odoo import api, fields, models
+
+from ..identifier_cache import MAX_PENDING
+
+
+class StockIdentifierInvalidation(models.Model):
+    """Identifiers dropped from the identifier cache, one row per identifier
+    of a model. Each worker reads the rows added since its last read to drop
+    them from its cache, see identifier_cache. Rows are only visible once the
+    invalidating transaction is committed, and inserting them takes no lock.
+    """
+
+    _name = "stock.identifier.invalidation"
+    _description = "Stock Identifier Cache Invalidation"
+    _order = "id"
+    _log_access = False
+
+    model = fields.Char("Model", required=True, readonly=True)
+    identifier = fields.Char("Identifier", required=True, readonly=True)
+
+    @api.model
+    def gc_invalidations(self):
+        """ Delete the invalidations that every worker has read, or is too
+            far behind to read
+        """
+        self.env.cr.execute(
+            """
+            DELETE FROM stock_identifier_invalidation
+            WHERE id <= (SELECT MAX(id) FROM stock_identifier_invalidation) - %s
+            """,
+            (MAX_PENDING,),
+        )
@@ -1,10 +1,15 @@
 # -*- coding: utf-8 -*-
 
-from collections import namedtuple, defaultdict
+from bisect import bisect_right
+from collections import namedtuple, defaultdict, OrderedDict
 from datetime import datetime
 
-from odoo import fields, models,  _, api
+from odoo import fields, models,  _, api, tools
 from odoo.exceptions import ValidationError
+from odoo.osv import expression
+
+from ..common import cached_info, parse_fields_to_fetch
+from .. import identifier_cache, pick_path
 
 
 PI_COUNT_MOVES = 'pi_count_moves'
@@ -16,6 +21,16 @@ NEW_PACKAGE_TOKEN = 'NEWPACKAGE'
 
 VALID_SERIAL_TRACKING_QUANTITIES = [1, 0]
 
+QUANT_POLICIES = [
+    ('all', 'Allow all'),
+    ('single_product_id', 'One product per location'),
+    ('single_lot_id_single_product_id_per_package', 'One lot/product per package'),
+]
+
+# Counts stored by _compute_occupancy, which together with
+# u_date_occupancy_changed make up the occupancy of a location
+OCCUPANCY_FIELDS = ('u_quant_count', 'u_incoming_move_line_count', 'u_occupied')
+
 
 #
 ## Auxiliary types
@@ -70,9 +85,16 @@ class StockLocation(models.Model):
 
     u_quant_policy = fields.Selection(
         string='Location Policy',
-        selection=[('all', 'Allow all'),
-                   ('single_product_id', 'One product per location'),
-                   ('single_lot_id_single_product_id_per_package', 'One lot/product per package')])
+        selection=QUANT_POLICIES)
+
+    u_effective_quant_policy = fields.Selection(
+        string='Effective Location Policy',
+        selection=QUANT_POLICIES,
+        readonly=True,
+        index=True,
+        help="The policy of the location, or the one of its closest "
+             "ancestor with a policy when it has none.",
+    )
 
     u_height_category_id = fields.Many2one(
         comodel_name='product.category',
@@ -104,7 +126,157 @@ class StockLocation(models.Model):
         "and its descendants.",
     )
 
-    def _prepare_info(self, extended=False, load_quants=False):
+    u_incoming_move_line_ids = fields.One2many(
+        'stock.move.line', 'location_dest_id',
+        string='Incoming Move Lines',
+        domain=[('state', 'not in', ('done', 'cancel'))],
+        readonly=True,
+    )
+
+    u_quant_count = fields.Integer(
+        string='Number of Quants', compute='_compute_occupancy',
+        store=True, readonly=True,
+        help="Number of quants in the location.",
+    )
+    u_incoming_move_line_count = fields.Integer(
+        string='Number of Incoming Move Lines', compute='_compute_occupancy',
+        store=True, readonly=True,
+        help="Number of move lines of available pickings dropping stock "
+             "off in the location.",
+    )
+    u_occupied = fields.Boolean(
+        string='Occupied', compute='_compute_occupancy',
+        store=True, readonly=True,
+        help="Whether the location holds stock or stock is due to be "
+             "dropped off in it.",
+    )
+    u_date_occupancy_changed = fields.Datetime(
+        string='Date Occupancy Changed', compute='_compute_occupancy',
+        store=True, readonly=True,
+        help="When the occupancy counts of the location last changed.",
+    )
+
+    def init(self):
+        """ Index the occupancy of the locations for the empty location
+            searches of putaway suggestions, which filter on the stored
+            occupancy fields, blocked, height and speed categories and
+            a parent_left range.
+        """
+        self.env.cr.execute("""
+            CREATE INDEX IF NOT EXISTS stock_location_occupied_index
+            ON stock_location (u_occupied, u_blocked, u_height_category_id,
+                               u_speed_category_id, parent_left)
+            WHERE barcode IS NOT NULL
+        """)
+        self.env.cr.execute("""
+            CREATE INDEX IF NOT EXISTS stock_location_no_quants_index
+            ON stock_location (u_blocked, parent_left)
+            WHERE barcode IS NOT NULL AND u_quant_count = 0
+        """)
+        self._update_effective_quant_policy()
+
+    @api.depends('quant_ids',
+                 'u_incoming_move_line_ids',
+                 'u_incoming_move_line_ids.state',
+                 'u_incoming_move_line_ids.picking_id.state')
+    def _compute_occupancy(self):
+        """ Count the quants of the locations and the move lines of
+            available pickings dropping stock off in them.
+
+            Only putaway locations are counted, view locations and the
+            Input and Output locations keep their stored occupancy. The
+            date the occupancy changed is only updated when a count
+            changes, see also _write.
+        """
+        stored = self._get_stored_occupancy()
+        skipped = self._get_non_putaway_locations()
+        now = fields.Datetime.now()
+        for location in self:
+            old = stored.get(location.id, (0, 0, False, False))
+            if location in skipped:
+                counts = old[:3]
+            else:
+                quant_count = len(location.quant_ids)
+                incoming_count = len(location.u_incoming_move_line_ids.filtered(
+                    lambda ml: ml.picking_id.state == 'assigned'))
+                counts = (quant_count, incoming_count,
+                          bool(quant_count or incoming_count))
+            location.u_quant_count, location.u_incoming_move_line_count, \
+                location.u_occupied = counts
+            location.u_date_occupancy_changed = \
+                old[3] if counts == old[:3] else now
+
+    def _get_stored_occupancy(self):
+        """ Return a dictionary of location id: (quant count, incoming move
+            line count, occupied, date occupancy changed) as stored for the
+            locations in self, which are being recomputed.
+        """
+        location_ids = [loc_id for loc_id in self.ids
+                        if isinstance(loc_id, int)]
+        if not location_ids:
+            return {}
+
+        self.env.cr.execute("""
+            SELECT id, COALESCE(u_quant_count, 0),
+                   COALESCE(u_incoming_move_line_count, 0),
+                   COALESCE(u_occupied, false), u_date_occupancy_changed
+            FROM stock_location
+            WHERE id IN %s
+        """, (tuple(location_ids),))
+        return {row[0]: row[1:] for row in self.env.cr.fetchall()}
+
+    def _get_non_putaway_locations(self):
+        """ Return the locations of self that stock is not put away in:
+            view locations and the Input and Output locations, i.e. the
+            default destinations of incoming picking types and the default
+            sources of outgoing picking types, and their descendants.
+        """
+        staging = self.browse(self._get_staging_location_ids())
+
+        return self.filtered(lambda l: l.usage == 'view') \
+            | self.filter_child_of(staging)
+
+    @api.model
+    @tools.ormcache()
+    def _get_staging_location_ids(self):
+        """ Return the ids of the Input and Output locations, cached until
+            a picking type is changed.
+        """
+        PickingType = self.env['stock.picking.type'].sudo()
+
+        staging = PickingType.search([
+            ('code', '=', 'incoming'),
+        ]).mapped('default_location_dest_id') | PickingType.search([
+            ('code', '=', 'outgoing'),
+        ]).mapped('default_location_src_id')
+
+        return tuple(staging.ids)
+
+    @api.multi
+    def _write(self, vals):
+        """ Do not rewrite the occupancy of the locations in self when
+            their recomputed counts are the ones already stored.
+        """
+        occupancy_fields = set(OCCUPANCY_FIELDS)
+        if self and occupancy_fields <= set(vals) \
+                <= occupancy_fields | {'u_date_occupancy_changed'}:
+            self.env.cr.execute("""
+                SELECT id
+                FROM stock_location
+                WHERE id IN %s
+                  AND (u_quant_count, u_incoming_move_line_count, u_occupied)
+                      IS DISTINCT FROM (%s, %s, %s)
+            """, (tuple(self.ids),)
+                + tuple(vals[name] for name in OCCUPANCY_FIELDS))
+            changed = self.browse([row[0] for row in self.env.cr.fetchall()])
+            if not changed:
+                return True
+            return super(StockLocation, changed)._write(vals)
+
+        return super(StockLocation, self)._write(vals)
+
+    def _prepare_info(self, extended=False, load_quants=False,
+                      fields_to_fetch=None):
         """
             Prepares the following info of the location in self:
             - id: int
@@ -117,9 +289,14 @@ class StockLocation(models.Model):
             When extended is True also return:
             - u_blocked: bool
             - u_blocked_reason: string
+
+            @param fields_to_fetch: array of string
+                Subset of the fields above to return
         """
         self.ensure_one()
 
+        top_level = parse_fields_to_fetch(fields_to_fetch)[0]
+
         info = {"id": self.id,
                 "name": self.name,
                 "barcode": self.barcode,
@@ -135,6 +312,10 @@ class StockLocation(models.Model):
                 info['u_location_category_id'] = \
                     self.u_location_category_id.get_info()[0]
 
+        if top_level:
+            info = {key: value for key, value in info.items()
+                    if key in top_level}
+
         return info
 
     def get_info(self, **kwargs):
@@ -142,25 +323,43 @@ class StockLocation(models.Model):
         """
         res = []
         for loc in self:
-            res.append(loc._prepare_info(**kwargs))
+            res.append(cached_info(loc, loc._prepare_info, **kwargs))
 
         return res
 
+    def _get_pick_path_strategies(self):
+        """ Return a dictionary of the pick path strategies by name, each
+            a function ordering a dictionary of key: (x, y, z) points into
+            a route, see pick_path.
+        """
+        return dict(pick_path.STRATEGIES)
+
+    def get_pick_path(self, strategy):
+        """ Return the locations in self in the order they are visited by
+            the route of the pick path strategy, based on the posx, posy
+            and posz coordinates of the locations.
+        """
+        strategies = self._get_pick_path_strategies()
+        if strategy not in strategies:
+            raise ValidationError(_("Unknown pick path strategy: %s") % strategy)
+
+        points = {loc.id: (loc.posx, loc.posy, loc.posz) for loc in self}
+        return self.browse(strategies[strategy](points))
+
     def get_location(self, location_identifier):
         """ Get locations from a name, barcode, or id.
         """
         if isinstance(location_identifier, int):
-            domain = [('id', '=', location_identifier)]
+            results = self.search([('id', '=', location_identifier)])
         elif isinstance(location_identifier, str):
-            domain = ['|', ('barcode', '=', location_identifier),
-                           ('name', '=', location_identifier)]
+            results = self.browse(identifier_cache.resolve(
+                self, [location_identifier], ['barcode', 'name']
+            )[location_identifier])
         else:
             raise ValidationError(
                 _('Unable to create domain for location search from '
                   'identifier of type %s') % type(location_identifier))
 
-        results = self.search(domain)
-
         if not results:
             raise ValidationError(
                 _('Location not found for identifier %s')
@@ -173,31 +372,57 @@ class StockLocation(models.Model):
 
         return results
 
+    def get_locations(self, location_identifiers):
+        """ Get the locations of a list of names or barcodes, resolved
+            together. Raise an error when any of them matches no location
+            or several locations.
+        """
+        resolved = identifier_cache.resolve(
+            self, set(location_identifiers), ['barcode', 'name'])
+        for identifier, ids in resolved.items():
+            if not ids:
+                raise ValidationError(
+                    _('Location not found for identifier %s') % identifier)
+            if len(ids) > 1:
+                raise ValidationError(
+                    _('Too many locations found for identifier %s')
+                    % identifier)
+
+        return self.browse([resolved[i][0] for i in location_identifiers])
+
     #
     ## Perpetual Inventory
     #
 
-    def _check_obj_locations(self, loc_keys, obj):
+    def _check_obj_locations(self, loc_keys, obj, location_ids=None):
         Location = self.env['stock.location']
 
         for key in loc_keys:
             loc_id = int(obj[key])
 
+            if location_ids is not None and loc_id in location_ids:
+                continue
+
             if not Location.browse(loc_id).exists():
                 raise ValidationError(_("The request has an unknown location, "
                                         "id: '%d'.") % loc_id)
 
-    def _validate_inventory_adjustment_request(self, request):
+    def _validate_inventory_adjustment_request(self, request, products=None):
         """
             Ensures that the specified product exists and that
             its `tracking` value is compatible with the request
             lot (which may or may not be specified).
 
+            Products already fetched can be given as a dictionary
+            of id: product.
+
             Raises a ValidationError otherwise.
         """
         Product = self.env['product.product']
 
-        product = Product.get_product(int(request['product_id']))
+        product_id = int(request['product_id'])
+        product = (products or {}).get(product_id) \
+            or Product.get_product(product_id)
 
         # Ignore conflicts of tracked vs untracked if we are removing existing
         # stock
@@ -224,12 +449,13 @@ class StockLocation(models.Model):
                     _("Product '%s' is not tracked, but a lot name has been "
                       "specified.") % product.name)
 
-    def _validate_perpetual_inventory_request(self, request):
+    def _validate_perpetual_inventory_request(self, request, products=None,
+                                              location_ids=None):
         keys = ['location_id', 'location_dest_id']
 
         if PI_COUNT_MOVES in request:
             for obj in request[PI_COUNT_MOVES]:
-                self._check_obj_locations(keys, obj)
+                self._check_obj_locations(keys, obj, location_ids)
 
         if PRECEDING_INVENTORY_ADJUSTMENTS in request:
             if not request.get(INVENTORY_ADJUSTMENTS):
@@ -238,14 +464,15 @@ class StockLocation(models.Model):
                       'preceding adjustments.'))
 
             for pre_adjs_req in request[PRECEDING_INVENTORY_ADJUSTMENTS]:
-                self._check_obj_locations(keys[:1], pre_adjs_req)
+                self._check_obj_locations(keys[:1], pre_adjs_req,
+                                          location_ids)
 
                 for req in pre_adjs_req[INVENTORY_ADJUSTMENTS]:
-                    self._validate_inventory_adjustment_request(req)
+                    self._validate_inventory_adjustment_request(req, products)
 
         if INVENTORY_ADJUSTMENTS in request:
             for req in request[INVENTORY_ADJUSTMENTS]:
-                self._validate_inventory_adjustment_request(req)
+                self._validate_inventory_adjustment_request(req, products)
 
     def process_perpetual_inventory_request(self, request):
         """
@@ -265,7 +492,23 @@ class StockLocation(models.Model):
             Returns True.
         """
         self.ensure_one()
-        self._validate_perpetual_inventory_request(request)
+        pi_outcome = self._process_perpetual_inventory_request(request)
+        self._process_pi_datetime(pi_outcome)
+
+        return True
+
+    def _process_perpetual_inventory_request(self, request, products=None,
+                                             location_ids=None):
+        """
+            Validates and executes the specified PI request, see
+            process_perpetual_inventory_request, without updating
+            the PI date time attributes.
+
+            Returns the PIOutcome of the request.
+        """
+        self.ensure_one()
+        self._validate_perpetual_inventory_request(request, products,
+                                                   location_ids)
         pi_outcome = PIOutcome()
 
         if PI_COUNT_MOVES in request:
@@ -280,9 +523,139 @@ class StockLocation(models.Model):
                     pre_adjs_req,
                     pi_outcome.adjustment_inventory)
 
-        self._process_pi_datetime(pi_outcome)
+        return pi_outcome
 
-        return True
+    @api.model
+    def process_perpetual_inventory_requests(self, requests):
+        """
+            Executes the PI requests of several locations, see
+            process_perpetual_inventory_request.
+
+            The locations, products, packages and lots of all the
+            requests are resolved up front. Each request is processed
+            in its own savepoint, so that an invalid request is
+            reported without preventing the others from being
+            processed; the PI date time attributes of the locations
+            are then updated together.
+
+            Returns a list with a dictionary per request, in order:
+            - location_id: the location id of the request
+            - success: boolean
+            - error: the error of an invalid request, empty otherwise
+        """
+        Location = self.env['stock.location']
+
+        locations, products = self._prefetch_perpetual_inventory_requests(
+            requests)
+        checked = Location.browse()
+        correct = Location.browse()
+        results = []
+
+        for request in requests:
+            result = {'location_id': request.get('location_id'),
+                      'success': True,
+                      'error': ''}
+            try:
+                with self.env.cr.savepoint():
+                    location_id = self._get_pi_request_location_id(request)
+                    location = locations.get(location_id) \
+                        or Location.get_location(location_id)
+                    pi_outcome = location._process_perpetual_inventory_request(
+                        request, products, set(locations))
+            except ValidationError as e:
+                # The savepoint is rolled back, drop what the cache
+                # still holds
+                self.invalidate_cache()
+                result.update(success=False, error=e.name)
+            else:
+                checked |= location
+                if not pi_outcome.got_inventory_changes():
+                    correct |= location
+            results.append(result)
+
+        current_time = datetime.now()
+        checked.write({'u_date_last_checked': current_time})
+        # No PI changes - the locations are in a correct state
+        correct.write({'u_date_last_checked_correct': current_time})
+
+        return results
+
+    def _get_pi_request_location_id(self, request):
+        try:
+            return int(request.get('location_id'))
+        except (TypeError, ValueError):
+            raise ValidationError(
+                _('You need to provide a valid id for the location.'))
+
+    def _prefetch_perpetual_inventory_requests(self, requests):
+        """
+            Resolves the references of the PI requests together:
+            - the locations, returned as a dictionary of id: location
+              of the active locations the user can read;
+            - the products, returned as a dictionary of id: product
+              of the active products the user can read;
+            - the package and lot names, whose ids are kept in the
+              identifier cache for the processing of the requests.
+
+            Invalid references are left to the validation of each
+            request.
+        """
+        Location = self.env['stock.location']
+        Product = self.env['product.product']
+        Package = self.env['stock.quant.package']
+        Lot = self.env['stock.production.lot']
+
+        def as_int(value):
+            try:
+                return int(value)
+            except (TypeError, ValueError):
+                return None
+
+        location_ids = set()
+        product_ids = set()
+        package_names = set()
+        lot_names = defaultdict(set)
+
+        def add_adjustments(adjustments):
+            for adj in adjustments:
+                product_id = as_int(adj.get('product_id'))
+                product_ids.add(product_id)
+                package_name = adj.get('package_name') or ''
+                if NO_PACKAGE_TOKEN not in package_name \
+                        and NEW_PACKAGE_TOKEN not in package_name:
+                    package_names.add(package_name)
+                if adj.get('lot_name') and product_id is not None:
+                    lot_names[product_id].add(adj['lot_name'])
+
+        for request in requests:
+            location_ids.add(as_int(request.get('location_id')))
+            for count_move in request.get(PI_COUNT_MOVES, []):
+                location_ids.add(as_int(count_move.get('location_id')))
+                location_ids.add(as_int(count_move.get('location_dest_id')))
+            add_adjustments(request.get(INVENTORY_ADJUSTMENTS, []))
+            for pre_adjs_req in request.get(
+                    PRECEDING_INVENTORY_ADJUSTMENTS, []):
+                location_ids.add(as_int(pre_adjs_req.get('location_id')))
+                add_adjustments(pre_adjs_req.get(INVENTORY_ADJUSTMENTS, []))
+
+        # Searched rather than browsed, so that archived records and
+        # record rules are taken into account
+        locations = Location.search(
+            [('id', 'in', list(location_ids - {None}))])
+        products = Product.search(
+            [('id', 'in', list(product_ids - {None}))])
+        # Read the fields checked by the validation for all the products
+        products.read(['name', 'tracking'])
+
+        package_names.discard('')
+        identifier_cache.resolve(Package, package_names, ['name'])
+        for product_id, names in lot_names.items():
+            identifier_cache.resolve(
+                Lot, names, ['name'],
+                domain=[('product_id', '=', product_id)], key=(product_id,))
+
+        return ({l.id: l for l in locations},
+                {p.id: p for p in products})
 
     def _process_pi_datetime(self, pi_outcome):
         current_time = datetime.now()
@@ -400,29 +773,28 @@ class StockLocation(models.Model):
             Raises a ValidationError in case of invalid request.
         """
         Inventory = self.env['stock.inventory']
-        InventoryLine = self.env['stock.inventory.line']
 
         stock_drift = self._get_stock_drift(adjustments_request)
 
         if not stock_drift:
             return
 
+        # Create the lines with the inventory, so that the stored
+        # fields of the inventory are computed once
         inventory_adjustment = Inventory.create({
             'name':        'PI inventory adjustment ' + self.name,
             'location_id': self.id,
             'filter':      'none',
-            'state':       'confirm'
+            'state':       'confirm',
+            'line_ids':    [(0, 0, {
+                'product_id':  stock_info.product_id,
+                'product_qty': quantity,
+                'location_id': self.id,
+                'package_id':  stock_info.package_id,
+                'prod_lot_id': stock_info.lot_id})
+                for stock_info, quantity in stock_drift.items()]
         })
 
-        for stock_info, quantity in stock_drift.items():
-            InventoryLine.create({
-              'inventory_id': inventory_adjustment.id,
-              'product_id':   stock_info.product_id,
-              'product_qty':  quantity,
-              'location_id':  self.id,
-              'package_id':   stock_info.package_id,
-              'prod_lot_id':  stock_info.lot_id})
-
         return inventory_adjustment
 
     def _get_stock_drift(self, adjustments_request):
@@ -432,8 +804,9 @@ class StockLocation(models.Model):
             Each StockInfo is the result of the processing of an
             adjustments_request entry.
 
-            Creates a lot for a given product if necessary, when the
-            related lot name doesn't exist.
+            The products, packages and lots of all the entries are
+            resolved together. Creates a lot for a given product if
+            necessary, when the related lot name doesn't exist.
 
             Raises a ValidationError in case any specified product
             or package doesn't exist.
@@ -479,15 +852,49 @@ class StockLocation(models.Model):
             if not quant.package_id:
                 products_and_quantities[quant.product_id] = quant.quantity
 
+        # Resolve the products, packages and lots of all the entries
+        # together, creating the missing packages and lots
+        product_ids = {int(adj['product_id']) for adj in adjustments_request}
+        products = {
+            p.id: p for p in Product.search([('id', 'in', list(product_ids))])
+        }
+        for product_id in product_ids - set(products):
+            # Raises the error of the unknown product
+            Product.get_product(product_id)
+
+        # Skip unchanged loose product quantities
+        adjustments_request = [
+            adj for adj in adjustments_request
+            if NO_PACKAGE_TOKEN not in adj['package_name']
+            or products_and_quantities.get(products[int(adj['product_id'])])
+            != adj['quantity']]
+
+        package_names = list(OrderedDict.fromkeys(
+            adj['package_name'] for adj in adjustments_request
+            if NO_PACKAGE_TOKEN not in adj['package_name']
+            and NEW_PACKAGE_TOKEN not in adj['package_name']))
+        # It might be a new package, so create=True
+        packages = dict(zip(package_names,
+                            Package.get_packages(package_names, create=True)))
+
+        lot_names = defaultdict(list)
+        for adj in adjustments_request:
+            if 'lot_name' in adj:
+                lot_names[int(adj['product_id'])].append(adj['lot_name'])
+        lots = {}
+        for product_id, names in lot_names.items():
+            names = list(OrderedDict.fromkeys(names))
+            product_lots = Lot.get_lots(names, product_id, create=True)
+            lots.update(((product_id, name), lot)
+                        for name, lot in zip(names, product_lots))
+
         # Go through (potentially modified) adjustments_request
         for adj in adjustments_request:
-            product = Product.get_product(int(adj['product_id']))
+            product = products[int(adj['product_id'])]
             # determine the package
             package_name = adj['package_name']
-            package = None
             if NO_PACKAGE_TOKEN in package_name:
-                if products_and_quantities.get(product) == adj['quantity']:
-                    continue
+                package = None
             elif NEW_PACKAGE_TOKEN in package_name:
                 if package_name in new_packages:
                     package = new_packages[package_name]
@@ -495,8 +902,7 @@ class StockLocation(models.Model):
                     package = Package.create({})
                     new_packages[package_name] = package
             else:
-                # It might be a new package, so create=True
-                package = Package.get_package(package_name, create=True)
+                package = packages[package_name]
 
             package_id = False if package is None else package.id
 
@@ -504,8 +910,7 @@ class StockLocation(models.Model):
 
             lot_id = False
             if 'lot_name' in adj:
-                lot = Lot.get_lot(adj['lot_name'], product.id, create=True)
-                lot_id = lot.id
+                lot_id = lots[(product.id, adj['lot_name'])].id
 
             # add the entry
 
@@ -516,42 +921,106 @@ class StockLocation(models.Model):
 
     def get_quant_policy(self):
         self.ensure_one()
-        my_policy = self.u_quant_policy
-        if not my_policy and self.location_id:
-            return self.location_id.get_quant_policy()
-        return my_policy
+        return self.u_effective_quant_policy
+
+    def _update_effective_quant_policy(self):
+        """ Store the effective policy of the locations in self and their
+            descendants, or of all the locations when self is empty: their
+            own policy or the one of their closest ancestor with a policy.
+            Each subtree is updated by a single query.
+        """
+        where = "TRUE"
+        params = []
+        if self:
+            where = """
+                EXISTS (
+                    SELECT 1 FROM stock_location root
+                    WHERE root.id IN %s
+                      AND l.parent_left >= root.parent_left
+                      AND l.parent_left < root.parent_right
+                )
+            """
+            params = [tuple(self.ids)]
+
+        self.env.cr.execute("""
+            UPDATE stock_location l
+            SET u_effective_quant_policy = (
+                SELECT a.u_quant_policy
+                FROM stock_location a
+                WHERE a.parent_left <= l.parent_left
+                  AND a.parent_right > l.parent_left
+                  AND a.u_quant_policy IS NOT NULL
+                ORDER BY a.parent_left DESC
+                LIMIT 1
+            )
+            WHERE {where}
+        """.format(where=where), params)
+        self.invalidate_cache(['u_effective_quant_policy'])
 
     def apply_quant_policy(self):
-        for loc in self:
-            policy = loc.get_quant_policy()
-            if policy:
-                func = getattr(self, '_apply_quant_policy_' + policy, None)
-                if func:
-                    func(policy, loc)
-
-    def _apply_quant_policy_single_product_id(self, policy, loc):
-        if policy == 'single_product_id' \
-                and len(loc.quant_ids.mapped('product_id')) > 1:
-            raise ValidationError(
-                _('Location %s cannot contain more than one product.' % loc.name))
+        """ Check the quants of the locations in self against their
+            effective policies, raising a single error listing all the
+            locations or packages breaking them.
+        """
+        errors = []
+        for policy in set(self.mapped('u_effective_quant_policy')):
+            func = policy and getattr(self, '_check_quant_policy_' + policy, None)
+            if func:
+                locations = self.filtered(
+                    lambda l: l.u_effective_quant_policy == policy)
+                errors.extend(func(locations))
+
+        if errors:
+            raise ValidationError('\n'.join(errors))
+
+    def _check_quant_policy_single_product_id(self, locations):
+        """ Return the errors of the locations holding several products """
+        self.env.cr.execute("""
+            SELECT location_id
+            FROM stock_quant
+            WHERE location_id IN %s
+            GROUP BY location_id
+            HAVING COUNT(DISTINCT product_id) > 1
+        """, (tuple(locations.ids),))
+        return [
+            _('Location %s cannot contain more than one product.' % loc.name)
+            for loc in self.browse([row[0] for row in self.env.cr.fetchall()])
+        ]
+
+    def _check_quant_policy_single_lot_id_single_product_id_per_package(
+            self, locations):
+        """ Return the errors of the packages holding several products or
+            lots in the locations
+        """
+        Package = self.env['stock.quant.package']
 
-    def _apply_quant_policy_single_lot_id_single_product_id_per_package(self, policy, loc):
-        if policy == 'single_lot_id_single_product_id_per_package':
-            loc.quant_ids.mapped('package_id')
-            for package, quants in loc.quant_ids.groupby('package_id'):
-                if len(quants.mapped('lot_id')) > 1 or len(quants.mapped('product_id')) > 1:
-                    raise ValidationError(
-                        _('Package %s cannot contain more than one lot or product') % package.name
-                    )
+        self.env.cr.execute("""
+            SELECT DISTINCT package_id
+            FROM stock_quant
+            WHERE location_id IN %s
+            GROUP BY location_id, package_id
+            HAVING COUNT(DISTINCT lot_id) > 1 OR COUNT(DISTINCT product_id) > 1
+        """, (tuple(locations.ids),))
+        package_ids = [package_id for package_id, in self.env.cr.fetchall()]
+        packages = Package.browse([pid for pid in package_ids if pid])
+        names = {package.id: package.name for package in packages}
+        return [
+            _('Package %s cannot contain more than one lot or product')
+            % names.get(package_id, False)
+            for package_id in package_ids
+        ]
 
     @api.constrains('u_quant_policy', 'location_id')
     def apply_location_policy_change_to_descendants(self):
-        examine_locations = self.env["stock.location"].search(
-            [('location_id', 'child_of', self.ids)])
+        """ Propagate the policy of the locations in self down their
+            subtrees and check the stocked locations of the subtrees
+            against it
+        """
+        self._update_effective_quant_policy()
 
-        for examine_location in examine_locations:
-            if examine_location.quant_ids:
-                examine_location.apply_quant_policy()
+        examine_locations = self.search([('id', 'child_of', self.ids),
+                                         ('quant_ids', '!=', False)])
+        examine_locations.apply_quant_policy()
 
     def limits_orderpoints(self):
         """ Determines whether this location, or an ancestor, permits only a
@@ -561,8 +1030,61 @@ class StockLocation(models.Model):
         """
         self.ensure_one()
         limited = self.search([('u_limit_orderpoints', '=', True)])
-        return bool(self.search_count([('id', 'child_of', limited.ids),
-                                       ('id', '=', self.id)]))
+        return bool(self.filter_child_of(limited))
+
+    def filter_child_of(self, locations):
+        """ Return the locations of self that are locations or descendants
+            of one of locations, i.e. the same as searching for
+            ('id', 'child_of', locations.ids) within self, by comparing
+            the parent_left / parent_right of the locations in memory.
+        """
+        if not self or not locations:
+            return self.browse()
+
+        # Keep only the outermost intervals, which do not overlap, so that
+        # a single bisection finds the only candidate ancestor
+        outermost = []
+        for left, right in sorted(locations.mapped(
+                lambda l: (l.parent_left, l.parent_right))):
+            if not outermost or left >= outermost[-1][1]:
+                outermost.append((left, right))
+        lefts = [left for left, _right in outermost]
+
+        def is_child(location):
+            i = bisect_right(lefts, location.parent_left) - 1
+            return i >= 0 and location.parent_left < outermost[i][1]
+
+        return self.filtered(is_child)
+
+    def _get_child_of_domain(self):
+        """ Return a domain on stock.location equivalent to
+            ('id', 'child_of', self.ids), as a range of parent_left values
+            for each location in self.
+        """
+        domains = [[('parent_left', '>=', loc.parent_left),
+                    ('parent_left', '<', loc.parent_right)]
+                   for loc in self]
+        return expression.OR(domains) if domains else [('id', '=', False)]
+
+    @api.multi
+    def write(self, vals):
+        changed = {'barcode', 'name', 'active'} & set(vals)
+        if changed:
+            identifier_cache.invalidate(self, ['barcode', 'name'])
+        res = super(StockLocation, self).write(vals)
+        if changed:
+            identifier_cache.invalidate(self, ['barcode', 'name'])
+        return res
+
+    @api.multi
+    def unlink(self):
+        identifier_cache.invalidate(self, ['barcode', 'name'])
+        return super(StockLocation, self).unlink()
+
+    def _parent_store_compute(self):
+        res = super(StockLocation, self)._parent_store_compute()
+        self.browse()._update_effective_quant_policy()
+        return res
 
     def is_compatible_package(self, package_name):
         """ The package with name package_name is compatible
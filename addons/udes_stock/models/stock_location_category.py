@@ -3,6 +3,8 @@
 from odoo import api, fields, models, _
 from odoo.exceptions import ValidationError
 
+from ..common import cached_info
+
 
 class StockLocationCategory(models.Model):
     _name = 'stock.location.category'
@@ -61,6 +63,6 @@ class StockLocationCategory(models.Model):
         """
         res = []
         for cat in self:
-            res.append(cat._prepare_info(**kwargs))
+            res.append(cached_info(cat, cat._prepare_info, **kwargs))
 
         return res
@@ -0,0 +1,153 @@
+# -*- coding: utf-8 -*-
+
+import logging
+
+from odoo import api, fields, models
+
+from .. import pick_path
+
+_logger = logging.getLogger(__name__)
+
+
+class StockLocationHold(models.Model):
+    """Suggested drop off locations held for a picking for a short time, so
+    that parallel putaways are not suggested the same empty location.
+    Released when the picking is done or cancelled, or when they expire.
+    """
+
+    _name = "stock.location.hold"
+    _description = "Stock Location Hold"
+    _order = "id"
+
+    location_id = fields.Many2one(
+        "stock.location", string="Location", required=True, ondelete="cascade"
+    )
+    picking_id = fields.Many2one(
+        "stock.picking", string="Picking", required=True, index=True, ondelete="cascade"
+    )
+    date_expiry = fields.Datetime("Expiry Date", required=True, index=True)
+
+    _sql_constraints = [
+        ("location_uniq", "unique(location_id)", "A location can only be held once."),
+    ]
+
+    def _rank_locations(self, picking, locations):
+        """ Return the locations ordered by the best fit for the move lines
+            of the picking: an exact match of the height and speed
+            categories, the distance from the source location of the
+            picking and the fill level.
+        """
+        products = picking.move_line_ids.mapped("product_id")
+        heights = products.mapped("u_height_category_id")
+        speeds = products.mapped("u_speed_category_id")
+        src = picking.location_id
+        start = (src.posx, src.posy, src.posz)
+
+        def rank(location):
+            fit = (location.u_height_category_id in heights) + (
+                location.u_speed_category_id in speeds
+            )
+            position = (location.posx, location.posy, location.posz)
+            return (
+                -fit,
+                pick_path.distance(start, position),
+                location.u_quant_count,
+                location.id,
+            )
+
+        return locations.sorted(key=rank)
+
+    def _try_hold(self, picking, location, ttl):
+        """ Hold the location for the picking unless it is held by another
+            picking. The insert is atomic, so two workers can not hold the
+            same location.
+        """
+        self.env.cr.execute(
+            """
+            INSERT INTO stock_location_hold
+                (location_id, picking_id, date_expiry,
+                 create_uid, create_date, write_uid, write_date)
+            VALUES (%(location_id)s, %(picking_id)s,
+                    (now() at time zone 'UTC') + %(ttl)s * interval '1 second',
+                    %(uid)s, now() at time zone 'UTC',
+                    %(uid)s, now() at time zone 'UTC')
+            ON CONFLICT (location_id) DO UPDATE
+                SET picking_id = EXCLUDED.picking_id,
+                    date_expiry = EXCLUDED.date_expiry,
+                    write_uid = EXCLUDED.write_uid,
+                    write_date = EXCLUDED.write_date
+                WHERE stock_location_hold.picking_id = EXCLUDED.picking_id
+                   OR stock_location_hold.date_expiry < EXCLUDED.write_date
+            RETURNING id
+            """,
+            {"location_id": location.id, "picking_id": picking.id, "ttl": ttl, "uid": self.env.uid},
+        )
+        return bool(self.env.cr.fetchone())
+
+    @api.model
+    def allocate(self, picking, locations):
+        """ Return the location of locations held for the picking, holding
+            the best ranked one not held by another picking if it has none.
+            The hold lasts the hold time of the picking type of the picking.
+        """
+        ttl = picking.picking_type_id.u_drop_location_hold_ttl
+        if not ttl or not locations:
+            return locations
+
+        self.invalidate_cache()
+        holds = self.sudo().search(
+            [
+                ("location_id", "in", locations.ids),
+                ("date_expiry", ">", fields.Datetime.now()),
+            ]
+        )
+        own = holds.filtered(lambda h: h.picking_id == picking).mapped("location_id")
+        if own:
+            # Extend the hold of the locations already handed out
+            for location in own:
+                self._try_hold(picking, location, ttl)
+            return own
+
+        free = locations - holds.mapped("location_id")
+        for location in self._rank_locations(picking, free):
+            if self._try_hold(picking, location, ttl):
+                return location
+
+        _logger.info("No free location to hold for %s among %s", picking.name, locations)
+        return locations.browse()
+
+    @api.model
+    def get_available(self, picking, locations):
+        """ Return the locations of locations not held by another picking,
+            and the locations held for the picking. Nothing is held.
+        """
+        if not picking.picking_type_id.u_drop_location_hold_ttl:
+            return locations
+
+        holds = self.sudo().search(
+            [
+                "|",
+                ("location_id", "in", locations.ids),
+                ("picking_id", "=", picking.id),
+                ("date_expiry", ">", fields.Datetime.now()),
+            ]
+        )
+        own = holds.filtered(lambda h: h.picking_id == picking).mapped("location_id")
+        return (locations - holds.mapped("location_id")) | own
+
+    @api.model
+    def release(self, pickings):
+        """ Release the locations held for the pickings """
+        if not pickings:
+            return
+        self.env.cr.execute(
+            "DELETE FROM stock_location_hold WHERE picking_id IN %s", (tuple(pickings.ids),)
+        )
+        self.invalidate_cache()
+
+    @api.model
+    def gc_expired_holds(self):
+        """ Delete the expired holds """
+        self.env.cr.execute(
+            "DELETE FROM stock_location_hold WHERE date_expiry < now() at time zone 'UTC'"
+        )
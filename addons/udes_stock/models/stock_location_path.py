@@ -16,9 +16,8 @@ class PushedFlow(models.Model):
     def get_path_from_location(self, location):
         """Find a single stock.location.path for which the given location is
         a valid starting location."""
-        push_steps = self.search(
-            [('location_from_id', 'parent_of', [location.id, ]),
-             ('u_push_on_drop', '=', True)])
+        push_steps = self.search([('u_push_on_drop', '=', True)]).filtered(
+            lambda p: location.filter_child_of(p.location_from_id))
         if push_steps:
             return push_steps.sorted(key=lambda p: p.location_from_id.parent_left, reverse=True)[0]
         return self.browse()
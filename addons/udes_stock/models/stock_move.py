@@ -3,6 +3,8 @@
 from odoo import api, models, fields, _
 from odoo.exceptions import UserError
 
+from ..common import parse_fields_to_fetch, profile_phase, with_info_cache
+
 import logging
 
 _logger = logging.getLogger(__name__)
@@ -30,7 +32,7 @@ class StockMove(models.Model):
             .filtered(lambda x: x.qty_done == 0.0)\
             .write({'move_id': new_move, 'product_uom_qty': 0})
 
-    def _prepare_info(self):
+    def _prepare_info(self, fields_to_fetch=None):
         """
             Prepares the following info of the move in self:
             - id: int
@@ -41,25 +43,40 @@ class StockMove(models.Model):
             - product_qty: float
             - quantity_done: float
             - move_line_ids: [{stock.move.line}]
+
+            @param fields_to_fetch: array of string
+                Subset of the default fields to return, dotted paths
+                restrict the info of the related records
         """
         self.ensure_one()
 
-        return {"id": self.id,
-                "location_id": self.location_id.get_info()[0],
-                "location_dest_id": self.location_dest_id.get_info()[0],
-                "ordered_qty": self.ordered_qty,
-                "product_qty": self.product_qty,
-                "quantity_done": self.quantity_done,
-                "product_id": self.product_id.get_info()[0],
-                "moves_line_ids": self.move_line_ids.get_info(),
+        top_level, nested = parse_fields_to_fetch(fields_to_fetch)
+
+        info = {"id": lambda m: m.id,
+                "location_id": lambda m: m.location_id.get_info(
+                    fields_to_fetch=nested.get("location_id"))[0],
+                "location_dest_id": lambda m: m.location_dest_id.get_info(
+                    fields_to_fetch=nested.get("location_dest_id"))[0],
+                "ordered_qty": lambda m: m.ordered_qty,
+                "product_qty": lambda m: m.product_qty,
+                "quantity_done": lambda m: m.quantity_done,
+                "product_id": lambda m: m.product_id.get_info(
+                    fields_to_fetch=nested.get("product_id"))[0],
+                "moves_line_ids": lambda m: m.move_line_ids.get_info(
+                    fields_to_fetch=nested.get("moves_line_ids")),
                }
 
-    def get_info(self):
+        if not top_level:
+            top_level = info.keys()
+
+        return {key: value(self) for key, value in info.items() if key in top_level}
+
+    def get_info(self, **kwargs):
         """ Return a list with the information of each move in self.
         """
         res = []
-        for move in self:
-            res.append(move._prepare_info())
+        for move in with_info_cache(self):
+            res.append(move._prepare_info(**kwargs))
 
         return res
 
@@ -280,20 +297,27 @@ class StockMove(models.Model):
         don't return any extra moves that may have been created
         by refactoring.
         """
-        res = super(StockMove, self)._action_assign()
+        # Set when simulating stock reservation
+        profile = self.env.context.get('reservation_profile')
+
+        with profile_phase(self, profile, 'assign'):
+            res = super(StockMove, self)._action_assign()
 
-        assign_moves = self.exists()._action_refactor(stage='assign')
+        with profile_phase(self, profile, 'refactor'):
+            assign_moves = self.exists()._action_refactor(stage='assign')
 
         for picking_type, moves in assign_moves.groupby('picking_type_id'):
             # location suggestions
             if picking_type.u_drop_location_preprocess:
                 moves.mapped('picking_id').apply_drop_location_policy()
 
-        assign_moves.mapped('picking_id')._reserve_full_packages()
+        with profile_phase(self, profile, 'full_packages'):
+            assign_moves.mapped('picking_id')._reserve_full_packages()
         return res
 
     def _action_done(self):
-        """Extend _action_done to trigger refactor action, and push from drop
+        """Extend _action_done to trigger refactor action, push from drop and
+        queue reservation triggers for the stock that has arrived.
 
         Odoo returns completed moves.
         Therefore we will keep track of moves created by the refactor and
@@ -304,6 +328,8 @@ class StockMove(models.Model):
         post_refactor_done_moves = done_moves._action_refactor(stage='validate')
 
         post_refactor_done_moves.push_from_drop()
+        self.env['stock.reservation.trigger'].queue_move_lines(
+            post_refactor_done_moves.mapped('move_line_ids'))
         return post_refactor_done_moves
 
     def push_from_drop(self):
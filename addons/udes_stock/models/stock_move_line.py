@@ -6,11 +6,32 @@ from odoo.tools.float_utils import float_compare, float_round
 from copy import deepcopy
 from collections import Counter, defaultdict
 
+from ..common import parse_fields_to_fetch, with_info_cache
+
+# Fields of the move lines that define the tasks of a batch, changing any
+# of them takes the move lines out of the task queue of the batch
+TASK_QUEUE_FIELDS = {
+    "picking_id",
+    "product_id",
+    "location_id",
+    "package_id",
+    "lot_id",
+    "product_uom_qty",
+}
+
 
 class StockMoveLine(models.Model):
     _inherit = "stock.move.line"
 
     u_grouping_key = fields.Char("Key", compute="compute_grouping_key")
+    u_task_sequence = fields.Integer(
+        "Task Sequence",
+        default=0,
+        copy=False,
+        index=True,
+        help="Position of the task of the move line in the task queue of "
+        "its batch, 0 when it is not queued.",
+    )
 
     def _get_pick_type(self):
         return self.move_id.picking_type_id.id if self.move_id else False
@@ -208,7 +229,17 @@ class StockMoveLine(models.Model):
         # to be marked as done only
         move_lines._assert_result_package(result_package)
 
-        mls_done = MoveLine.browse()
+        if loc_dest_instance is not None:
+            # HERE(ale): updating the dest loc with the values shared by
+            # all the move lines to have a single invocation of its
+            # constraint handler (see below)
+            values["location_dest_id"] = loc_dest_instance.id
+
+        # it might be useful when extending the method
+        if parent_package:
+            values["u_result_parent_package_id"] = parent_package.id
+
+        lines_values = []
         for ml in move_lines:
             ml_values = values.copy()
             # Check if there is specific info for the move_line product
@@ -222,19 +253,12 @@ class StockMoveLine(models.Model):
                 )
             else:
                 ml_values["qty_done"] = ml.product_qty
-            mls_done |= ml._mark_as_done(ml_values)
-
-        if loc_dest_instance is not None:
-            # HERE(ale): updating the dest loc here to have a single
-            # invocation of its constraint handler (see below)
-            mls_done.write({"location_dest_id": loc_dest_instance.id})
+            lines_values.append((ml, ml_values))
 
         # TODO: at this point products_info_by_product should be with qty_todo = 0?
         #       No necessarily, can we have add unexpected parts and not enough stock?
 
-        # it might be useful when extending the method
-        if parent_package:
-            mls_done.write({"u_result_parent_package_id": parent_package.id})
+        mls_done = MoveLine._mark_lines_as_done(lines_values)
 
         if result_package and picking is not None:
             # Print the package label
@@ -593,19 +617,63 @@ class StockMoveLine(models.Model):
         """ Upate the move line with values and splits it if needed.
         """
         self.ensure_one()
-        if "qty_done" not in values:
-            raise ValidationError(
-                _("Cannot mark as done move line %s of picking %s without " "quantity done")
-                % (self.id, self.picking_id.name)
-            )
+        return self._mark_lines_as_done([(self, values)], split=split)
+
+    @api.model
+    def _mark_lines_as_done(self, lines_values, split=True):
+        """ Update each move line of lines_values, a list of
+            (move line, values) tuples, with its values and split the
+            ones that need it, see _split.
+
+            The values shared by all the move lines are written in one
+            go after the others, which are written together for the
+            move lines with the same values, so that the constraints run
+            once per set of values rather than once per move line.
+
+            returns the updated move lines
+        """
+        MoveLine = self.env["stock.move.line"]
+
+        for ml, values in lines_values:
+            if "qty_done" not in values:
+                raise ValidationError(
+                    _("Cannot mark as done move line %s of picking %s without " "quantity done")
+                    % (ml.id, ml.picking_id.name)
+                )
+
+        mls = MoveLine.browse([ml.id for ml, _values in lines_values])
+        if not mls:
+            return mls
 
         if split:
-            self.qty_done = values["qty_done"]
-            self._split()
+            split_ids = defaultdict(list)
+            for ml, values in lines_values:
+                split_values = ml._split_for_qty_done(values["qty_done"])[1]
+                if split_values:
+                    split_ids[tuple(sorted(split_values.items()))].append(ml.id)
+            # - bypass_reservation_update:
+            #   avoids to execute code specific for Odoo UI at stock.move.line.write()
+            for split_values, ml_ids in split_ids.items():
+                MoveLine.browse(ml_ids).with_context(bypass_reservation_update=True).write(
+                    dict(split_values)
+                )
 
-        self.write(values)
+        shared_values = dict(
+            set.intersection(*(set(values.items()) for _ml, values in lines_values))
+        )
+        line_ids = defaultdict(list)
+        for ml, values in lines_values:
+            line_values = tuple(
+                sorted((k, v) for k, v in values.items() if k not in shared_values)
+            )
+            line_ids[line_values].append(ml.id)
+        for line_values, ml_ids in line_ids.items():
+            if line_values:
+                MoveLine.browse(ml_ids).write(dict(line_values))
+        if shared_values:
+            mls.write(shared_values)
 
-        return self
+        return mls
 
     def _split(self):
         """ Split the move line in self if:
@@ -615,49 +683,60 @@ class StockMoveLine(models.Model):
             returns either self or the new move line
         """
         self.ensure_one()
-        res = self
-        qty_done = self.qty_done
-        if (
+        new_ml, values = self._split_for_qty_done(self.qty_done)
+        if values:
+            # - bypass_reservation_update:
+            #   avoids to execute code specific for Odoo UI at stock.move.line.write()
+            self.with_context(bypass_reservation_update=True).write(values)
+
+        return new_ml
+
+    def _split_for_qty_done(self, qty_done):
+        """ Create a new move line with the quantity left to do when the
+            move line in self has to be split for qty_done, see _split.
+
+            returns the new move line, or self when there is no need to
+            split it, and the values to update self with, which the
+            caller has to write
+        """
+        self.ensure_one()
+        if not (
             qty_done > 0
             and float_compare(
                 qty_done, self.product_uom_qty, precision_rounding=self.product_uom_id.rounding
             )
             < 0
         ):
-            quantity_left_todo = float_round(
-                self.product_uom_qty - qty_done,
-                precision_rounding=self.product_uom_id.rounding,
-                rounding_method="UP",
-            )
-            ordered_quantity_left_todo = quantity_left_todo
-            done_to_keep = qty_done
-            ordered_qty = qty_done
-            if qty_done > self.ordered_qty:
-                ordered_qty = self.ordered_qty
-                ordered_quantity_left_todo = 0
-
-            # create new move line with the qty_done
-            new_ml = self.copy(
-                default={
-                    "product_uom_qty": quantity_left_todo,
-                    "ordered_qty": ordered_quantity_left_todo,
-                    "qty_done": 0.0,
-                    "result_package_id": False,
-                    "lot_name": False,
-                }
-            )
-            # updated ordered_qty otherwise odoo will use product_uom_qty
-            # new_ml.ordered_qty = ordered_quantity_left_todo
-            # update self move line quantity to do
-            # - bypass_reservation_update:
-            #   avoids to execute code specific for Odoo UI at stock.move.line.write()
-            self.with_context(bypass_reservation_update=True).write(
-                {"product_uom_qty": done_to_keep, "qty_done": qty_done,}
-            )
-            self.ordered_qty = ordered_qty
-            res = new_ml
+            return self, {}
 
-        return res
+        quantity_left_todo = float_round(
+            self.product_uom_qty - qty_done,
+            precision_rounding=self.product_uom_id.rounding,
+            rounding_method="UP",
+        )
+        ordered_quantity_left_todo = quantity_left_todo
+        done_to_keep = qty_done
+        ordered_qty = qty_done
+        if qty_done > self.ordered_qty:
+            ordered_qty = self.ordered_qty
+            ordered_quantity_left_todo = 0
+
+        # create new move line with the qty_done
+        new_ml = self.copy(
+            default={
+                "product_uom_qty": quantity_left_todo,
+                "ordered_qty": ordered_quantity_left_todo,
+                "qty_done": 0.0,
+                "result_package_id": False,
+                "lot_name": False,
+            }
+        )
+        # updated ordered_qty otherwise odoo will use product_uom_qty
+        # update self move line quantity to do
+        return (
+            new_ml,
+            {"product_uom_qty": done_to_keep, "qty_done": qty_done, "ordered_qty": ordered_qty},
+        )
 
     def _split_by_qty(self, qty):
         """ Split current move line in self in two move lines, where the new one
@@ -765,7 +844,7 @@ class StockMoveLine(models.Model):
             res[move_line.product_id] += move_line.product_uom_qty
         return res
 
-    def _prepare_info(self):
+    def _prepare_info(self, fields_to_fetch=None):
         """
             Prepares the following info of the move line self:
             - id: int
@@ -779,39 +858,50 @@ class StockMoveLine(models.Model):
             - product_uom_qty: float
             - qty_done: float
             - write_date: datetime
+
+            @param fields_to_fetch: array of string
+                Subset of the default fields to return, dotted paths
+                restrict the info of the related records
         """
         self.ensure_one()
 
-        package_info = False
-        result_package_info = False
-        result_parent_package_info = False
-        if self.package_id:
-            package_info = self.package_id.get_info()[0]
-        if self.result_package_id:
-            result_package_info = self.result_package_id.get_info()[0]
-        if self.u_result_parent_package_id:
-            result_parent_package_info = self.u_result_parent_package_id.get_info()[0]
-
-        return {
-            "id": self.id,
-            "create_date": self.create_date,
-            "location_id": self.location_id.get_info()[0],
-            "location_dest_id": self.location_dest_id.get_info()[0],
-            "lot_id": self.lot_id.name,
-            "package_id": package_info,
-            "result_package_id": result_package_info,
-            "u_result_parent_package_id": result_parent_package_info,
-            "product_uom_qty": self.product_uom_qty,
-            "qty_done": self.qty_done,
-            "write_date": self.write_date,
+        top_level, nested = parse_fields_to_fetch(fields_to_fetch)
+
+        def _prepare_package_info(field):
+            package = self[field]
+            if not package:
+                return False
+            return package.get_info(fields_to_fetch=nested.get(field))[0]
+
+        info = {
+            "id": lambda ml: ml.id,
+            "create_date": lambda ml: ml.create_date,
+            "location_id": lambda ml: ml.location_id.get_info(
+                fields_to_fetch=nested.get("location_id"))[0],
+            "location_dest_id": lambda ml: ml.location_dest_id.get_info(
+                fields_to_fetch=nested.get("location_dest_id"))[0],
+            "lot_id": lambda ml: ml.lot_id.name,
+            "package_id": lambda ml: _prepare_package_info("package_id"),
+            "result_package_id":
+                lambda ml: _prepare_package_info("result_package_id"),
+            "u_result_parent_package_id":
+                lambda ml: _prepare_package_info("u_result_parent_package_id"),
+            "product_uom_qty": lambda ml: ml.product_uom_qty,
+            "qty_done": lambda ml: ml.qty_done,
+            "write_date": lambda ml: ml.write_date,
         }
 
-    def get_info(self):
+        if not top_level:
+            top_level = info.keys()
+
+        return {key: value(self) for key, value in info.items() if key in top_level}
+
+    def get_info(self, **kwargs):
         """ Return a list with the information of each move line in self.
         """
         res = []
-        for line in self:
-            res.append(line._prepare_info())
+        for line in with_info_cache(self):
+            res.append(line._prepare_info(**kwargs))
 
         return res
 
@@ -919,7 +1009,28 @@ class StockMoveLine(models.Model):
             location = self.env["stock.location"].browse(values["location_dest_id"])
             self._validate_location_dest(location=location)
 
-        return super(StockMoveLine, self).write(values)
+        res = super(StockMoveLine, self).write(values)
+        if TASK_QUEUE_FIELDS.intersection(values):
+            self._reset_task_sequence()
+
+        return res
+
+    def _reset_task_sequence(self):
+        """Take the move lines in self out of the task queue of their batch,
+        so that the queue is rebuilt the next time it is read, see
+        StockPickingBatch.get_next_task
+        """
+        if not self.ids:
+            return
+        self.env.cr.execute(
+            """
+            UPDATE stock_move_line
+            SET u_task_sequence = 0
+            WHERE id IN %s AND u_task_sequence != 0
+            """,
+            (tuple(self.ids),),
+        )
+        self.invalidate_cache(["u_task_sequence"], self.ids)
 
     ## Drop Location Constraint
 
@@ -932,6 +1043,8 @@ class StockMoveLine(models.Model):
             is 'enforce' or 'enforce_with_empty'.
         """
 
+        LocationHold = self.env["stock.location.hold"]
+
         if location is None:
             location = self.mapped("location_dest_id")
 
@@ -969,8 +1082,9 @@ class StockMoveLine(models.Model):
                 if constraint == "enforce_with_empty":
                     locations = locations | picking.get_empty_locations()
 
-                # location should be one of the suggested locations, if any
-                if locations and location not in locations:
+                # location should be one of the suggested locations, if any,
+                # that are not held for another picking
+                if locations and location not in LocationHold.get_available(picking, locations):
                     raise ValidationError(
                         _("Drop off location must be one of the suggested " "locations")
                     )
@@ -1038,26 +1152,68 @@ class StockMoveLine(models.Model):
         if done_lines:
             raise ValidationError(_("Cannot update move lines that are already 'done'."))
 
+    def _get_result_package_relations(self, packages):
+        """ Return two dictionaries of the in progress move lines that
+            have any of the packages as result package or result parent
+            package:
+            - package id: ids of the packages put into it
+            - package id: ids of the packages it is put into
+            A move line without result (parent) package is keyed by False.
+        """
+        MoveLine = self.env["stock.move.line"]
+
+        children = defaultdict(set)
+        parents = defaultdict(set)
+        if not packages:
+            return children, parents
+
+        package_ids = [i for i in packages.ids if isinstance(i, int)]
+        domain = [
+            ("state", "=", "assigned"),
+            "|",
+            ("result_package_id", "in", package_ids),
+            ("u_result_parent_package_id", "in", package_ids),
+        ]
+        if len(package_ids) < len(packages):
+            # New packages of an onchange are not in the database yet
+            relations = [
+                (ml.result_package_id.id, ml.u_result_parent_package_id.id)
+                for ml in MoveLine.search(domain)
+            ]
+        else:
+            # Pending values of the move lines must be up to date in the db
+            self.recompute()
+            query = MoveLine._where_calc(domain)
+            MoveLine._apply_ir_rules(query, "read")
+            from_clause, where_clause, params = query.get_sql()
+            self.env.cr.execute(
+                """
+                SELECT DISTINCT "stock_move_line".result_package_id,
+                                "stock_move_line".u_result_parent_package_id
+                FROM {from_clause}
+                WHERE {where}
+                """.format(from_clause=from_clause, where=where_clause),
+                params,
+            )
+            relations = self.env.cr.fetchall()
+
+        for package_id, parent_id in relations:
+            children[parent_id or False].add(package_id or False)
+            parents[package_id or False].add(parent_id or False)
+
+        return children, parents
+
     @api.constrains("result_package_id", "u_result_parent_package_id")
     @api.onchange("result_package_id", "u_result_parent_package_id")
     def _check_resultant_package_level(self):
-        MoveLine = self.env["stock.move.line"]
-        # Collect move lines with packages related to those being checked which are in progress
+        # Collect the package relations of the move lines in progress with
+        # packages related to those being checked
         package_ids = self.mapped("result_package_id") | self.mapped("u_result_parent_package_id")
-        package_mls = MoveLine.search(
-            [
-                ("state", "=", "assigned"),
-                "|",
-                ("result_package_id", "in", package_ids.mapped("id")),
-                ("u_result_parent_package_id", "in", package_ids.mapped("id")),
-            ]
-        )
+        children, parents = self._get_result_package_relations(package_ids)
 
         for ml in self:
             storage_format = ml.u_picking_type_id.u_target_storage_format
-            result_package_is_parent = package_mls.filtered(
-                lambda package_ml: ml.result_package_id == package_ml.u_result_parent_package_id
-            )
+            result_package_is_parent = ml.result_package_id.id in children
             if storage_format == "product" and (
                 ml.u_result_parent_package_id or ml.result_package_id
             ):
@@ -1075,12 +1231,7 @@ class StockMoveLine(models.Model):
             elif storage_format == "pallet_packages" and (
                 (
                     result_package_is_parent
-                    or (
-                        package_mls.filtered(
-                            lambda package_ml: ml.u_result_parent_package_id
-                            == package_ml.result_package_id
-                        )
-                    )
+                    or ml.u_result_parent_package_id.id in parents
                     or ml.result_package_id.u_package_depth >= 2
                 )
             ):
@@ -3,18 +3,28 @@
 from collections import OrderedDict, defaultdict
 from lxml import etree
 
-from odoo import api, fields, models, _
+from odoo import api, fields, models, registry, _
 from odoo.exceptions import ValidationError, UserError
-
-from ..common import check_many2one_validity
+from odoo.osv import expression
+from odoo.tools.float_utils import float_compare
+
+from ..common import (
+    check_many2one_validity,
+    parse_fields_to_fetch,
+    profile_phase,
+    with_info_cache,
+)
 from . import common
 
 import logging
 
 _logger = logging.getLogger(__name__)
 
+import base64
+import json
 import random
 import time
+from concurrent.futures import ThreadPoolExecutor
 
 from psycopg2 import OperationalError, errorcodes
 
@@ -23,7 +33,9 @@ PG_CONCURRENCY_ERRORS_TO_RETRY = (
     errorcodes.SERIALIZATION_FAILURE,
     errorcodes.DEADLOCK_DETECTED,
 )
-MAX_TRIES_ON_CONCURRENCY_FAILURE = 5
+# First key of the advisory locks taken by reserve_stock, the second key is
+# the id of the picking type being reserved
+RESERVATION_LOCK_NAMESPACE = 8734
 
 
 def _update_move_lines_and_log_swap(move_lines, packs, other_pack):
@@ -47,6 +59,11 @@ def _update_move_lines_and_log_swap(move_lines, packs, other_pack):
     _logger.info(msg)
 
 
+# Suggested location policies whose locations are held for the picking,
+# the ones suggesting empty locations
+HOLD_LOCATION_POLICIES = ("by_height_speed",)
+
+
 def allow_preprocess(func):
     func._allow_preprocess = True
     return func
@@ -289,11 +306,14 @@ class StockPicking(models.Model):
         Ensure we don't incorrectly validate pending pickings.
         Check if picking batch is now complete
         """
+        LocationHold = self.env["stock.location.hold"]
+
         self.assert_not_pending()
         mls = self.mapped("move_line_ids")
         # Prevent recomputing the batch stat
         batches = mls.mapped("picking_id.batch_id")
         res = super(StockPicking, self.with_context(lock_batch_state=True)).action_done()
+        LocationHold.release(self)
 
         # just in case move lines change on action done, for instance cancelling
         # a picking
@@ -322,8 +342,11 @@ class StockPicking(models.Model):
         """
         Check if picking batch is now complete
         """
+        LocationHold = self.env["stock.location.hold"]
+
         batch = self.mapped("batch_id")
         res = super(StockPicking, self.with_context(lock_batch_state=True)).action_cancel()
+        LocationHold.release(self)
         batch._compute_state()
         return res
 
@@ -335,7 +358,12 @@ class StockPicking(models.Model):
         # removed in the write
         batches = self.mapped(lambda p: p.batch_id)
         context_vals = {"orig_batches": batches} if batches else {}
-        return super(StockPicking, self.with_context(**context_vals)).write(vals)
+        res = super(StockPicking, self.with_context(**context_vals)).write(vals)
+
+        if "batch_id" in vals:
+            self.mapped("move_line_ids")._reset_task_sequence()
+
+        return res
 
     def button_validate(self):
         """ Ensure we don't incorrectly validate pending pickings."""
@@ -687,6 +715,7 @@ class StockPicking(models.Model):
         """
         Location = self.env["stock.location"]
         Package = self.env["stock.quant.package"]
+        ValidationJob = self.env["stock.validation.job"]
 
         self.assert_valid_state()
 
@@ -781,6 +810,9 @@ class StockPicking(models.Model):
                 raise ValidationError(
                     _("Cannot validate transfer because there" " are move lines todo")
                 )
+            if picking.picking_type_id.u_validate_async:
+                # The done quantities are recorded, queue the validation
+                return ValidationJob.enqueue(picking)
             # by default action_done will backorder the stock.move.lines todo
             # validate stock.picking
             with self.statistics() as stats:
@@ -797,19 +829,39 @@ class StockPicking(models.Model):
             by checking if all move.lines
             within a picking is present in mls
         """
-        mls_moves = mls.mapped("move_id")
-        # return (mls_moves | self.move_lines) != mls_moves or \
-        # (mls | self.move_line_ids) != mls or \
-        # self.mapped('move_lines.move_orig_ids').filtered(lambda x: x.state not in ('done', 'cancel'))
+        # Group the move lines by move in one pass
+        mls_by_move = dict(mls.groupby("move_id"))
         for move in self.move_lines:
             if (
-                move not in mls_moves
-                or not move.move_line_ids == mls.filtered(lambda x: x.move_id == move)
+                move not in mls_by_move
+                or not move.move_line_ids == mls_by_move[move]
                 or move.move_orig_ids.filtered(lambda x: x.state not in ("done", "cancel"))
             ):
                 return True
         return False
 
+    def _backorder_pickings_for_move_lines(self, mls):
+        """ Split the pickings of mls so that each of them holds only move
+            lines of mls. Pickings that hold other work are backordered,
+            one backorder per picking, in a single pass over mls.
+
+            Returns a tuple of the pickings holding exactly the move lines
+            of mls, and the backorders created among them.
+        """
+        Picking = self.env["stock.picking"]
+
+        picking_ids = []
+        backorder_ids = []
+        for pick, pick_mls in mls.groupby("picking_id"):
+            if pick._requires_backorder(pick_mls):
+                backorder = pick._backorder_movelines(pick_mls)
+                backorder_ids.append(backorder.id)
+                picking_ids.append(backorder.id)
+            else:
+                picking_ids.append(pick.id)
+
+        return Picking.browse(picking_ids), Picking.browse(backorder_ids)
+
     def _backorder_movelines(self, mls=None):
         """ Creates a backorder pick from self (expects a singleton)
             and a subset of stock.move.lines are then moved into it.
@@ -831,11 +883,10 @@ class StockPicking(models.Model):
                 _("There is no move lines within " "picking %s to backorder" % self.name)
             )
 
-        new_moves = Move.browse()
-
-        for current_move in mls.mapped("move_id"):
-            current_mls = mls.filtered(lambda x: x.move_id == current_move)
-            new_moves |= current_move.split_out_move_lines(current_mls)
+        new_move_ids = []
+        for current_move, current_mls in mls.groupby("move_id"):
+            new_move_ids.append(current_move.split_out_move_lines(current_mls).id)
+        new_moves = Move.browse(new_move_ids)
 
         # Create picking for completed move lines
         bk_picking = self.copy(
@@ -938,6 +989,174 @@ class StockPicking(models.Model):
             TODO: bulky
         """
         Picking = self.env["stock.picking"]
+
+        domain, order = self._get_pickings_domain(
+            origin=origin,
+            package_name=package_name,
+            states=states,
+            picking_type_ids=picking_type_ids,
+            allops=allops,
+            location_id=location_id,
+            product_id=product_id,
+            backorder_id=backorder_id,
+            result_package_id=result_package_id,
+            picking_priorities=picking_priorities,
+            picking_ids=picking_ids,
+            bulky=bulky,
+            batch_id=batch_id,
+            extra_domain=extra_domain,
+        )
+        if domain is None:
+            return Picking.browse()
+
+        pickings = Picking.search(domain, order=order)
+
+        return pickings
+
+    def get_pickings_page(self, limit, cursor=None, **kwargs):
+        """ Search for a page of the pickings get_pickings would return,
+            in the order given by _order.
+
+            @param limit: int
+                Maximum number of pickings to return
+            @param (optional) cursor: string
+                Opaque cursor returned with the previous page, the page
+                starts after the picking it points to
+            @param kwargs
+                The search criteria of get_pickings
+
+            Returns the pickings and the cursor of the next page, which is
+            None when there are no more pickings. The page is found with
+            keyset pagination, so it costs the same query however deep it is.
+        """
+        Picking = self.env["stock.picking"]
+
+        if not isinstance(limit, int) or limit < 1:
+            raise ValidationError(_("The page size must be a positive integer"))
+
+        domain = self._get_pickings_domain(**kwargs)[0]
+        if domain is None:
+            return Picking.browse(), None
+
+        query = Picking._where_calc(domain)
+        Picking._apply_ir_rules(query, "read")
+        from_clause, where_clause, params = query.get_sql()
+        where = [where_clause or "TRUE"]
+        if cursor:
+            keyset, keyset_params = self._get_order_keyset(
+                self._decode_pickings_cursor(cursor), table='"stock_picking"'
+            )
+            where.append(keyset)
+            params = list(params) + keyset_params
+
+        self.env.cr.execute(
+            """
+            SELECT {key}
+            FROM {from_clause}
+            WHERE {where}
+            ORDER BY {order}
+            LIMIT %s
+            """.format(
+                key=self._get_order_key_columns('"stock_picking"'),
+                from_clause=from_clause,
+                where=" AND ".join(where),
+                order=self._get_order_key_order('"stock_picking"'),
+            ),
+            list(params) + [limit + 1],
+        )
+        rows = self.env.cr.fetchall()
+
+        next_cursor = None
+        if len(rows) > limit:
+            rows = rows[:limit]
+            next_cursor = self._encode_pickings_cursor(rows[-1])
+
+        return Picking.browse([row[0] for row in rows]), next_cursor
+
+    def _get_order_key_columns(self, table):
+        """ Return the SQL selecting the keyset pagination key of the
+            pickings in table: id, priority, scheduled date and sequence.
+
+            Null values of the ordering columns are replaced by their
+            defaults so that the key is always comparable, the date is
+            passed around as text so 'infinity' survives the trip.
+        """
+        return """
+            {t}.id,
+            COALESCE({t}.priority, '1'),
+            COALESCE({t}.scheduled_date, 'infinity'::timestamp)::text,
+            COALESCE({t}.sequence, 0)
+        """.format(t=table)
+
+    def _get_order_key_order(self, table):
+        """ Return the SQL ORDER BY matching _order on the keyset
+            pagination key of the pickings in table.
+        """
+        return """
+            COALESCE({t}.priority, '1') DESC,
+            COALESCE({t}.scheduled_date, 'infinity'::timestamp) ASC,
+            COALESCE({t}.sequence, 0) ASC,
+            {t}.id ASC
+        """.format(t=table)
+
+    def _get_order_keyset(self, last_key, table):
+        """ Return the SQL condition and its parameters selecting the
+            pickings in table that come after last_key in _order.
+        """
+        picking_id, priority, scheduled_date, sequence = last_key
+        keyset = """
+            (COALESCE({t}.priority, '1') < %s
+             OR (COALESCE({t}.priority, '1') = %s
+                 AND (COALESCE({t}.scheduled_date, 'infinity'::timestamp) > %s::timestamp
+                      OR (COALESCE({t}.scheduled_date, 'infinity'::timestamp) = %s::timestamp
+                          AND (COALESCE({t}.sequence, 0) > %s
+                               OR (COALESCE({t}.sequence, 0) = %s AND {t}.id > %s))))))
+        """.format(t=table)
+        params = [
+            priority,
+            priority,
+            scheduled_date,
+            scheduled_date,
+            sequence,
+            sequence,
+            picking_id,
+        ]
+        return keyset, params
+
+    def _encode_pickings_cursor(self, key):
+        """ Return the opaque cursor of a keyset pagination key """
+        return base64.urlsafe_b64encode(json.dumps(list(key)).encode()).decode()
+
+    def _decode_pickings_cursor(self, cursor):
+        """ Return the keyset pagination key of an opaque cursor """
+        try:
+            key = json.loads(base64.urlsafe_b64decode(cursor.encode()).decode())
+            picking_id, priority, scheduled_date, sequence = key
+            return (int(picking_id), str(priority), str(scheduled_date), int(sequence))
+        except (AttributeError, TypeError, ValueError):
+            raise ValidationError(_("Invalid cursor: %s") % cursor)
+
+    def _get_pickings_domain(
+        self,
+        origin=None,
+        package_name=None,
+        states=None,
+        picking_type_ids=None,
+        allops=None,
+        location_id=None,
+        product_id=None,
+        backorder_id=None,
+        result_package_id=None,
+        picking_priorities=None,
+        picking_ids=None,
+        bulky=None,
+        batch_id=None,
+        extra_domain=None,
+    ):
+        """ Return the domain and order of the pickings searched by
+            get_pickings, see its parameters. The domain is None when
+            no picking can match.
+        """
         Package = self.env["stock.quant.package"]
         Users = self.env["res.users"]
 
@@ -968,7 +1187,7 @@ class StockPicking(models.Model):
         elif package_name:
             package = Package.get_package(package_name, no_results=True)
             if not package:
-                return Picking.browse()
+                return None, None
             domain = self._get_package_search_domain(package)
         elif picking_priorities:
             domain = [
@@ -1004,9 +1223,7 @@ class StockPicking(models.Model):
         if extra_domain:
             domain.extend(extra_domain)
 
-        pickings = Picking.search(domain, order=order)
-
-        return pickings
+        return domain, order
 
     def batch_to_user(self, user):
         """ Throws error if picking is batched to another user
@@ -1066,9 +1283,15 @@ class StockPicking(models.Model):
 
             @param (optional) priorities
                 Dictionary of priority_id:priority_name
+            @param (optional) fields_to_fetch: array of string
+                Subset of the default fields to return. Dotted paths,
+                e.g. moves_lines.product_id.barcode, restrict the info of
+                the related records in the same way
         """
         self.ensure_one()
 
+        top_level, nested = parse_fields_to_fetch(fields_to_fetch)
+
         if not priorities:
             priorities = OrderedDict(self._fields["priority"].selection)
 
@@ -1085,7 +1308,8 @@ class StockPicking(models.Model):
             "state": lambda p: p.state,
             "location_dest_id": lambda p: p.location_dest_id.id,
             "picking_type_id": lambda p: p.picking_type_id.id,
-            "moves_lines": lambda p: p.move_lines.get_info(),
+            "moves_lines": lambda p: p.move_lines.get_info(
+                fields_to_fetch=nested.get("moves_lines")),
             "picking_guidance": lambda p: p.get_picking_guidance(),
         }
 
@@ -1093,10 +1317,34 @@ class StockPicking(models.Model):
         if self.can_handle_partials() is False:
             info["u_pending"] = lambda p: p.u_pending
 
-        if not fields_to_fetch:
-            fields_to_fetch = info.keys()
+        if not top_level:
+            top_level = info.keys()
 
-        return {key: value(self) for key, value in info.items() if key in fields_to_fetch}
+        return {key: value(self) for key, value in info.items() if key in top_level}
+
+    def _prefetch_info(self):
+        """ Read the records serialized by get_info in one go per model,
+            rather than one record at a time as each picking is prepared.
+        """
+        moves = self.mapped("move_lines")
+        move_lines = moves.mapped("move_line_ids")
+        locations = (
+            moves.mapped("location_id")
+            | moves.mapped("location_dest_id")
+            | move_lines.mapped("location_id")
+            | move_lines.mapped("location_dest_id")
+        )
+        locations.mapped("barcode")
+        packages = (
+            move_lines.mapped("package_id")
+            | move_lines.mapped("result_package_id")
+            | move_lines.mapped("u_result_parent_package_id")
+        )
+        while packages:
+            packages.mapped("name")
+            packages = packages.mapped("children_ids")
+        moves.mapped("product_id.barcode")
+        move_lines.mapped("lot_id.name")
 
     def get_picking_guidance(self):
         """ Return dict of guidance info to aid user when picking """
@@ -1109,8 +1357,12 @@ class StockPicking(models.Model):
         # create a dict of priority_id:priority_name to avoid
         # to do it for each picking
         priorities = OrderedDict(self._fields["priority"].selection)
+        pickings = with_info_cache(self)
+        top_level = parse_fields_to_fetch(kwargs.get("fields_to_fetch"))[0]
+        if not top_level or "moves_lines" in top_level:
+            pickings._prefetch_info()
         res = []
-        for picking in self:
+        for picking in pickings:
             res.append(picking._prepare_info(priorities, **kwargs))
 
         return res
@@ -1159,7 +1411,7 @@ class StockPicking(models.Model):
         if domains is None:
             domains = []
 
-        domains.append(("id", "child_of", self.location_dest_id.id))
+        domains = expression.AND([domains, self.location_dest_id._get_child_of_domain()])
 
         return Location.search(domains)
 
@@ -1755,14 +2007,21 @@ class StockPicking(models.Model):
             self.check_policy_for_preprocessing(pick.picking_type_id.u_drop_location_policy)
             # Group by pallet or package
             for _pack, mls in pick.move_line_ids.groupby(by_pack_or_single):
-                locs = pick.get_suggested_locations(mls)
+                locs = pick.get_suggested_locations(mls, hold=True)
                 if locs:
                     mls.write({"location_dest_id": locs[0].id})
 
-    def get_suggested_locations(self, move_line_ids):
+    def get_suggested_locations(self, move_line_ids, hold=False):
         """ Dispatch the configured suggestion location policy to
             retrieve the suggested locations
+
+            When hold is set and the policy holds its locations, the
+            location suggested is held for the picking, see
+            stock.location.hold.allocate. Without it the candidate
+            locations are returned, and nothing is held.
         """
+        LocationHold = self.env["stock.location.hold"]
+
         result = self.env["stock.location"]
 
         # WS-MPS: use self.ensure_one() and don't loop (self is used in all but
@@ -1794,6 +2053,9 @@ class StockPicking(models.Model):
                     if func:
                         result = func(move_line_ids)
 
+                    if hold and policy in HOLD_LOCATION_POLICIES:
+                        result = LocationHold.allocate(picking, result)
+
         return result
 
     def get_empty_locations(self):
@@ -1802,7 +2064,7 @@ class StockPicking(models.Model):
             Expects a singleton instance.
         """
         return self._get_child_dest_locations(
-            [("u_blocked", "=", False), ("barcode", "!=", False), ("quant_ids", "=", False)]
+            [("u_blocked", "=", False), ("barcode", "!=", False), ("u_quant_count", "=", 0)]
         )
 
     def _check_picking_move_lines_suggest_location(self, move_line_ids):
@@ -1893,22 +2155,26 @@ class StockPicking(models.Model):
 
         default_location.ensure_one()
 
-        # Get empty locations where height and speed match product
-        candidate_locations = Location.search(
-            [
-                ("location_id", "child_of", default_location.id),
-                ("u_blocked", "=", False),
-                ("barcode", "!=", False),
-                ("u_height_category_id", "in", [height_category.id, False]),
-                ("u_speed_category_id", "in", [speed_category.id, False]),
-                # TODO(MTC): This should probably be a bit more inteligent perhaps
-                # get them all then do a filter for checking if theres space
-                ("quant_ids", "=", False),
-            ]
+        # Get empty locations where height and speed match product, which
+        # no available picking is dropping stock off in
+        return Location.search(
+            expression.AND(
+                [
+                    [
+                        ("id", "!=", default_location.id),
+                        ("u_blocked", "=", False),
+                        ("barcode", "!=", False),
+                        ("u_height_category_id", "in", [height_category.id, False]),
+                        ("u_speed_category_id", "in", [speed_category.id, False]),
+                        # TODO(MTC): This should probably be a bit more inteligent perhaps
+                        # get them all then do a filter for checking if theres space
+                        ("u_occupied", "=", False),
+                    ],
+                    default_location._get_child_of_domain(),
+                ]
+            )
         )
 
-        return self._location_not_in_other_move_lines(candidate_locations)
-
     def _get_suggested_location_by_orderpoint(self, move_line_ids):
         """ Same as by product, but the locations are search from order points
             and when there is no suggested location we don't return empty
@@ -1936,23 +2202,6 @@ class StockPicking(models.Model):
 
         return suggested_locations
 
-    def _location_not_in_other_move_lines(self, candidate_locations):
-        MoveLines = self.env["stock.move.line"]
-
-        for _indexes, valid_locations in candidate_locations.batched(size=1000):
-            # remove locations which are already used in move lines
-            valid_locations -= MoveLines.search(
-                [
-                    ("picking_id.state", "=", "assigned"),
-                    ("location_dest_id", "in", valid_locations.ids),
-                ]
-            ).mapped("location_dest_id")
-
-            if valid_locations:
-                return valid_locations
-
-        return self.env["stock.location"]
-
     def action_refactor(self):
         """Refactor all the moves in the pickings in self. May result in the
         pickings in self being deleted."""
@@ -2009,9 +2258,15 @@ class StockPicking(models.Model):
         # investigation, we've reserved the problematic stock
         self.action_assign()
 
-    def search_for_pickings(self, picking_type_id, picking_priorities, limit=1, domain=None):
+    def search_for_pickings(
+        self, picking_type_id, picking_priorities, limit=1, domain=None, skip_locked=False
+    ):
         """ Search for next available picking based on
             picking type and priorities
+
+            When skip_locked is set the pickings found are locked until the
+            end of the transaction, and pickings locked by other transactions
+            are skipped, so that concurrent users get different pickings.
         """
         Users = self.env["res.users"]
         PickingType = self.env["stock.picking.type"]
@@ -2041,13 +2296,50 @@ class StockPicking(models.Model):
         )
 
         # Note: order should be determined by stock.picking._order
-        picking = self.search(search_domain, limit=limit)
+        if skip_locked:
+            picking = self._search_skip_locked(search_domain, limit=limit)
+        else:
+            picking = self.search(search_domain, limit=limit)
 
         if not picking:
             return None
 
         return picking
 
+    def _search_skip_locked(self, domain, limit=None):
+        """ Search pickings like search() in the order given by _order,
+            locking the rows of the pickings found with FOR UPDATE SKIP
+            LOCKED. Pickings already locked by other transactions are
+            skipped rather than waited for.
+        """
+        # Stored computed fields such as state must be up to date in the db
+        self.recompute()
+        query = self._where_calc(domain)
+        self._apply_ir_rules(query, "read")
+        order_by = self._generate_order_by(None, query)
+        from_clause, where_clause, params = query.get_sql()
+        limit_clause = ""
+        if limit:
+            limit_clause = "LIMIT %s"
+            params = list(params) + [limit]
+        self.env.cr.execute(
+            """
+            SELECT "stock_picking".id
+            FROM {from_clause}
+            WHERE {where}
+            {order_by}
+            {limit}
+            FOR UPDATE OF "stock_picking" SKIP LOCKED
+            """.format(
+                from_clause=from_clause,
+                where=where_clause or "TRUE",
+                order_by=order_by,
+                limit=limit_clause,
+            ),
+            params,
+        )
+        return self.browse([row[0] for row in self.env.cr.fetchall()])
+
     def reserve_stock(self):
         """
         Reserve stock according to the number of reservable pickings.
@@ -2066,150 +2358,532 @@ class StockPicking(models.Model):
         The number of reservable pickings is defined on the picking type.
         0 reservable pickings means this function should not reserve stock
         -1 reservable picking means all reservable stock should be reserved.
+
+        When reserving for all eligible picking types each picking type is a
+        shard guarded by a postgres advisory lock, so two workers never
+        reserve the same picking type at the same time. If the warehouse of
+        the picking types is configured with more than one reservation
+        worker, the shards are reserved in parallel, each with its own cursor.
+        A reservation deadline on the warehouse bounds the whole cycle.
         """
-        Picking = self.env["stock.picking"]
         PickingType = self.env["stock.picking.type"]
 
         if self:
-            picking_types = self.mapped("picking_type_id")
+            for picking_type in self.mapped("picking_type_id"):
+                self._reserve_stock_for_picking_type(picking_type)
+            return
+
+        picking_types = PickingType.search(
+            [("active", "=", True), ("u_num_reservable_pickings", "!=", 0)]
+        )
+        warehouses = picking_types.mapped("warehouse_id")
+        workers = max(warehouses.mapped("u_reservation_workers") or [1])
+        deadline_seconds = max(warehouses.mapped("u_reservation_deadline") or [0])
+        deadline = time.time() + deadline_seconds if deadline_seconds > 0 else None
+
+        if workers > 1 and len(picking_types) > 1:
+            self._reserve_stock_in_parallel(picking_types, workers, deadline=deadline)
         else:
-            picking_types = PickingType.search(
-                [("active", "=", True), ("u_num_reservable_pickings", "!=", 0)]
+            for picking_type in picking_types:
+                self._reserve_stock_shard(picking_type, deadline=deadline)
+        return
+
+    def _reserve_stock_in_parallel(self, picking_types, workers, deadline=None):
+        """ Reserve stock for each picking type in its own thread and cursor,
+            running at most `workers` picking types at the same time.
+        """
+        dbname = self.env.cr.dbname
+        uid = self.env.uid
+        context = self.env.context
+
+        def reserve_shard(picking_type_id):
+            with api.Environment.manage(), registry(dbname).cursor() as cr:
+                env = api.Environment(cr, uid, context)
+                picking_type = env["stock.picking.type"].browse(picking_type_id)
+                try:
+                    env["stock.picking"]._reserve_stock_shard(picking_type, deadline=deadline)
+                except Exception:
+                    # Already logged and rolled back by the shard, carry on
+                    # with the other picking types
+                    pass
+
+        _logger.info(
+            "Reserving stock for %d picking types with %d workers.", len(picking_types), workers
+        )
+        with ThreadPoolExecutor(max_workers=workers) as executor:
+            # Consume the results so that all the shards are waited for
+            list(executor.map(reserve_shard, picking_types.ids))
+
+    def _reserve_stock_shard(
+        self, picking_type, product_ids=None, deadline=None, max_pickings=None
+    ):
+        """ Reserve stock for the picking type while holding its advisory
+            lock. The shard is skipped when another worker holds the lock.
+            Returns the report of _reserve_stock_for_picking_type, or None
+            if the shard was skipped.
+
+            A session level lock is used since reservation commits after
+            each reserved picking, which would release a transaction lock.
+        """
+        cr = self.env.cr
+        lock_key = (RESERVATION_LOCK_NAMESPACE, picking_type.id)
+
+        cr.execute("SELECT pg_try_advisory_lock(%s, %s)", lock_key)
+        if not cr.fetchone()[0]:
+            _logger.info(
+                "Picking type %r is being reserved by another worker, skipping.", picking_type
             )
+            return None
 
-        # We will either reserve up to the reservation limit or until all
-        # available picks have been reserved, depending on the value of
-        # u_num_reservable_pickings.
-        # However we must also take into account the atomic batch reservation
-        # flag (u_reserve_batches) and the handle partial flag
-        # (u_handle_partials).
-
-        for picking_type in picking_types:
-            _logger.info("Reserving stock for picking type %r.", picking_type)
-
-            # We want to reserve batches atomically, that is we will
-            # reserve pickings until all pickings in a batch have been
-            # assigned, even if we exceed the number of reservable pickings.
-            # However, the value of the handle partial flag is false we
-            # should not reserve stock if the batch cannot be completely
-            # reserved.
-            to_reserve = picking_type.u_num_reservable_pickings
-            reserve_all = to_reserve == -1
-            base_domain = [("picking_type_id", "=", picking_type.id), ("state", "=", "confirmed")]
-            limit = 1
-            processed = Picking.browse()
-            by_type = lambda x: x.picking_type_id == picking_type
-
-            while reserve_all or to_reserve > 0:
-
-                if self:
-                    # Removed processed pickings from self
-                    pickings = self.filtered(by_type) - processed
-                else:
-                    domain = base_domain[:]
-                    if processed:
-                        domain.append(("id", "not in", processed.ids))
-                    pickings = Picking.search(domain, limit=limit)
-
-                if not pickings:
-                    # No pickings left to process.
-                    # If u_num_reservable_pickings is -1, or there are
-                    # fewer available pickings that the limit, the loop must
-                    # terminate here.
-                    break
+        try:
+            report = self._reserve_stock_for_picking_type(
+                picking_type, product_ids=product_ids, deadline=deadline, max_pickings=max_pickings
+            )
+        except Exception:
+            _logger.exception("Reserving stock for picking type %r failed.", picking_type)
+            # The transaction may be aborted, which would make the unlock
+            # below fail and hide the error. The rollback does not release
+            # the session lock, so it is still unlocked afterwards.
+            cr.rollback()
+            raise
+        finally:
+            cr.execute("SELECT pg_advisory_unlock(%s, %s)", lock_key)
+        return report
+
+    def _iter_reservation_candidates(self, picking_type, product_ids=None):
+        """ Yield the confirmed pickings of the picking type one at a time,
+            in the order given by _order. If product_ids is set, only
+            pickings with moves of those products still to reserve are
+            yielded.
+
+            Pickings are fetched in pages of u_reservation_page_size using
+            keyset pagination on the _order columns, so every page costs the
+            same query however many pickings have already been processed.
+            Each picking is checked again before it is yielded, since the
+            page was fetched before the pickings yielded earlier were
+            reserved and committed.
+        """
+        page_size = picking_type.u_reservation_page_size or 1
+        query = """
+            SELECT {key}
+            FROM stock_picking
+            WHERE {where}
+            ORDER BY {order}
+            LIMIT %s
+        """
+        where = ["picking_type_id = %s", "state = 'confirmed'"]
+        params = [picking_type.id]
+        if product_ids:
+            where.append(
+                """
+                id IN (SELECT picking_id
+                       FROM stock_move
+                       WHERE product_id IN %s
+                         AND state IN ('confirmed', 'waiting', 'partially_available'))
+                """
+            )
+            params.append(tuple(product_ids))
+        key = self._get_order_key_columns("stock_picking")
+        order = self._get_order_key_order("stock_picking")
+        profile = self.env.context.get("reservation_profile")
+        last_key = None
+        while True:
+            page_where = where
+            page_params = params
+            if last_key is not None:
+                keyset, keyset_params = self._get_order_keyset(
+                    last_key, "stock_picking"
+                )
+                page_where = where + [keyset]
+                page_params = params + keyset_params
+            page_query = query.format(
+                key=key, where=" AND ".join(page_where), order=order
+            )
+            page_params = page_params + [page_size]
+            with profile_phase(self, profile, "search"):
+                # Stored computed fields such as state must be up to date
+                # in the db, pickings are reserved between pages
+                self.recompute()
+                self.env.cr.execute(page_query, page_params)
+                rows = self.env.cr.fetchall()
+            if not rows:
+                return
 
-                batch = pickings.mapped("batch_id")
-                if batch and batch.state == "draft":
-                    # Add to seen pickings so that we don't try to process
-                    # this batch again.
-                    processed |= batch.picking_ids
-                    continue
+            last_key = rows[-1]
+            # Browse the whole page so that the pickings share the prefetch
+            for picking in self.browse([row[0] for row in rows]):
+                # Reserving the pickings yielded before may have cancelled,
+                # done or deleted (by refactoring) pickings of the page
+                picking.invalidate_cache(["state"], picking.ids)
+                if picking.exists() and picking.state == "confirmed":
+                    yield picking
 
-                if batch and picking_type.u_reserve_batches:
-                    pickings = batch.picking_ids
-
-                # MPS: mimic Odoo's retry behaviour
-                tries = 0
-                while True:
-
-                    try:
-                        with self.env.cr.savepoint():
-                            # Assign at the move level because refactoring may change
-                            # the pickings.
-                            moves = pickings.mapped("move_lines")
-                            moves.with_context(lock_batch_state=True)._action_assign()
-                            batch._compute_state()
-                            pickings = moves.mapped("picking_id")
-                            processed |= pickings
-
-                            unsatisfied = pickings.filtered(
-                                lambda x: x.state not in ["assigned", "cancel", "done"]
-                            )
-                            mls = pickings.mapped("move_line_ids")
-                            if unsatisfied:
-                                # Unreserve if the picking type cannot handle partials or it
-                                # can but there is nothing allocated (no stock.move.lines)
-                                if not picking_type.u_handle_partials or not mls:
-                                    # construct error message, report only products
-                                    # that are unreservable.
-                                    not_done = lambda x: x.state not in (
-                                        "done",
-                                        "assigned",
-                                        "cancel",
-                                    )
-                                    moves = unsatisfied.mapped("move_lines").filtered(not_done)
-                                    products = moves.mapped("product_id.default_code")
-                                    picks = moves.mapped("picking_id.name")
-                                    fmt = (
-                                        "Unable to reserve stock for products {} "
-                                        "for pickings {}."
-                                    )
-                                    msg = fmt.format(", ".join(products), ", ".join(picks))
-                                    raise UserError(msg)
-                            break
-                    except UserError as e:
-                        self.invalidate_cache()
-                        # Only propagate the error if the function has been
-                        # manually triggered
-                        if self:
-                            raise e
-                        tries = -1
+            if len(rows) < page_size:
+                return
+
+    def _get_unreserved_quantities(self, location):
+        """ Return a dictionary of the unreserved quantity of each product id
+            in the location and its children, read with one aggregate query.
+        """
+        self.env.cr.execute(
+            """
+            SELECT q.product_id, SUM(q.quantity - q.reserved_quantity)
+            FROM stock_quant q
+            JOIN stock_location l ON l.id = q.location_id
+            WHERE l.parent_left >= %s AND l.parent_left < %s
+            GROUP BY q.product_id
+            """,
+            (location.parent_left, location.parent_right),
+        )
+        return defaultdict(float, self.env.cr.fetchall())
+
+    def _get_reserved_quantities(self):
+        """ Return a dictionary of the quantity of each product id reserved by
+            the move lines of the pickings in self.
+        """
+        reserved = defaultdict(float)
+        for ml in self.mapped("move_line_ids"):
+            reserved[ml.product_id.id] += ml.product_qty
+        return reserved
+
+    def _is_reservation_unsatisfiable(self, picking_type, available):
+        """ Whether the pickings in self clearly cannot be reserved given the
+            unreserved quantities available in the source location of the
+            picking type, as returned by _get_unreserved_quantities.
+
+            If the picking type cannot handle partials the pickings are
+            unsatisfiable when any product is short, otherwise only when
+            nothing can be reserved. Moves from outside of the source
+            location are never considered unsatisfiable.
+        """
+        location = picking_type.default_location_src_id
+        moves = self.mapped("move_lines").filtered(
+            lambda m: m.state in ("confirmed", "waiting", "partially_available")
+        )
+        if not moves:
+            return False
+
+        within = lambda loc: location.parent_left <= loc.parent_left < location.parent_right
+        if not all(within(loc) for loc in moves.mapped("location_id")):
+            return False
+
+        demand = defaultdict(float)
+        for move in moves:
+            reserved = sum(move.move_line_ids.mapped("product_qty"))
+            demand[move.product_id] += move.product_qty - reserved
+
+        short = [
+            float_compare(qty, available[product.id], precision_rounding=product.uom_id.rounding) > 0
+            for product, qty in demand.items()
+        ]
+        if not picking_type.u_handle_partials:
+            return any(short)
+
+        nothing_available = all(
+            float_compare(available[product.id], 0, precision_rounding=product.uom_id.rounding) <= 0
+            for product in demand
+        )
+        return nothing_available and not self.mapped("move_line_ids")
+
+    def _get_reservation_retry_wait(self, picking_type, tries):
+        """ Return the number of seconds to wait before the given retry of a
+            reservation for the picking type: exponential backoff with full
+            jitter. Override to change the retry policy.
+        """
+        base = picking_type.u_reservation_backoff
+        return random.uniform(0, min(base * 30, base * 2 ** (tries - 1)))
+
+    @api.model
+    def _reservation_deadline_reached(self, deadline):
+        """ Whether the reservation deadline timestamp, if any, has passed """
+        return deadline is not None and time.time() >= deadline
+
+    def _reserve_stock_for_picking_type(
+        self, picking_type, product_ids=None, deadline=None, max_pickings=None
+    ):
+        """ Reserve stock for the pickings of a single picking type, either
+            the ones in self or, if self is empty, the confirmed ones in
+            priority order, optionally only those that need product_ids.
+            See reserve_stock for details.
+
+            Returns a dictionary of the reserved picking and batch ids and of
+            the failures to reserve, as (picking ids, reason) tuples.
+            When the reservation_dry_run context key is set nothing is
+            committed and no statistics are recorded.
+
+            Concurrency errors are retried up to the maximum number of tries
+            of the picking type, waiting as decided by
+            _get_reservation_retry_wait, after which the picking type is given
+            up on until the next cycle. Reservation also stops once deadline,
+            a timestamp, has passed. The contention met when reserving all
+            confirmed pickings is recorded as a stock.reservation.stat.
+
+            max_pickings, if set, replaces the number of pickings to reserve
+            of the picking type. The pickings reserved are counted in
+            u_num_reserved_in_cycle of the picking type, which a full run
+            (without product_ids) starts again from.
+        """
+        ReservationStat = self.env["stock.reservation.stat"]
+
+        dry_run = self.env.context.get("reservation_dry_run")
+        profile = self.env.context.get("reservation_profile")
+        report = {"picking_ids": [], "batch_ids": [], "failures": []}
+
+        _logger.info("Reserving stock for picking type %r.", picking_type)
+        date_start = fields.Datetime.now()
+        start = time.time()
+        max_tries = picking_type.u_reservation_max_tries
+        stats = {
+            "num_reserved": 0,
+            "num_retries": 0,
+            "num_give_ups": 0,
+            "sleep_time": 0.0,
+            "deadline_reached": False,
+        }
+
+        # We want to reserve batches atomically, that is we will
+        # reserve pickings until all pickings in a batch have been
+        # assigned, even if we exceed the number of reservable pickings.
+        # However, the value of the handle partial flag is false we
+        # should not reserve stock if the batch cannot be completely
+        # reserved.
+        to_reserve = picking_type.u_num_reservable_pickings
+        if max_pickings is not None:
+            to_reserve = max_pickings
+        reserve_all = to_reserve == -1
+        # Ids of pickings already processed or skipped in this cycle
+        processed_ids = set()
+        by_type = lambda x: x.picking_type_id == picking_type
+
+        # Snapshot of the stock available to the picking type, used to skip
+        # pickings that cannot be reserved without opening a savepoint
+        available = None
+
+        if self:
+            candidates = iter([self.filtered(by_type)])
+        else:
+            candidates = self._iter_reservation_candidates(picking_type, product_ids=product_ids)
+            if picking_type.default_location_src_id:
+                with profile_phase(self, profile, "search"):
+                    available = self._get_unreserved_quantities(
+                        picking_type.default_location_src_id
+                    )
+
+        for pickings in candidates:
+            if not (reserve_all or to_reserve > 0):
+                break
+
+            if self._reservation_deadline_reached(deadline):
+                _logger.info("Reservation deadline reached for picking type %r.", picking_type)
+                stats["deadline_reached"] = True
+                break
+
+            # Remove processed pickings
+            pickings = pickings.filtered(lambda p: p.id not in processed_ids)
+            if not pickings:
+                continue
+
+            batch = pickings.mapped("batch_id")
+            if batch and batch.state == "draft":
+                # Add to seen pickings so that we don't try to process
+                # this batch again.
+                processed_ids.update(batch.picking_ids.ids)
+                report["failures"].append(
+                    (batch.picking_ids.ids, _("Batch %s is in draft.") % batch.name)
+                )
+                continue
+
+            if batch and picking_type.u_reserve_batches:
+                pickings = batch.picking_ids
+            # Refactoring may delete the pickings, so never revisit them
+            processed_ids.update(pickings.ids)
+
+            if available is not None:
+                if pickings._is_reservation_unsatisfiable(picking_type, available):
+                    _logger.debug("Not enough stock to reserve %r, skipping.", pickings)
+                    report["failures"].append((pickings.ids, _("Not enough stock available.")))
+                    continue
+                reserved_before = pickings._get_reserved_quantities()
+
+            # MPS: mimic Odoo's retry behaviour
+            tries = 0
+            gave_up = False
+            while True:
+
+                try:
+                    with self.env.cr.savepoint():
+                        # Assign at the move level because refactoring may change
+                        # the pickings.
+                        moves = pickings.mapped("move_lines")
+                        moves.with_context(lock_batch_state=True)._action_assign()
+                        batch._compute_state()
+                        pickings = moves.mapped("picking_id")
+                        processed_ids.update(pickings.ids)
+
+                        unsatisfied = pickings.filtered(
+                            lambda x: x.state not in ["assigned", "cancel", "done"]
+                        )
+                        mls = pickings.mapped("move_line_ids")
+                        if unsatisfied:
+                            # Unreserve if the picking type cannot handle partials or it
+                            # can but there is nothing allocated (no stock.move.lines)
+                            if not picking_type.u_handle_partials or not mls:
+                                # construct error message, report only products
+                                # that are unreservable.
+                                not_done = lambda x: x.state not in (
+                                    "done",
+                                    "assigned",
+                                    "cancel",
+                                )
+                                moves = unsatisfied.mapped("move_lines").filtered(not_done)
+                                products = moves.mapped("product_id.default_code")
+                                picks = moves.mapped("picking_id.name")
+                                fmt = (
+                                    "Unable to reserve stock for products {} "
+                                    "for pickings {}."
+                                )
+                                msg = fmt.format(", ".join(products), ", ".join(picks))
+                                raise UserError(msg)
                         break
-                    except OperationalError as e:
-                        self.invalidate_cache()
-                        if e.pgcode not in PG_CONCURRENCY_ERRORS_TO_RETRY:
-                            raise
-                        if tries >= MAX_TRIES_ON_CONCURRENCY_FAILURE:
-                            _logger.info(
-                                "%s, maximum number of tries reached" % errorcodes.lookup(e.pgcode)
-                            )
-                            break
-                        tries += 1
-                        wait_time = 1
+                except UserError as e:
+                    self.invalidate_cache()
+                    # Only propagate the error if the function has been
+                    # manually triggered
+                    if self:
+                        raise e
+                    report["failures"].append((pickings.ids, e.name))
+                    tries = -1
+                    break
+                except OperationalError as e:
+                    self.invalidate_cache()
+                    if e.pgcode not in PG_CONCURRENCY_ERRORS_TO_RETRY:
+                        raise
+                    if tries >= max_tries or self._reservation_deadline_reached(deadline):
                         _logger.info(
-                            "%s, retry %d/%d in %.04f sec..."
-                            % (
-                                errorcodes.lookup(e.pgcode),
-                                tries,
-                                MAX_TRIES_ON_CONCURRENCY_FAILURE,
-                                wait_time,
-                            )
+                            "%s, maximum number of tries reached" % errorcodes.lookup(e.pgcode)
                         )
-                        time.sleep(wait_time)
-                if tries == -1:
-                    continue
-                if tries >= MAX_TRIES_ON_CONCURRENCY_FAILURE:
-                    break
+                        stats["num_give_ups"] += 1
+                        report["failures"].append(
+                            (pickings.ids, errorcodes.lookup(e.pgcode))
+                        )
+                        gave_up = True
+                        break
+                    tries += 1
+                    wait_time = self._get_reservation_retry_wait(picking_type, tries)
+                    if deadline is not None:
+                        wait_time = max(0.0, min(wait_time, deadline - time.time()))
+                    _logger.info(
+                        "%s, retry %d/%d in %.04f sec..."
+                        % (errorcodes.lookup(e.pgcode), tries, max_tries, wait_time)
+                    )
+                    stats["num_retries"] += 1
+                    stats["sleep_time"] += wait_time
+                    time.sleep(wait_time)
+            if tries == -1:
+                continue
+            if gave_up:
+                break
 
-                # Incrementally commit to release picks as soon as possible and
-                # allow serialisation error to propagate to respect priority
-                # order
+            # Incrementally commit to release picks as soon as possible and
+            # allow serialisation error to propagate to respect priority
+            # order
+            if not dry_run:
                 self.env.cr.commit()
-                # Only count as reserved the number of pickings at mls
-                to_reserve -= len(mls.mapped("picking_id"))
+            # Only count as reserved the number of pickings at mls
+            reserved_pickings = mls.mapped("picking_id")
+            to_reserve -= len(reserved_pickings)
+            stats["num_reserved"] += len(reserved_pickings)
+            report["picking_ids"].extend(reserved_pickings.ids)
+            report["batch_ids"].extend(reserved_pickings.mapped("batch_id").ids)
+
+            if available is not None:
+                reserved_after = pickings._get_reserved_quantities()
+                for product_id in set(reserved_before) | set(reserved_after):
+                    available[product_id] -= reserved_after[product_id] - reserved_before[product_id]
+
+        if not self and not dry_run:
+            num_reserved_in_cycle = stats["num_reserved"]
+            if product_ids is not None:
+                num_reserved_in_cycle += picking_type.u_num_reserved_in_cycle
+            if num_reserved_in_cycle != picking_type.u_num_reserved_in_cycle:
+                picking_type.sudo().write({"u_num_reserved_in_cycle": num_reserved_in_cycle})
+
+            # Runs on stock arrival are frequent, only record the ones that
+            # reserved something or met contention
+            contention = stats["num_retries"] or stats["num_give_ups"]
+            if product_ids is None or stats["num_reserved"] or contention:
+                stats.update(
+                    picking_type_id=picking_type.id,
+                    date_start=date_start,
+                    duration=time.time() - start,
+                )
+                ReservationStat.sudo().create(stats)
+        _logger.info("Reserving stock for picking type %r completed.", picking_type)
+        return report
 
-                if self:
-                    # Only process the specified pickings
-                    break
-            _logger.info("Reserving stock for picking type %r completed.", picking_type)
-        return
+    @api.model
+    def simulate_reserve_stock(self, picking_type_ids=None):
+        """
+        Simulate a reservation cycle of reserve_stock for the eligible picking
+        types, or only those in picking_type_ids, and roll it back.
+
+        Returns a dictionary of the following info of each picking type,
+        keyed by picking type id:
+            - name: string
+            - num_pickings: int, pickings that would be reserved
+            - num_batches: int, batches that would be reserved
+            - pickings: list(string), names of the pickings that would be
+              reserved
+            - failures: list({'pickings': list(string), 'reason': string}),
+              pickings that would not be reserved and why
+            - elapsed: float, seconds spent
+            - timings: {phase: {'elapsed': float, 'count': int}}, seconds and
+              queries spent per phase: search, assign, refactor and
+              full_packages
+        """
+        PickingType = self.env["stock.picking.type"]
+
+        domain = [("active", "=", True), ("u_num_reservable_pickings", "!=", 0)]
+        if picking_type_ids is not None:
+            domain.append(("id", "in", picking_type_ids))
+        picking_types = PickingType.search(domain)
+
+        res = {}
+        cr = self.env.cr
+        cr.execute("SAVEPOINT simulate_reserve_stock")
+        try:
+            for picking_type in picking_types:
+                timings = {}
+                start = time.time()
+                report = self.browse().with_context(
+                    reservation_dry_run=True, reservation_profile=timings
+                )._reserve_stock_for_picking_type(picking_type)
+                elapsed = time.time() - start
+
+                pickings = self.browse(report["picking_ids"])
+                res[picking_type.id] = {
+                    "name": picking_type.name,
+                    "num_pickings": len(pickings),
+                    "num_batches": len(set(report["batch_ids"])),
+                    "pickings": pickings.mapped("name"),
+                    "failures": [
+                        {"pickings": self.browse(ids).exists().mapped("name"), "reason": reason}
+                        for ids, reason in report["failures"]
+                    ],
+                    "elapsed": elapsed,
+                    "timings": timings,
+                }
+                _logger.info(
+                    "Simulated reservation for picking type %r: %d pickings, %d batches, "
+                    "%d failures in %.2fs, %s",
+                    picking_type,
+                    len(pickings),
+                    res[picking_type.id]["num_batches"],
+                    len(report["failures"]),
+                    elapsed,
+                    timings,
+                )
+        finally:
+            cr.execute("ROLLBACK TO SAVEPOINT simulate_reserve_stock")
+            self.invalidate_cache()
+        return res
@@ -2,12 +2,14 @@
 
 import logging
 import re
+from collections import Counter, defaultdict
 from itertools import chain
 
 from odoo import _, api, fields, models
 from odoo.exceptions import UserError, ValidationError
 
 from .common import PRIORITIES
+from ..common import with_info_cache
 
 _logger = logging.getLogger(__name__)
 
@@ -62,6 +64,30 @@ class StockPickingBatch(models.Model):
         help=('Name of the batch from which this batch was derived')
     )
 
+    u_num_ready_pickings = fields.Integer(
+        string='Ready Pickings', compute='_compute_picking_state_counts',
+        readonly=True,
+        help="Number of pickings of the batch that are assigned.",
+    )
+    u_num_unready_pickings = fields.Integer(
+        string='Unready Pickings', compute='_compute_picking_state_counts',
+        readonly=True,
+        help="Number of pickings of the batch that are draft, waiting or "
+             "confirmed.",
+    )
+    u_num_done_pickings = fields.Integer(
+        string='Done Pickings', compute='_compute_picking_state_counts',
+        readonly=True,
+        help="Number of pickings of the batch that are done or cancelled.",
+    )
+
+    u_validation_job_ids = fields.One2many(
+        'stock.validation.job', 'batch_id', string='Validation Jobs',
+        readonly=True,
+        help="Jobs validating pickings dropped off from the batch, for "
+             "picking types that validate asynchronously.",
+    )
+
     # This is a barcode and not a One2one to allow pallets that aren't
     # in the system yet (because they are empty) to be reserved.
     u_last_reserved_pallet_name = fields.Char(
@@ -182,11 +208,12 @@ class StockPickingBatch(models.Model):
                 # Can not do anything with them don't bother trying
                 continue
 
-            if batch.picking_ids:
+            # Use the grouped counts rather than filtering all the pickings
+            ready_picks = batch.u_num_ready_pickings
+            done_picks = batch.u_num_done_pickings
+            unready_picks = batch.u_num_unready_pickings
 
-                ready_picks = batch.ready_picks()
-                done_picks = batch.done_picks()
-                unready_picks = batch.unready_picks()
+            if ready_picks or done_picks or unready_picks:
 
                 # Figure out state
                 if ready_picks and not unready_picks:
@@ -206,6 +233,44 @@ class StockPickingBatch(models.Model):
             else:
                 batch.state = 'done'
 
+    @api.multi
+    @api.depends('picking_ids', 'picking_ids.state',
+                 'u_validation_job_ids', 'u_validation_job_ids.state')
+    def _compute_picking_state_counts(self):
+        """ Count the pickings of the batches by state, with one grouped
+            query for all the batches in self. Pickings waiting for a
+            queued validation job are not counted, so that the batch does
+            not stay in progress until the job is run.
+        """
+        Picking = self.env['stock.picking']
+        ValidationJob = self.env['stock.validation.job']
+
+        counts = defaultdict(Counter)
+        batch_ids = [batch_id for batch_id in self.ids
+                     if isinstance(batch_id, int)]
+        if batch_ids:
+            # Picking states pending recompute must be up to date in the db
+            Picking.recompute()
+            pending = ValidationJob.sudo().search(
+                [('batch_id', 'in', batch_ids), ('state', '=', 'queued')]
+            ).mapped('picking_ids')
+            groups = Picking.read_group(
+                [('batch_id', 'in', batch_ids),
+                 ('id', 'not in', pending.ids)],
+                ['batch_id', 'state'], ['batch_id', 'state'], lazy=False)
+            for group in groups:
+                counts[group['batch_id'][0]][group['state']] = \
+                    group['__count']
+
+        for batch in self:
+            batch_counts = counts[batch.id]
+            batch.u_num_ready_pickings = batch_counts['assigned']
+            batch.u_num_unready_pickings = sum(
+                batch_counts[state]
+                for state in ['draft', 'waiting', 'confirmed'])
+            batch.u_num_done_pickings = sum(
+                batch_counts[state] for state in ['done', 'cancel'])
+
     def done_picks(self):
         """ Return done picks from picks or self.picking_ids """
         picks = self.mapped("picking_ids")
@@ -253,11 +318,22 @@ class StockPickingBatch(models.Model):
         location. The package is not included if the picking type allows for
         the swapping of packages (`u_allow_swapping_packages`) and picks by
         product (`u_user_scans`)
+
+        If the picking type has a pick path strategy, tasks are sorted by
+        the position of their location in the route first.
         """
         batch_pt = self.mapped('picking_ids.picking_type_id')
         batch_pt.ensure_one()
 
-        parts = [lambda ml: (ml.picking_id.id,)]
+        parts = []
+
+        if batch_pt.u_pick_path_strategy != 'none':
+            locations = self.get_available_move_lines().mapped('location_id')
+            route = locations.get_pick_path(batch_pt.u_pick_path_strategy)
+            stops = {loc.id: stop for stop, loc in enumerate(route)}
+            parts.append(lambda ml: (stops.get(ml.location_id.id, len(stops)),))
+
+        parts.append(lambda ml: (ml.picking_id.id,))
 
         if not (batch_pt.u_allow_swapping_packages
                 and batch_pt.u_user_scans == "product"):
@@ -281,6 +357,11 @@ class StockPickingBatch(models.Model):
         task_grouping_criteria argument is added to the signature to
         enable dependency injection for the sake of testing.
 
+        The tasks are read from the task queue of the batch, see
+        refresh_task_queue, so the cost of the call does not depend on the
+        number of move lines in the batch. Tasks built with injected
+        task_grouping_criteria are not queued.
+
         Confirmations is a list of dictionaries of the form:
             {'query': 'XXX', 'result': 'XXX'}
         After the user has picked the move lines, should be requested by the
@@ -290,28 +371,23 @@ class StockPickingBatch(models.Model):
         """
         self.ensure_one()
 
-        available_mls = self.get_available_move_lines()
-
-        if skipped_product_ids is not None:
-            available_mls = available_mls.filtered(
-                lambda ml: ml.product_id.id not in skipped_product_ids)
+        skipped_product_ids = set(skipped_product_ids or [])
 
-        num_tasks_picked = len(available_mls.filtered(
-            lambda ml: ml.qty_done == ml.product_qty))
-        task = {'tasks_picked': num_tasks_picked > 0,
+        task = {'tasks_picked': self._has_picked_move_lines(skipped_product_ids),
                 'num_tasks_to_pick': 0,
                 'move_line_ids': [],
                 'confirmations': [],
                 }
-        todo_mls = available_mls.get_lines_todo() \
-                                .sort_by_location_product()
 
-        if todo_mls:
-            if task_grouping_criteria is None:
-                task_grouping_criteria = self._get_task_grouping_criteria()
+        if task_grouping_criteria is None:
+            task_mls, num_tasks, num_packages, package_mls = \
+                self._get_next_queued_task(skipped_product_ids)
+        else:
+            task_mls, num_tasks, num_packages, package_mls = \
+                self._get_next_built_task(skipped_product_ids,
+                                          task_grouping_criteria)
 
-            grouped_mls = todo_mls.groupby(task_grouping_criteria)
-            _key, task_mls = next(grouped_mls)
+        if task_mls:
             num_mls = len(task_mls)
             pick_seq = task_mls[0].picking_id.sequence
             _logger.debug(_("Batch '%s': creating a task for %s move line%s; "
@@ -328,20 +404,206 @@ class StockPickingBatch(models.Model):
             task.update(task_mls._prepare_task_info())
 
             if task_mls[0].picking_id.picking_type_id.u_user_scans == 'product':
-                # NB: adding 1 to consider the group removed by next()
-                task['num_tasks_to_pick'] = len(list(grouped_mls)) + 1
+                task['num_tasks_to_pick'] = num_tasks
                 task['move_line_ids'] = task_mls.ids
             else:
                 # TODO: check pallets of packages if necessary
-                task['num_tasks_to_pick'] = len(todo_mls.mapped('package_id'))
-                task['move_line_ids'] = todo_mls.filtered(
-                    lambda ml: ml.package_id == task_mls[0].package_id).ids
+                task['num_tasks_to_pick'] = num_packages
+                task['move_line_ids'] = package_mls.ids
         else:
             _logger.debug(_("Batch '%s': no available move lines for creating "
                             "a task"), self.name)
 
         return task
 
+    def _has_picked_move_lines(self, skipped_product_ids):
+        """
+        Return whether any available move line of the batch in self,
+        other than those of the skipped products, has been picked.
+        """
+        self.ensure_one()
+        query = """
+            SELECT 1
+            FROM stock_move_line ml
+            JOIN stock_picking p ON p.id = ml.picking_id
+            WHERE p.batch_id = %s
+              AND p.state = 'assigned'
+              AND ml.qty_done = ml.product_qty
+        """
+        params = [self.id]
+        if skipped_product_ids:
+            query += " AND ml.product_id NOT IN %s"
+            params.append(tuple(skipped_product_ids))
+        self.env.cr.execute(query + " LIMIT 1", params)
+        return bool(self.env.cr.fetchone())
+
+    def _build_task_queue(self, task_grouping_criteria=None):
+        """
+        Return the tasks of the batch in self in the order they are to be
+        picked. Each task is a dictionary with the id of its picking and
+        its move lines still to do, as [id, product id, package id] lists:
+            {'picking_id': int, 'move_lines': [[int, int, int], ...]}
+
+        The available move lines are sorted by location and product and
+        grouped with the task grouping criteria, see
+        _get_task_grouping_criteria.
+        """
+        self.ensure_one()
+
+        todo_mls = self.get_available_move_lines() \
+                       .get_lines_todo() \
+                       .sort_by_location_product()
+        if not todo_mls:
+            return []
+
+        if task_grouping_criteria is None:
+            task_grouping_criteria = self._get_task_grouping_criteria()
+
+        return [
+            {
+                'picking_id': task_mls[0].picking_id.id,
+                'move_lines': [[ml.id, ml.product_id.id, ml.package_id.id]
+                               for ml in task_mls],
+            }
+            for _key, task_mls in todo_mls.groupby(task_grouping_criteria)
+        ]
+
+    def _get_next_built_task(self, skipped_product_ids, task_grouping_criteria):
+        """
+        Return the next task of the batch in self built with the
+        task_grouping_criteria, see _get_next_queued_task.
+        """
+        MoveLine = self.env['stock.move.line']
+
+        # Keep the lines of products that are not skipped
+        tasks = []
+        for built_task in self._build_task_queue(task_grouping_criteria):
+            lines = [line for line in built_task['move_lines']
+                     if line[1] not in skipped_product_ids]
+            if lines:
+                tasks.append(lines)
+
+        if not tasks:
+            return MoveLine.browse(), 0, 0, MoveLine.browse()
+
+        task_mls = MoveLine.browse([line[0] for line in tasks[0]])
+        package_id = task_mls[0].package_id.id
+        package_ids = set(line[2] for lines in tasks for line in lines
+                          if line[2])
+        package_mls = MoveLine.browse([line[0] for lines in tasks
+                                       for line in lines
+                                       if line[2] == package_id])
+
+        return task_mls, len(tasks), len(package_ids), package_mls
+
+    def _get_next_queued_task(self, skipped_product_ids):
+        """
+        Return the next task in the task queue of the batch in self,
+        building the queue first if any move line to do is not queued.
+        Move lines of the skipped products are left out.
+
+        Returns a tuple of:
+        - the move lines of the task;
+        - the number of tasks left to pick;
+        - the number of packages left to pick;
+        - the move lines left to pick of the package of the task.
+        """
+        MoveLine = self.env['stock.move.line']
+        self.ensure_one()
+
+        # The state of the pickings must be up to date in the db
+        self.recompute()
+
+        query = """
+            SELECT {select}
+            FROM stock_move_line ml
+            JOIN stock_picking p ON p.id = ml.picking_id
+            WHERE p.batch_id = %s
+              AND p.state = 'assigned'
+              AND ml.qty_done < ml.product_uom_qty
+        """
+        params = [self.id]
+
+        self.env.cr.execute(
+            query.format(select='1')
+            + " AND COALESCE(ml.u_task_sequence, 0) = 0 LIMIT 1", params)
+        if self.env.cr.fetchone():
+            self.refresh_task_queue()
+
+        if skipped_product_ids:
+            query += " AND ml.product_id NOT IN %s"
+            params.append(tuple(skipped_product_ids))
+
+        self.env.cr.execute(
+            query.format(select="""MIN(ml.u_task_sequence),
+                                   COUNT(DISTINCT ml.u_task_sequence),
+                                   COUNT(DISTINCT ml.package_id)"""),
+            params)
+        sequence, num_tasks, num_packages = self.env.cr.fetchone()
+        if not sequence:
+            return MoveLine.browse(), 0, 0, MoveLine.browse()
+
+        self.env.cr.execute(
+            query.format(select='ml.id')
+            + " AND ml.u_task_sequence = %s ORDER BY ml.id",
+            params + [sequence])
+        task_mls = MoveLine.browse(
+            [row[0] for row in self.env.cr.fetchall()]
+        ).sort_by_location_product()
+
+        package_mls = MoveLine.browse()
+        package_id = task_mls[0].package_id.id
+        if package_id:
+            self.env.cr.execute(
+                query.format(select='ml.id')
+                + " AND ml.package_id = %s ORDER BY ml.u_task_sequence, ml.id",
+                params + [package_id])
+            package_mls = MoveLine.browse(
+                [row[0] for row in self.env.cr.fetchall()])
+
+        return task_mls, num_tasks, num_packages, package_mls
+
+    def refresh_task_queue(self):
+        """
+        Rebuild the task queue of the batches in self, see
+        _build_task_queue: the move lines to do are numbered by the
+        position of their task, the other move lines of the batches are
+        taken out of the queue.
+        """
+        MoveLine = self.env['stock.move.line']
+
+        for batch in self:
+            ml_ids = []
+            sequences = []
+            for sequence, task in enumerate(batch._build_task_queue(), 1):
+                for line in task['move_lines']:
+                    ml_ids.append(line[0])
+                    sequences.append(sequence)
+
+            self.env.cr.execute(
+                """
+                UPDATE stock_move_line
+                SET u_task_sequence = 0
+                WHERE picking_id IN (
+                    SELECT id FROM stock_picking WHERE batch_id = %s
+                )
+                AND u_task_sequence != 0
+                """,
+                (batch.id,)
+            )
+            if ml_ids:
+                self.env.cr.execute(
+                    """
+                    UPDATE stock_move_line ml
+                    SET u_task_sequence = v.sequence
+                    FROM unnest(%s::integer[], %s::integer[])
+                        AS v(id, sequence)
+                    WHERE ml.id = v.id
+                    """,
+                    (ml_ids, sequences)
+                )
+        MoveLine.invalidate_cache(['u_task_sequence'])
+
     def _check_user_id(self, user_id):
         if user_id is None:
             user_id = self.env.user.id
@@ -390,7 +652,9 @@ class StockPickingBatch(models.Model):
                 'u_ephemeral': self.u_ephemeral,
                 'picking_ids': pickings.get_info(),
                 'result_package_names': pickings.get_result_packages_names(),
-                'u_original_name': self.u_original_name}
+                'u_original_name': self.u_original_name,
+                'validation_job_ids': self.u_validation_job_ids.filtered(
+                    lambda j: j.state == 'queued').ids}
 
     def get_info(self, allowed_picking_states):
         """
@@ -398,7 +662,7 @@ class StockPickingBatch(models.Model):
         all batches.
         """
         return [batch._prepare_info(allowed_picking_states)
-                for batch in self]
+                for batch in with_info_cache(self)]
 
     def _select_batch_to_assign(self, batches):
         """
@@ -417,16 +681,74 @@ class StockPickingBatch(models.Model):
 
         Note that the transition from state 'ready' to 'in_progress'
         is handled by computation of state function.
+
+        The selected batch is locked until the end of the transaction.
+        Batches locked by concurrent assignments are skipped, so that
+        concurrent users are assigned different batches.
         """
-        batches = self.search([('state', '=', 'ready')]) \
-                      .filtered(lambda b: all([pt.id == picking_type_id
-                                               for pt in b.picking_type_ids]))
+        batches = self._get_ready_batches(picking_type_id)
 
-        if batches:
+        while batches:
             batch = self._select_batch_to_assign(batches)
-            batch.user_id = self.env.user
+            if batch._lock_for_assignment():
+                batch.user_id = self.env.user
+                batch.refresh_task_queue()
+
+                return batch
+            batches -= batch
+
+    def _get_ready_batches(self, picking_type_id):
+        """
+        Return the batches in state 'ready' that only have pickings of
+        the specified picking type, filtering the picking types in SQL.
+        """
+        # The state and picking types of the batches must be up to date
+        # in the db
+        self.recompute()
+        field = self._fields['picking_type_ids']
+        # Only the batches readable by the user
+        query = self._where_calc([('state', '=', 'ready')])
+        self._apply_ir_rules(query, 'read')
+        from_clause, where_clause, params = query.get_sql()
+        self.env.cr.execute(
+            """
+            SELECT "stock_picking_batch".id
+            FROM {from_clause}
+            WHERE {where}
+              AND NOT EXISTS (
+                  SELECT 1
+                  FROM {relation} r
+                  WHERE r.{column1} = "stock_picking_batch".id
+                    AND r.{column2} != %s
+              )
+            ORDER BY "stock_picking_batch".name
+            """.format(from_clause=from_clause,
+                       where=where_clause,
+                       relation=field.relation,
+                       column1=field.column1,
+                       column2=field.column2),
+            params + [picking_type_id]
+        )
+        return self.browse([row[0] for row in self.env.cr.fetchall()])
 
-            return batch
+    def _lock_for_assignment(self):
+        """
+        Lock the row of the batch in self unless another transaction
+        holds a lock on it, and return whether the batch is still ready
+        and locked for this transaction.
+        """
+        self.ensure_one()
+        self.env.cr.execute(
+            """
+            SELECT id
+            FROM stock_picking_batch
+            WHERE id = %s
+              AND state = 'ready'
+            FOR UPDATE SKIP LOCKED
+            """,
+            (self.id,)
+        )
+        return bool(self.env.cr.fetchone())
 
     @api.multi
     def create_batch(self, picking_type_id, picking_priorities, user_id=None, picking_id=None):
@@ -459,7 +781,8 @@ class StockPickingBatch(models.Model):
         if picking_id:
             picking = Picking.browse(picking_id)
         else:
-            picking = Picking.search_for_pickings(picking_type_id, picking_priorities)
+            picking = Picking.search_for_pickings(
+                picking_type_id, picking_priorities, skip_locked=True)
 
         if not picking:
             return None
@@ -468,9 +791,126 @@ class StockPickingBatch(models.Model):
         picking.write({'batch_id': batch.id})
         batch.write({'u_ephemeral': True})
         batch.confirm_picking()
+        batch.refresh_task_queue()
 
         return batch
 
+    @api.model
+    def build_waves(self):
+        """
+        Group the ready, unbatched pickings of the picking types that build
+        pick waves into ready batches, which assign_batch then hands out.
+        Meant to be run by a scheduled job.
+        """
+        PickingType = self.env['stock.picking.type']
+
+        batches = self.browse()
+        for picking_type in PickingType.search([('u_build_waves', '=', True)]):
+            batches |= self._build_waves_for_picking_type(picking_type)
+
+        return batches
+
+    def _build_waves_for_picking_type(self, picking_type):
+        """
+        Create a ready batch for each pick wave of the ready, unbatched
+        pickings of the picking type, see _plan_waves. Pickings locked by
+        concurrent batch creation are left for the next run.
+
+        Only the pickings of a wave are locked, when its batch is created,
+        so that the other pickings of the picking type are not blocked
+        until the end of the transaction.
+        """
+        PickingBatch = self.env['stock.picking.batch']
+        Picking = self.env['stock.picking']
+
+        domain = [
+            ('picking_type_id', '=', picking_type.id),
+            ('state', '=', 'assigned'),
+            ('batch_id', '=', False),
+        ]
+        pickings = Picking.search(domain)
+
+        batches = PickingBatch.browse()
+        for wave in self._plan_waves(picking_type, pickings):
+            # Leave out the pickings batched or changed since the search
+            wave = Picking._search_skip_locked(
+                domain + [('id', 'in', wave.ids)])
+            if not wave:
+                continue
+            batch = PickingBatch.sudo().create({})
+            wave.write({'batch_id': batch.id})
+            batch.mark_as_todo()
+            batch.refresh_task_queue()
+            batches |= batch
+
+        _logger.info("Built %d pick waves of %s from %d pickings",
+                     len(batches), picking_type.name, len(pickings))
+        return batches
+
+    def _plan_waves(self, picking_type, pickings):
+        """
+        Return a list of picking recordsets, one per pick wave, grouping the
+        pickings so that the pickings of a wave share as many pick
+        locations as possible.
+
+        Pickings are considered in the order given by _order. Each wave
+        starts with the first picking left and repeatedly takes the picking
+        with the most locations in common with the wave, until the wave is
+        full according to the wave limits of the picking type. Waves only
+        have pickings of the same priority and location category.
+        """
+        max_pickings = picking_type.u_wave_max_pickings or 1
+        max_lines = picking_type.u_wave_max_lines
+        max_volume = picking_type.u_wave_max_volume
+
+        pickings.mapped('move_line_ids.location_id')
+        pickings.mapped('move_line_ids.product_id.volume')
+        locations = {}
+        lines = {}
+        volumes = {}
+        for picking in pickings:
+            mls = picking.move_line_ids
+            locations[picking] = set(mls.mapped('location_id').ids)
+            lines[picking] = len(mls)
+            volumes[picking] = sum(ml.product_id.volume * ml.product_uom_qty
+                                   for ml in mls)
+
+        def fits(wave, picking):
+            return (
+                (not max_lines
+                 or sum(lines[p] for p in wave) + lines[picking] <= max_lines)
+                and (not max_volume
+                     or sum(volumes[p] for p in wave) + volumes[picking]
+                     <= max_volume)
+            )
+
+        waves = []
+        by_group = pickings.groupby(
+            lambda p: (p.priority, p.u_location_category_id.id))
+        # Higher priority waves are built first, so they get the lower
+        # batch names that assign_batch hands out first
+        for _group, group in sorted(by_group, key=lambda g: g[0][0],
+                                    reverse=True):
+            remaining = list(group.sorted())
+            while remaining:
+                wave = [remaining.pop(0)]
+                wave_locations = set(locations[wave[0]])
+                while len(wave) < max_pickings:
+                    candidates = [p for p in remaining if fits(wave, p)]
+                    if not candidates:
+                        break
+                    # max() keeps the first picking in _order on ties
+                    best = max(
+                        candidates,
+                        key=lambda p: len(locations[p] & wave_locations)
+                    )
+                    remaining.remove(best)
+                    wave.append(best)
+                    wave_locations |= locations[best]
+                waves.append(pickings.browse([p.id for p in wave]))
+
+        return waves
+
     def _copy_continuation_batch(self, pickings):
         """
         Copy a batch and add the provided pickings.
@@ -501,7 +941,8 @@ class StockPickingBatch(models.Model):
         Picking = self.env['stock.picking']
 
         picking_priorities = self.get_batch_priority_group()
-        pickings = Picking.search_for_pickings(picking_type_id, picking_priorities)
+        pickings = Picking.search_for_pickings(
+            picking_type_id, picking_priorities, skip_locked=True)
 
         if not pickings:
             raise ValidationError(_("No more work to do."))
@@ -544,6 +985,7 @@ class StockPickingBatch(models.Model):
         MoveLine = self.env['stock.move.line']
         Picking = self.env['stock.picking']
         Package = self.env['stock.quant.package']
+        ValidationJob = self.env['stock.validation.job']
         dest_loc = None
 
         if location_barcode:
@@ -585,28 +1027,23 @@ class StockPickingBatch(models.Model):
             if to_update:
                 completed_move_lines.write(to_update)
 
-            to_add = Picking.browse()
-            picks_todo = Picking.browse()
-
-            for pick in pickings:
-                pick_todo = pick
-                pick_mls = completed_move_lines.filtered(
-                    lambda x: x.picking_id == pick)
-
-                if pick._requires_backorder(pick_mls):
-                    pick_todo = pick._backorder_movelines(pick_mls)
-                    to_add |= pick_todo
-
-                picks_todo |= pick_todo
+            picks_todo, to_add = \
+                Picking._backorder_pickings_for_move_lines(completed_move_lines)
 
             # Add backorders to the batch
             to_add.write({'batch_id': self.id})
 
-            with self.statistics() as stats:
-                picks_todo.sudo().with_context(tracking_disable=True).action_done()
+            if picking_type.u_validate_async:
+                job = ValidationJob.enqueue(picks_todo, batch=self)
+                _logger.info("%s queued for validation in %s", picks_todo, job)
+                # The pending pickings no longer keep the batch in progress
+                self._compute_state()
+            else:
+                with self.statistics() as stats:
+                    picks_todo.sudo().with_context(tracking_disable=True).action_done()
 
-            _logger.info("%s action_done in %.2fs, %d queries",
-                         picks_todo, stats.elapsed, stats.count)
+                _logger.info("%s action_done in %.2fs, %d queries",
+                             picks_todo, stats.elapsed, stats.count)
         if not continue_batch:
             self.close()
 
@@ -908,23 +1345,31 @@ class StockPickingBatch(models.Model):
     def close(self):
         """ Unassign incomplete pickings from batches. In case of a
         non-ephemeral batch then incomplete pickings are moved into a new
-        batch.
+        batch. Pickings waiting for a validation job stay in the batch, but
+        are not counted in its state.
         """
+        ValidationJob = self.env['stock.validation.job']
+
         for batch in self:
+            pending = ValidationJob.get_pending_pickings(batch.picking_ids)
+
             # Unassign batch_id from incomplete stock pickings on ephemeral batches
             batch.filtered(lambda b: b.u_ephemeral)\
                 .mapped('picking_ids')\
-                .filtered(lambda sp: sp.state not in ('done', 'cancel'))\
+                .filtered(lambda sp: sp.state not in ('done', 'cancel')
+                          and sp not in pending)\
                 .write({'batch_id': False})
 
             # Assign incomplete pickings to new batch
             _logger.info('Creating continuation batch from %r.', batch.name)
             pickings = batch.filtered(lambda b: not b.u_ephemeral)\
                            .mapped('picking_ids')\
-                           .filtered(lambda sp: sp.state not in ('done', 'cancel'))
+                           .filtered(lambda sp: sp.state not in ('done', 'cancel')
+                                     and sp not in pending)
             _logger.info('Picking ids continuation %r', pickings)
 
             batch._copy_continuation_batch(pickings)
+            batch._compute_state()
 
     def remove_unfinished_work(self):
         """
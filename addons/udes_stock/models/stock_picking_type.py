@@ -7,6 +7,10 @@ CORE_LIFECYCLE_ACTIONS = [
     ("group_by_move_key", "Group by Move Key"),
 ]
 
+# Fields of the picking types defining the staging locations, which are not
+# put away in, see stock.location._get_non_putaway_locations
+STAGING_FIELDS = {"code", "default_location_dest_id", "default_location_src_id", "active"}
+
 
 class StockPickingType(models.Model):
     _inherit = "stock.picking.type"
@@ -260,6 +264,15 @@ class StockPickingType(models.Model):
         "destination locations",
     )
 
+    u_drop_location_hold_ttl = fields.Integer(
+        string="Hold Suggested Location For (s)",
+        default=0,
+        help="When set, the by height and speed policy suggests a single "
+        "empty location, which is held for the picking for this number of "
+        "seconds so that it is not suggested to other pickings. Held "
+        "locations are released when the picking is done or cancelled.",
+    )
+
     # Picking lifecycle actions
 
     u_move_line_key_format = fields.Char(
@@ -320,6 +333,48 @@ class StockPickingType(models.Model):
         "-1 indicates all pickings should be reserved.",
     )
 
+    u_num_reserved_in_cycle = fields.Integer(
+        string="Pickings reserved in the current cycle",
+        default=0,
+        readonly=True,
+        copy=False,
+        help="The number of pickings reserved by the last reservation cycle "
+        "and on stock arrival since. Reservation on stock arrival stops once "
+        "it reaches the number of pickings to reserve, until the next cycle.",
+    )
+
+    u_reservation_page_size = fields.Integer(
+        string="Reservation page size",
+        default=100,
+        help="The number of confirmed pickings fetched at a time when "
+        "looking for pickings to reserve.",
+    )
+
+    u_reservation_max_tries = fields.Integer(
+        string="Reservation maximum tries",
+        default=5,
+        help="The number of times reserving a picking is retried after a "
+        "concurrency error before giving up on the picking type until the "
+        "next reservation cycle.",
+    )
+
+    u_reservation_backoff = fields.Float(
+        string="Reservation backoff (s)",
+        default=0.1,
+        help="The base time to wait before retrying a reservation after a "
+        "concurrency error. The wait is doubled on every retry, capped "
+        "at 30 times the base, and randomised to spread out the retries "
+        "of concurrent workers.",
+    )
+
+    u_reserve_on_stock_arrival = fields.Boolean(
+        string="Reserve on stock arrival",
+        default=False,
+        help="Flag to indicate whether stock arriving at the source location "
+        "triggers a reservation pass over the pickings that need it, rather "
+        "than waiting for the next full reservation cycle.",
+    )
+
     u_reserve_batches = fields.Boolean(
         string="Reserve picking batches atomically",
         default=False,
@@ -327,6 +382,55 @@ class StockPickingType(models.Model):
         "This is ignored if the number of pickings to reserve is 0.",
     )
 
+    u_validate_async = fields.Boolean(
+        string="Validate Asynchronously",
+        default=False,
+        help="Flag to indicate whether pickings validated by update_picking "
+        "or at batch drop off are queued for validation by a scheduled job, "
+        "rather than validated while the user waits.",
+    )
+
+    u_pick_path_strategy = fields.Selection(
+        [
+            ("none", "None"),
+            ("s_shape", "S-shape"),
+            ("largest_gap", "Largest gap"),
+            ("nearest_neighbour", "Nearest neighbour"),
+        ],
+        string="Pick Path Strategy",
+        default="none",
+        required=True,
+        help="How the tasks of a batch are ordered into a route through the "
+        "pick locations, using their X, Y and Z coordinates. With None tasks "
+        "follow the order of the pickings in the batch.",
+    )
+
+    u_build_waves = fields.Boolean(
+        string="Build Pick Waves",
+        default=False,
+        help="Flag to indicate whether a scheduled job groups the ready, "
+        "unbatched pickings of this type into ready batches, sharing as many "
+        "pick locations as possible.",
+    )
+
+    u_wave_max_pickings = fields.Integer(
+        string="Wave Maximum Pickings",
+        default=10,
+        help="Maximum number of pickings (totes) in a pick wave.",
+    )
+
+    u_wave_max_lines = fields.Integer(
+        string="Wave Maximum Lines",
+        default=50,
+        help="Maximum number of move lines in a pick wave, 0 means no limit.",
+    )
+
+    u_wave_max_volume = fields.Float(
+        string="Wave Maximum Volume",
+        default=0.0,
+        help="Maximum volume of the products in a pick wave, 0 means no limit.",
+    )
+
     u_auto_unlink_empty = fields.Boolean(
         string="Auto Unlink Empty",
         default=True,
@@ -334,6 +438,30 @@ class StockPickingType(models.Model):
         " for any empty picking in the system.",
     )
 
+    @api.model
+    def create(self, vals):
+        """Clear the cached staging locations of the occupancy"""
+        picking_type = super().create(vals)
+        self.clear_caches()
+        return picking_type
+
+    @api.multi
+    def write(self, vals):
+        """Clear the cached staging locations of the occupancy when they may
+        have changed
+        """
+        res = super().write(vals)
+        if STAGING_FIELDS.intersection(vals):
+            self.clear_caches()
+        return res
+
+    @api.multi
+    def unlink(self):
+        """Clear the cached staging locations of the occupancy"""
+        res = super().unlink()
+        self.clear_caches()
+        return res
+
     def do_refactor_action(self, action, moves):
         """Resolve and call the method to be executed on the moves.
 
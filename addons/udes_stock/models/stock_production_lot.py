@@ -1,8 +1,11 @@
 # -*- coding: utf-8 -*-
 
-from odoo import models, _
+from odoo import api, models, _
 from odoo.exceptions import ValidationError
 
+from .. import identifier_cache
+from ..common import cached_info
+
 
 class StockProductionLot(models.Model):
     _inherit = 'stock.production.lot'
@@ -30,20 +33,21 @@ class StockProductionLot(models.Model):
             prevents the creation of a new lot
         """
         name = None
-        domain = [('product_id', '=', product_id)]
 
         if isinstance(lot_identifier, int):
-            domain.append(('id', '=', lot_identifier))
+            results = self.search([('product_id', '=', product_id),
+                                   ('id', '=', lot_identifier)])
         elif isinstance(lot_identifier, str):
-            domain.append(('name', '=', lot_identifier))
+            results = self.browse(identifier_cache.resolve(
+                self, [lot_identifier], ['name'],
+                domain=[('product_id', '=', product_id)], key=(product_id,)
+            )[lot_identifier])
             name = lot_identifier
         else:
             raise ValidationError(
                 _('Unable to create domain for lot search from identifier '
                   'of type %s') % type(lot_identifier))
 
-        results = self.search(domain)
-
         if not results and not no_results:
             if not create or not name:
                 # if `create` was flagged, `name` was not provided
@@ -61,6 +65,45 @@ class StockProductionLot(models.Model):
 
         return results
 
+    def get_lots(self, lot_names, product_id, create=False):
+        """ Get the lots of the product with id product_id of a list of
+            names, resolved together. The names of lots that are not found
+            are left out, unless `create` is True, in which case the
+            missing lots are created.
+        """
+        resolved = identifier_cache.resolve(
+            self, set(lot_names), ['name'],
+            domain=[('product_id', '=', product_id)], key=(product_id,))
+        ids = []
+        for name in lot_names:
+            if not resolved[name] and create:
+                if not name:
+                    raise ValidationError(
+                        _('Lot not found for identifier %s') % name)
+                resolved[name] = self.create({'name': name,
+                                              'product_id': product_id}).ids
+            if len(resolved[name]) > 1:
+                raise ValidationError(
+                    _('Too many lot instances found for identifier %s') % name)
+            ids.extend(resolved[name])
+
+        return self.browse(ids)
+
+    @api.multi
+    def write(self, values):
+        changed = {'name', 'product_id'} & set(values)
+        if changed:
+            identifier_cache.invalidate(self, ['name'])
+        res = super(StockProductionLot, self).write(values)
+        if changed:
+            identifier_cache.invalidate(self, ['name'])
+        return res
+
+    @api.multi
+    def unlink(self):
+        identifier_cache.invalidate(self, ['name'])
+        return super(StockProductionLot, self).unlink()
+
     def _prepare_info(self):
         """
             Prepares the following info of the lot in self:
@@ -80,6 +123,6 @@ class StockProductionLot(models.Model):
         """
         res = []
         for lot in self:
-            res.append(lot._prepare_info())
+            res.append(cached_info(lot, lot._prepare_info))
 
         return res
@@ -37,12 +37,9 @@ class StockQuant(models.Model):
         """
         # TODO: check this function again, create generic is_valid/are_valid?
         Location = self.env['stock.location']
-        n_quant_locs = len(self.mapped('location_id'))
-        child_locs = Location.search([
-                ('id', 'child_of', location_id),
-                ('id', 'in', self.mapped('location_id.id'))
-            ])
-        if len(child_locs) != n_quant_locs:
+        quant_locs = self.mapped('location_id')
+        child_locs = quant_locs.filter_child_of(Location.browse(location_id))
+        if len(child_locs) != len(quant_locs):
             raise ValidationError(
                     _('The locations of some quants are not children of'
                       ' location %s') %
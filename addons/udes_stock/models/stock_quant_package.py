@@ -3,6 +3,9 @@
 from odoo import api, fields, models, _
 from odoo.exceptions import ValidationError, UserError
 
+from .. import identifier_cache
+from ..common import cached_info, parse_fields_to_fetch
+
 import logging
 _logger = logging.getLogger(__name__)
 
@@ -20,7 +23,7 @@ class StockQuantPackage(models.Model):
     u_package_depth = fields.Integer(string="Package Depth",
         help="The maximum number of package levels within a package hierarchy. I.e. 2 would denote a single level of packages (each with no subpackage) within a parent package",
         compute="_compute_package_depth",
-        store=False,
+        store=True,
     )
 
     @api.depends('package_id')
@@ -64,7 +67,7 @@ class StockQuantPackage(models.Model):
 
     name = fields.Char(default=_default_package_name)
 
-    def _prepare_info(self, extended=False, **kwargs):
+    def _prepare_info(self, extended=False, fields_to_fetch=None, **kwargs):
         """
             Prepares the following info of the package in self:
             - id: int
@@ -77,21 +80,40 @@ class StockQuantPackage(models.Model):
             When extended is True also return:
             - location_id: [{stock.quants}]
             - quant_ids: [{stock.quants}]
+
+            @param fields_to_fetch: array of string
+                Subset of the fields above to return, dotted paths
+                restrict the info of the children packages and location
         """
         self.ensure_one()
 
+        top_level, nested = parse_fields_to_fetch(fields_to_fetch)
+
+        def _wanted(key):
+            return not top_level or key in top_level
+
         info = {"id": self.id,
                 "name": self.name}
 
         if self.package_id:
             info['package_id'] = self.package_id.id
-        if self.children_ids:
-            info['children_ids'] = self.children_ids.get_info(extended=extended, **kwargs)
+        if self.children_ids and _wanted('children_ids'):
+            info['children_ids'] = self.children_ids.get_info(
+                extended=extended,
+                fields_to_fetch=nested.get('children_ids'),
+                **kwargs)
 
         if extended:
-            location_info = self.location_id.get_info()
-            info['location_id'] = location_info[0] if location_info else {}
-            info['quant_ids'] = self.quant_ids.get_info()
+            if _wanted('location_id'):
+                location_info = self.location_id.get_info(
+                    fields_to_fetch=nested.get('location_id'))
+                info['location_id'] = location_info[0] if location_info else {}
+            if _wanted('quant_ids'):
+                info['quant_ids'] = self.quant_ids.get_info()
+
+        if top_level:
+            info = {key: value for key, value in info.items()
+                    if key in top_level}
 
         return info
 
@@ -100,7 +122,8 @@ class StockQuantPackage(models.Model):
         """
         res = []
         for pack in self:
-            res.append(pack._prepare_info(extended=extended, **kwargs))
+            res.append(cached_info(pack, pack._prepare_info,
+                                   extended=extended, **kwargs))
 
         return res
 
@@ -117,14 +140,14 @@ class StockQuantPackage(models.Model):
         """
         name = None
         if isinstance(package_identifier, int):
-            domain = [('id', '=', package_identifier)]
+            results = self.search([('id', '=', package_identifier)])
         elif isinstance(package_identifier, str):
-            domain = [('name', '=', package_identifier)]
+            results = self.browse(identifier_cache.resolve(
+                self, [package_identifier], ['name']
+            )[package_identifier])
             name = package_identifier
         else:
             raise ValidationError(_('Unable to create domain for package search from identifier of type %s') % type(package_identifier))
-
-        results = self.search(domain)
         if not results and not no_results:
             if not create or name is None:
                 raise ValidationError(_('Package not found for identifier %s') % str(package_identifier))
@@ -134,6 +157,31 @@ class StockQuantPackage(models.Model):
 
         return results
 
+    def get_packages(self, package_names, create=False, no_results=False):
+        """ Get the packages of a list of names, resolved together.
+
+            @param create: Boolean
+                When it is True, the packages that do not exist
+                will be created
+
+            @param no_results: Boolean
+                Allows to leave out the names of packages that are not
+                found, instead of raising an error
+        """
+        resolved = identifier_cache.resolve(self, set(package_names), ['name'])
+        ids = []
+        for name in package_names:
+            found = resolved[name]
+            if not found and create:
+                found = resolved[name] = self.create({'name': name}).ids
+            if not found and not no_results:
+                raise ValidationError(_('Package not found for identifier %s') % name)
+            if len(found) > 1:
+                raise ValidationError(_('Too many packages found for identifier %s') % name)
+            ids.extend(found)
+
+        return self.browse(ids)
+
     def assert_not_reserved(self):
         """ Check that the content of the package is reserved, in that
             case raise an error.
@@ -277,4 +325,14 @@ class StockQuantPackage(models.Model):
     @api.multi
     def write(self, values):
         self._check_allowed_package(values)
-        return super(StockQuantPackage, self).write(values)
+        if 'name' in values:
+            identifier_cache.invalidate(self, ['name'])
+        res = super(StockQuantPackage, self).write(values)
+        if 'name' in values:
+            identifier_cache.invalidate(self, ['name'])
+        return res
+
+    @api.multi
+    def unlink(self):
+        identifier_cache.invalidate(self, ['name'])
+        return super(StockQuantPackage, self).unlink()
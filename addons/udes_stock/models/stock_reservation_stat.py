@@ -0,0 +1,49 @@
+# -*- coding: utf-8 -*-
+
+from datetime import datetime, timedelta
+
+from odoo import api, fields, models
+
+# Number of days the statistics are kept for
+RETENTION_DAYS = 30
+
+
+class StockReservationStat(models.Model):
+    """Contention statistics of reserving stock for a picking type, one
+    record per reservation run.
+    """
+
+    _name = "stock.reservation.stat"
+    _description = "Stock Reservation Statistics"
+    _order = "date_start desc, id desc"
+
+    picking_type_id = fields.Many2one(
+        "stock.picking.type", string="Picking Type", required=True, index=True, ondelete="cascade"
+    )
+    date_start = fields.Datetime("Start", required=True, index=True)
+    duration = fields.Float("Duration (s)", digits=(16, 3))
+    num_reserved = fields.Integer("Pickings Reserved")
+    num_retries = fields.Integer(
+        "Retries", help="Number of times a reservation was retried after a concurrency error."
+    )
+    num_give_ups = fields.Integer(
+        "Give Ups",
+        help="Number of times reservation stopped after reaching the maximum number of tries.",
+    )
+    sleep_time = fields.Float(
+        "Sleep Time (s)", digits=(16, 3), help="Time spent waiting before retrying."
+    )
+    deadline_reached = fields.Boolean(
+        "Deadline Reached", help="Whether reservation stopped due to the cycle deadline."
+    )
+
+    @api.model
+    def gc_old_stats(self, days=RETENTION_DAYS):
+        """ Delete the statistics of the reservation runs that started more
+            than days ago
+        """
+        date_limit = datetime.now() - timedelta(days=days)
+        self.env.cr.execute(
+            "DELETE FROM stock_reservation_stat WHERE date_start < %s",
+            (fields.Datetime.to_string(date_limit),),
+        )
@@ -0,0 +1,137 @@
+# -*- coding: utf-8 -*-
+
+import logging
+
+from odoo import api, fields, models
+
+_logger = logging.getLogger(__name__)
+
+
+class StockReservationTrigger(models.Model):
+    """Products that have arrived at a location since stock was last
+    reserved for them. Processed by the reserve stock on arrival cron.
+    """
+
+    _name = "stock.reservation.trigger"
+    _description = "Stock Reservation Trigger"
+    _order = "id"
+
+    product_id = fields.Many2one(
+        "product.product", string="Product", required=True, index=True, ondelete="cascade"
+    )
+    location_id = fields.Many2one(
+        "stock.location", string="Location", required=True, ondelete="cascade"
+    )
+
+    _sql_constraints = [
+        (
+            "product_location_uniq",
+            "unique(product_id, location_id)",
+            "A product can only be queued once per location.",
+        ),
+    ]
+
+    @api.model
+    def queue_move_lines(self, move_lines):
+        """ Queue a trigger for each product arriving at an internal location
+            in the done move lines, if any picking type reserves on arrival.
+            Triggers already queued are kept, with a single insert which
+            does nothing when no picking type reserves on arrival.
+        """
+        keys = {
+            (ml.product_id.id, ml.location_dest_id.id)
+            for ml in move_lines
+            if ml.qty_done > 0 and ml.location_dest_id.usage == "internal"
+        }
+        if not keys:
+            return
+
+        product_ids, location_ids = zip(*keys)
+        self.env.cr.execute(
+            """
+            INSERT INTO stock_reservation_trigger
+                (product_id, location_id,
+                 create_uid, create_date, write_uid, write_date)
+            SELECT k.product_id, k.location_id,
+                   %(uid)s, now() at time zone 'UTC',
+                   %(uid)s, now() at time zone 'UTC'
+            FROM unnest(%(product_ids)s::integer[], %(location_ids)s::integer[])
+                AS k(product_id, location_id)
+            WHERE EXISTS (
+                SELECT 1
+                FROM stock_picking_type
+                WHERE u_reserve_on_stock_arrival AND active
+            )
+            ON CONFLICT (product_id, location_id) DO NOTHING
+            """,
+            {
+                "uid": self.env.uid,
+                "product_ids": list(product_ids),
+                "location_ids": list(location_ids),
+            },
+        )
+
+    @api.model
+    def process_triggers(self):
+        """ Reserve stock for the confirmed pickings that need the products of
+            the queued triggers, for each picking type that reserves on
+            arrival and whose source location the products arrived at.
+
+            All triggers queued since the last run are handled together, so
+            products arriving repeatedly within the cron interval only cause
+            one reservation pass. Triggers of picking types being reserved by
+            another worker are kept for the next run.
+
+            The number of pickings to reserve of the picking type applies to
+            a whole reservation cycle: the runs of the triggers only reserve
+            the pickings the last cycle left to reserve, see
+            u_num_reserved_in_cycle. Once none are left the triggers are
+            dropped, the next cycle reserves the pickings anyway.
+        """
+        Picking = self.env["stock.picking"]
+        PickingType = self.env["stock.picking.type"]
+
+        triggers = self.search([])
+        if not triggers:
+            return
+
+        picking_types = PickingType.search(
+            [
+                ("active", "=", True),
+                ("u_num_reservable_pickings", "!=", 0),
+                ("u_reserve_on_stock_arrival", "=", True),
+            ]
+        )
+        to_keep = self.browse()
+        for picking_type in picking_types:
+            location = picking_type.default_location_src_id
+            type_triggers = triggers.filtered(
+                lambda t: location.parent_left <= t.location_id.parent_left < location.parent_right
+            )
+            if not type_triggers:
+                continue
+
+            max_pickings = None
+            if picking_type.u_num_reservable_pickings > 0:
+                max_pickings = (
+                    picking_type.u_num_reservable_pickings - picking_type.u_num_reserved_in_cycle
+                )
+                if max_pickings <= 0:
+                    _logger.info(
+                        "Picking type %r reserved all its pickings for this cycle.", picking_type
+                    )
+                    continue
+
+            products = type_triggers.mapped("product_id")
+            _logger.info(
+                "Reserving stock for picking type %r on arrival of %d products.",
+                picking_type,
+                len(products),
+            )
+            report = Picking._reserve_stock_shard(
+                picking_type, product_ids=products.ids, max_pickings=max_pickings
+            )
+            if report is None:
+                to_keep |= type_triggers
+
+        (triggers - to_keep).unlink()
@@ -0,0 +1,224 @@
+# -*- coding: utf-8 -*-
+
+import logging
+import traceback
+from datetime import datetime, timedelta
+
+from odoo import _, api, fields, models
+from odoo.exceptions import ValidationError
+
+_logger = logging.getLogger(__name__)
+
+# Number of times a job is run before it is flagged as failed
+MAX_ATTEMPTS = 3
+# Delay in seconds before a job is retried, doubled after each attempt
+RETRY_DELAY = 60
+
+
+class StockValidationJob(models.Model):
+    """Validation of pickings queued by update_picking and drop_off_picked
+    for picking types that validate asynchronously. Processed in order by
+    the process validation jobs cron.
+    """
+
+    _name = "stock.validation.job"
+    _description = "Stock Validation Job"
+    _order = "id"
+
+    picking_ids = fields.Many2many(
+        "stock.picking",
+        relation="stock_validation_job_picking_rel",
+        column1="job_id",
+        column2="picking_id",
+        string="Pickings",
+        required=True,
+    )
+    batch_id = fields.Many2one(
+        "stock.picking.batch", string="Batch", index=True, ondelete="set null"
+    )
+    user_id = fields.Many2one(
+        "res.users", string="Requested By", default=lambda self: self.env.user
+    )
+    state = fields.Selection(
+        [("queued", "Queued"), ("done", "Done"), ("failed", "Failed")],
+        string="State",
+        default="queued",
+        required=True,
+        index=True,
+    )
+    attempts = fields.Integer("Attempts", default=0)
+    date_next_attempt = fields.Datetime(
+        "Next Attempt",
+        readonly=True,
+        index=True,
+        help="Queued jobs are not run before this date, set when an attempt fails",
+    )
+    error = fields.Text("Error", readonly=True)
+    date_done = fields.Datetime("Date Done", readonly=True)
+
+    @api.model
+    def enqueue(self, pickings, batch=None):
+        """ Queue the validation of the pickings and return the job """
+        if not pickings:
+            raise ValidationError(_("There are no pickings to validate."))
+
+        return self.sudo().create(
+            {
+                "picking_ids": [(6, 0, pickings.ids)],
+                "batch_id": batch.id if batch else False,
+                "user_id": self.env.uid,
+            }
+        )
+
+    @api.model
+    def get_pending_pickings(self, pickings):
+        """ Return the pickings in pickings with queued validation jobs """
+        jobs = self.sudo().search(
+            [("state", "=", "queued"), ("picking_ids", "in", pickings.ids)]
+        )
+        return pickings & jobs.mapped("picking_ids")
+
+    def _prepare_info(self):
+        """
+            Prepares the following info of the job in self:
+            - id: int
+            - state: string
+            - picking_ids: [int]
+            - attempts: int
+            - error: string
+            - date_done: datetime
+        """
+        self.ensure_one()
+
+        return {
+            "id": self.id,
+            "state": self.state,
+            "picking_ids": self.picking_ids.ids,
+            "attempts": self.attempts,
+            "error": self.error or "",
+            "date_done": self.date_done,
+        }
+
+    def get_info(self):
+        """ Return a list with the information of each job in self.
+        """
+        res = []
+        for job in self:
+            res.append(job._prepare_info())
+
+        return res
+
+    def _get_next_job(self):
+        """ Return the oldest queued job none of whose pickings is in an
+            older queued job and whose next attempt is due, locking it so
+            that concurrent workers skip it. Jobs of the same picking are
+            therefore run in order, failed jobs do not hold back the later
+            ones.
+        """
+        self.env.cr.execute(
+            """
+            SELECT j.id
+            FROM stock_validation_job j
+            WHERE j.state = 'queued'
+              AND (j.date_next_attempt IS NULL OR j.date_next_attempt <= %s)
+              AND NOT EXISTS (
+                  SELECT 1
+                  FROM stock_validation_job_picking_rel r
+                  JOIN stock_validation_job_picking_rel o
+                    ON o.picking_id = r.picking_id
+                  JOIN stock_validation_job older
+                    ON older.id = o.job_id
+                  WHERE r.job_id = j.id
+                    AND older.id < j.id
+                    AND older.state = 'queued'
+              )
+            ORDER BY j.id
+            LIMIT 1
+            FOR UPDATE OF j SKIP LOCKED
+            """,
+            (fields.Datetime.now(),),
+        )
+        row = self.env.cr.fetchone()
+        return self.browse(row[0] if row else [])
+
+    def _run(self):
+        """ Validate the pickings of the job in self that are not done yet.
+            On error the job is queued again to be retried after a delay
+            doubling with each attempt, or flagged as failed after
+            MAX_ATTEMPTS attempts, and the error is kept on the job.
+        """
+        self.ensure_one()
+
+        pickings = self.picking_ids.filtered(lambda p: p.state not in ("done", "cancel"))
+        self.attempts += 1
+        try:
+            with self.env.cr.savepoint(), self.statistics() as stats:
+                pickings.sudo().with_context(tracking_disable=True).action_done()
+        except Exception:
+            # The savepoint is rolled back, drop what the cache still holds
+            self.invalidate_cache()
+            _logger.exception("Validation job %s failed on attempt %d", self.id, self.attempts)
+            delay = timedelta(seconds=RETRY_DELAY * 2 ** (self.attempts - 1))
+            failed = self.attempts >= MAX_ATTEMPTS
+            self.write(
+                {
+                    "state": "failed" if failed else "queued",
+                    "error": traceback.format_exc(),
+                    "date_next_attempt": fields.Datetime.to_string(datetime.now() + delay),
+                }
+            )
+            if failed:
+                self._report_failure()
+            return False
+
+        _logger.info(
+            "Validation job %s: %s action_done in %.2fs, %d queries",
+            self.id,
+            pickings,
+            stats.elapsed,
+            stats.count,
+        )
+        self.write(
+            {
+                "state": "done",
+                "error": False,
+                "date_done": fields.Datetime.now(),
+                "date_next_attempt": False,
+            }
+        )
+        return True
+
+    def _report_failure(self):
+        """ Post the failure of the job in self on its pickings and batch,
+            and count its pickings in the state of the batch again.
+        """
+        self.ensure_one()
+
+        msg = _("Validation job %s failed after %d attempts, %s need to be validated.") % (
+            self.id,
+            self.attempts,
+            ", ".join(self.picking_ids.mapped("name")),
+        )
+        self.picking_ids.sudo().message_post(body=msg)
+        if self.batch_id:
+            self.batch_id.sudo().message_post(body=msg)
+            self.batch_id.sudo()._compute_state()
+
+    @api.model
+    def process_jobs(self, limit=100):
+        """ Run up to limit queued jobs in order, committing after each one.
+            Meant to be run by a scheduled job, possibly by several workers
+            at the same time.
+        """
+        for _i in range(limit):
+            job = self._get_next_job()
+            if not job:
+                break
+            job._run()
+            self.env.cr.commit()
+
+    def retry(self):
+        """ Queue the failed jobs in self again """
+        self.filtered(lambda j: j.state == "failed").write(
+            {"state": "queued", "attempts": 0, "date_next_attempt": False}
+        )
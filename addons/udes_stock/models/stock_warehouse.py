@@ -95,6 +95,22 @@ class StockWarehouse(models.Model):
         help="Maximum depth for package hierarchy. I.e. a value of 2 would limit the number of levels in hierarchy to 2, one level of packages(with no subpackages) inside an outer package."
     )
 
+    u_reservation_workers = fields.Integer(
+        "Reservation Workers",
+        default=1,
+        help="Number of workers the stock reservation cron uses. Each picking "
+             "type is reserved as a separate shard with its own cursor, so "
+             "values above 1 allow picking types to be reserved in parallel.",
+    )
+
+    u_reservation_deadline = fields.Integer(
+        "Reservation Deadline (s)",
+        default=0,
+        help="Maximum number of seconds a stock reservation cycle may run "
+             "for, pickings not reached are left for the next cycle. "
+             "0 means no deadline.",
+    )
+
     @lazy_property
     def reserved_package_name(self):
         return list(
@@ -0,0 +1,141 @@
+# -*- coding: utf-8 -*-
+"""
+Pick path sequencing
+
+Functions ordering the pick faces of a batch into a short walk through the
+warehouse. Pick faces are given as a dictionary of key: (x, y, z), where x
+is the aisle (stock.location posx), y the position along the aisle (posy)
+and z the height (posz). Aisles are assumed to be joined by a cross aisle
+at their front (lowest y) and at their back (highest y), and the picker
+starts at ORIGIN.
+
+Each strategy returns the keys in the order they should be visited.
+"""
+
+ORIGIN = (0, 0, 0)
+
+# Maximum number of improvement passes of two_opt
+MAX_TWO_OPT_PASSES = 10
+
+
+def distance(a, b):
+    """ Rectilinear distance between the points a and b """
+    return sum(abs(i - j) for i, j in zip(a, b))
+
+
+def route_length(route, points, start=ORIGIN):
+    """ Length of the walk from start through the points of route in order """
+    length = 0
+    here = start
+    for key in route:
+        length += distance(here, points[key])
+        here = points[key]
+    return length
+
+
+def _aisles(points):
+    """
+    Return a list of (x, keys) with the keys of each aisle sorted by their
+    position along the aisle, in aisle order.
+    """
+    aisles = {}
+    for key, (x, _y, _z) in points.items():
+        aisles.setdefault(x, []).append(key)
+    return [
+        (x, sorted(keys, key=lambda k: (points[k][1], points[k][2], k)))
+        for x, keys in sorted(aisles.items())
+    ]
+
+
+def s_shape(points, start=ORIGIN):
+    """
+    Serpentine route: every aisle with pick faces is walked end to end,
+    up the first aisle, down the next one and so on.
+    """
+    route = []
+    for i, (_x, keys) in enumerate(_aisles(points)):
+        route.extend(keys if i % 2 == 0 else reversed(keys))
+    return route
+
+
+def largest_gap(points, start=ORIGIN):
+    """
+    Largest gap route: the first and last aisles are walked end to end.
+    Every other aisle is entered from the front and from the back cross
+    aisle up to its largest gap between pick faces, or between a pick face
+    and the end of the aisle, which is never walked.
+    """
+    aisles = _aisles(points)
+    if len(aisles) < 3:
+        return s_shape(points, start=start)
+
+    ys = [point[1] for point in points.values()]
+    front, back = min(ys), max(ys)
+
+    front_parts = []
+    back_parts = []
+    for _x, keys in aisles[1:-1]:
+        positions = [front] + [points[k][1] for k in keys] + [back]
+        gaps = [positions[i + 1] - positions[i] for i in range(len(positions) - 1)]
+        split = gaps.index(max(gaps))
+        front_parts.append(keys[:split])
+        back_parts.append(list(reversed(keys[split:])))
+
+    route = list(aisles[0][1])
+    for keys in back_parts:
+        route.extend(keys)
+    route.extend(reversed(aisles[-1][1]))
+    for keys in reversed(front_parts):
+        route.extend(keys)
+    return route
+
+
+def nearest_neighbour(points, start=ORIGIN):
+    """
+    Nearest neighbour route improved with two_opt: from start, always walk
+    to the closest pick face not visited yet.
+    """
+    remaining = set(points)
+    route = []
+    here = start
+    while remaining:
+        key = min(remaining, key=lambda k: (distance(here, points[k]), k))
+        remaining.remove(key)
+        route.append(key)
+        here = points[key]
+    return two_opt(route, points, start=start)
+
+
+def two_opt(route, points, start=ORIGIN, max_passes=MAX_TWO_OPT_PASSES):
+    """
+    Improve route by reversing the sections of it that make the walk
+    shorter, until no reversal helps or max_passes passes are done.
+    The walk ends at the last pick face, it does not return to start.
+    """
+    route = list(route)
+    size = len(route)
+    for _pass in range(max_passes):
+        improved = False
+        for i in range(size - 1):
+            a = start if i == 0 else points[route[i - 1]]
+            b = points[route[i]]
+            for j in range(i + 1, size):
+                c = points[route[j]]
+                delta = distance(a, c) - distance(a, b)
+                if j + 1 < size:
+                    d = points[route[j + 1]]
+                    delta += distance(b, d) - distance(c, d)
+                if delta < 0:
+                    route[i:j + 1] = reversed(route[i:j + 1])
+                    b = points[route[i]]
+                    improved = True
+        if not improved:
+            break
+    return route
+
+
+STRATEGIES = {
+    "s_shape": s_shape,
+    "largest_gap": largest_gap,
+    "nearest_neighbour": nearest_neighbour,
+}
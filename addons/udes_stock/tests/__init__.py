@@ -16,11 +16,19 @@ from . import test_picking
 from . import test_picking_type
 from . import test_push_from_drop
 from . import test_replen
+from . import test_reservation_trigger
 from . import test_picking_batch
 from . import test_res_users
+from . import test_simulate_reserve_stock
 from . import test_splitting
 from . import test_target_storage_types
 from . import test_update_picking
 from . import test_picking_print_strategy
 from . import test_limit_orderpoints
 from . import test_package_hierarchy
+from . import test_pick_path
+from . import test_pick_waves
+from . import test_validation_job
+from . import test_location_hierarchy
+from . import test_identifier_cache
+from . import test_reserve_stock
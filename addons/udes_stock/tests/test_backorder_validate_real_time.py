@@ -736,3 +736,31 @@ class TestRealTimeUpdate(common.BaseUDES):
             picking_1._backorder_movelines(picking_2.move_line_ids)
         self.assertEqual(e.exception.name, expected_error_msg,
                      'No/Incorrect error message was thrown')
+
+    def test12_backorder_pickings_for_move_lines(self):
+        """ Checks that only the pickings holding other move lines are
+            backordered, and that the returned pickings hold exactly
+            the given move lines
+        """
+        create_info = [{'product': self.apple, 'qty': 4},
+                       {'product': self.banana, 'qty': 2}]
+        picking_1 = self.create_picking(self.picking_type_in,
+                                        products_info=create_info,
+                                        confirm=True)
+        picking_2 = self.create_picking(self.picking_type_in,
+                                        products_info=[{'product': self.apple,
+                                                        'qty': 1}],
+                                        confirm=True)
+
+        apple_mls = picking_1.move_line_ids.filtered(
+            lambda ml: ml.product_id == self.apple)
+        mls = apple_mls | picking_2.move_line_ids
+
+        pickings, backorders = picking_1._backorder_pickings_for_move_lines(mls)
+
+        self.assertEqual(len(backorders), 1)
+        self.assertEqual(backorders.backorder_id, picking_1)
+        self.assertEqual(backorders.move_line_ids, apple_mls)
+        self.assertEqual(pickings, backorders | picking_2)
+        self.assertEqual(pickings.mapped('move_line_ids'), mls)
+        self.assertEqual(picking_1.move_line_ids.product_id, self.banana)
@@ -0,0 +1,111 @@
+# -*- coding: utf-8 -*-
+
+from odoo.exceptions import ValidationError
+
+from . import common
+from .. import identifier_cache
+
+
+class TestIdentifierCache(common.BaseUDES):
+
+    def _get_stats(self, model_name):
+        return identifier_cache.get_stats(self.env).get(
+            model_name, {'hits': 0, 'misses': 0})
+
+    def test01_get_locations(self):
+        """ get_locations resolves names and barcodes together, in the
+            order they are given.
+        """
+        Location = self.env['stock.location']
+
+        locations = Location.get_locations(
+            ['LTEST02', self.test_location_01.name, 'LTEST02'])
+        self.assertEqual(locations.ids, [self.test_location_02.id,
+                                         self.test_location_01.id,
+                                         self.test_location_02.id])
+
+        with self.assertRaises(ValidationError) as e:
+            Location.get_locations(['LTEST01', 'LNOTALOCATION'])
+        self.assertEqual(e.exception.name,
+                         'Location not found for identifier LNOTALOCATION')
+
+    def test02_cached_until_written(self):
+        """ The identifiers of existing locations are cached until the
+            identifying fields of the location are written.
+        """
+        Location = self.env['stock.location']
+
+        suppliers = self.env.ref('stock.stock_location_suppliers')
+        before = self._get_stats('stock.location')
+
+        self.assertEqual(Location.get_location(suppliers.name), suppliers)
+        self.assertEqual(Location.get_location(suppliers.name), suppliers)
+
+        after = self._get_stats('stock.location')
+        self.assertEqual(after['misses'] - before['misses'], 1)
+        self.assertEqual(after['hits'] - before['hits'], 1)
+
+        suppliers.barcode = 'LTESTCACHESUPPLIERS'
+        self.assertEqual(Location.get_location(suppliers.name), suppliers)
+        self.assertEqual(Location.get_location('LTESTCACHESUPPLIERS'),
+                         suppliers)
+
+        # Written by the current transaction, so no longer cached
+        before = after
+        after = self._get_stats('stock.location')
+        self.assertEqual(after['misses'] - before['misses'], 2)
+        self.assertEqual(after['hits'] - before['hits'], 0)
+
+    def test03_new_records_are_not_cached(self):
+        """ Records created by the current transaction are not cached, as
+            they would be lost if it was rolled back.
+        """
+        Package = self.env['stock.quant.package']
+
+        package = Package.get_package('TESTCACHEPACKAGE', create=True)
+        before = self._get_stats('stock.quant.package')
+
+        self.assertEqual(Package.get_package('TESTCACHEPACKAGE'), package)
+        self.assertEqual(Package.get_package('TESTCACHEPACKAGE'), package)
+
+        after = self._get_stats('stock.quant.package')
+        self.assertEqual(after['misses'] - before['misses'], 2)
+        self.assertEqual(after['hits'] - before['hits'], 0)
+
+    def test04_invalidation_is_scoped_to_identifiers(self):
+        """ Writing the identifying fields of a record only drops its own
+            identifiers from the cache.
+        """
+        Location = self.env['stock.location']
+
+        suppliers = self.env.ref('stock.stock_location_suppliers')
+        customers = self.env.ref('stock.stock_location_customers')
+        Location.get_location(suppliers.name)
+        Location.get_location(customers.name)
+
+        before = self._get_stats('stock.location')
+        customers.name = 'LTESTCACHECUSTOMERS'
+        self.assertEqual(Location.get_location(suppliers.name), suppliers)
+
+        after = self._get_stats('stock.location')
+        self.assertEqual(after['hits'] - before['hits'], 1)
+        self.assertEqual(after['misses'] - before['misses'], 0)
+
+    def test05_cached_per_company_and_language(self):
+        """ Identifiers are cached separately for each company and language
+        """
+        Location = self.env['stock.location']
+        Company = self.env['res.company']
+
+        company = Company.create({'name': 'Test Cache Company'})
+        suppliers = self.env.ref('stock.stock_location_suppliers')
+        Location.get_location(suppliers.name)
+
+        before = self._get_stats('stock.location')
+        Location.with_context(lang='fr_FR').get_location(suppliers.name)
+        Location.with_context(force_company=company.id).get_location(suppliers.name)
+        Location.get_location(suppliers.name)
+
+        after = self._get_stats('stock.location')
+        self.assertEqual(after['misses'] - before['misses'], 2)
+        self.assertEqual(after['hits'] - before['hits'], 1)
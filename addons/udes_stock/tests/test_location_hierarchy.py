@@ -0,0 +1,45 @@
+# -*- coding: utf-8 -*-
+
+from . import common
+
+
+class TestLocationHierarchy(common.BaseUDES):
+
+    def test01_filter_child_of_matches_search(self):
+        """ filter_child_of returns the same locations as a child_of
+            search.
+        """
+        Location = self.env['stock.location']
+
+        locations = self.test_locations | self.test_output_locations \
+            | self.stock_location | self.out_location
+        for parents in (self.stock_location, self.out_location,
+                        self.stock_location | self.out_location,
+                        self.test_location_01):
+            expected = Location.search([('id', 'child_of', parents.ids),
+                                        ('id', 'in', locations.ids)])
+            self.assertEqual(locations.filter_child_of(parents), expected)
+
+    def test02_child_of_domain_matches_search(self):
+        """ _get_child_of_domain finds the same locations as child_of """
+        Location = self.env['stock.location']
+
+        parents = self.stock_location | self.out_location
+        self.assertEqual(
+            Location.search(parents._get_child_of_domain()),
+            Location.search([('id', 'child_of', parents.ids)]))
+
+    def test03_moving_a_location_updates_the_hierarchy(self):
+        """ Moving a location to another parent is reflected by
+            filter_child_of.
+        """
+        self.assertTrue(
+            self.test_location_01.filter_child_of(self.stock_location))
+
+        self.test_location_01.location_id = self.out_location
+
+        self.assertFalse(
+            self.test_location_01.filter_child_of(self.stock_location))
+        self.assertEqual(
+            self.test_location_01.filter_child_of(self.out_location),
+            self.test_location_01)
@@ -767,3 +767,102 @@ class TestLocationPI(common.BaseUDES):
 
         self.test_location_01._validate_perpetual_inventory_request(req)
         self.assertTrue(True)
+
+    def test28_process_pi_requests_reports_per_location(self):
+        """
+        Processes the valid requests of a bulk PI count and reports
+        the invalid ones without processing them.
+        """
+        Inventory = self.env['stock.inventory']
+
+        self.create_quant(self.apple.id, self.test_location_01.id, 4)
+        reqs = [
+            {
+                'location_id': self.test_location_01.id,
+                'inventory_adjustments': [
+                    {
+                        'product_id': self.apple.id,
+                        'package_name': 'test28_NO_PACKAGE',
+                        'quantity': 3
+                    }
+                ]
+            },
+            {
+                'location_id': self.test_location_02.id,
+                'inventory_adjustments': [
+                    {
+                        'product_id': self.strawberry.id,
+                        'package_name': self.package_one.name,
+                        'quantity': 5
+                    }
+                ]
+            },
+            {
+                'location_id': self.unknown_location_id,
+            },
+        ]
+
+        res = self.test_location_01.process_perpetual_inventory_requests(reqs)
+
+        self.assertEqual([r['location_id'] for r in res],
+                         [req['location_id'] for req in reqs])
+        self.assertEqual([r['success'] for r in res], [True, False, False])
+        self.assertFalse(res[0]['error'])
+        self.assertIn('the lot name is not specified', res[1]['error'])
+        self.assertTrue(res[2]['error'])
+
+        inv = Inventory.search([('location_id', 'in',
+                                 [self.test_location_01.id,
+                                  self.test_location_02.id])])
+        self.assertEqual(inv.mapped('location_id'), self.test_location_01)
+        self.assertEqual(inv.line_ids.product_qty, 3)
+        self.assertTrue(self.test_location_01.u_date_last_checked)
+        self.assertFalse(self.test_location_01.u_date_last_checked_correct)
+        self.assertFalse(self.test_location_02.u_date_last_checked)
+
+    def test29_get_stock_drift_serial_numbers_resolved_together(self):
+        """
+        Creates the missing lots and packages of all the entries
+        once, reusing the existing ones.
+        """
+        Lot = self.env['stock.production.lot']
+        Package = self.env['stock.quant.package']
+
+        existing_lot = Lot.get_lot('test29_sn_0', self.strawberry.id,
+                                   create=True)
+        lot_names = ['test29_sn_%d' % i for i in range(50)]
+        adjs_req = [{"product_id": self.strawberry.id,
+                     "package_name": "test29_package_%d" % (i % 2),
+                     "quantity": 1,
+                     "lot_name": name}
+                    for i, name in enumerate(lot_names)]
+
+        stock_drift = self.test_location_01._get_stock_drift(adjs_req)
+
+        self.assertEqual(len(stock_drift), 50)
+        lots = Lot.search([('name', 'in', lot_names),
+                           ('product_id', '=', self.strawberry.id)])
+        self.assertEqual(len(lots), 50)
+        self.assertIn(existing_lot.id, [s.lot_id for s in stock_drift])
+        self.assertEqual({s.lot_id for s in stock_drift}, set(lots.ids))
+        packages = Package.search([('name', 'like', 'test29_package_')])
+        self.assertEqual(len(packages), 2)
+        self.assertEqual({s.package_id for s in stock_drift},
+                         set(packages.ids))
+
+        inv = self.test_location_01._process_inventory_adjustments(adjs_req)
+        self.assertEqual(len(inv.line_ids), 50)
+
+    def test30_get_stock_drift_archived_product(self):
+        """
+        Raises an error for the adjustments of an archived product, as
+        for an unknown product.
+        """
+        self.apple.active = False
+        adjs_req = [{"product_id": self.apple.id,
+                     "package_name": "test30_package",
+                     "quantity": 4}]
+
+        with self.assertRaisesRegex(ValidationError,
+                                    'Invalid product scanned'):
+            self.test_location_01._get_stock_drift(adjs_req)
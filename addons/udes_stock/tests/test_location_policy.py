@@ -138,6 +138,36 @@ class TestLocationPolicy(common.BaseUDES):
             self.test_location_first_child_stock.u_quant_policy =\
                                                              'single_product_id'
 
+    def test11_effective_policy_propagated(self):
+        self.test_location_parent_stock.u_quant_policy = 'single_product_id'
+        self.assertEqual(
+            self.test_location_last_child_stock.u_effective_quant_policy,
+            'single_product_id')
+
+        self.test_location_middle_child_stock.u_quant_policy = 'all'
+        self.assertEqual(
+            self.test_location_first_child_stock.u_effective_quant_policy,
+            'single_product_id')
+        self.assertEqual(
+            self.test_location_last_child_stock.u_effective_quant_policy,
+            'all')
+
+        self.test_location_middle_child_stock.u_quant_policy = False
+        self.assertEqual(
+            self.test_location_last_child_stock.get_quant_policy(),
+            'single_product_id')
+
+    def test12_all_violations_reported(self):
+        for location in (self.test_location_middle_child_stock,
+                         self.test_location_last_child_stock):
+            self.create_quant(self.apple.id, location.id, 10)
+            self.create_quant(self.fig.id, location.id, 10)
+
+        with self.assertRaises(ValidationError) as e:
+            self.test_location_parent_stock.u_quant_policy = 'single_product_id'
+        self.assertIn(self.test_location_middle_child_stock.name, e.exception.name)
+        self.assertIn(self.test_location_last_child_stock.name, e.exception.name)
+
 
 class TestLocationPolicySingleLotAndProductPerPackage(common.BaseUDES):
     @classmethod
@@ -174,3 +174,36 @@ class TestPackageHierarchy(common.BaseUDES):
         with self.assertRaises(ValidationError) as e:
             pack_parent_2.package_id = pack_grandparent.id
         self.assertEqual(e.exception.name, 'Maximum package depth exceeded.')
+
+    def test8_package_depth_stored(self):
+        """Test The Package Depth Is Stored And Updated With Its Descendants"""
+        Package = self.env['stock.quant.package']
+        wh = self.env.user.get_user_warehouse()
+        wh.u_max_package_depth = 3
+
+        pack_child = self.create_package()
+        pack_parent = self.create_package()
+        pack_grandparent = self.create_package()
+        pack_child.package_id = pack_parent.id
+        pack_parent.package_id = pack_grandparent.id
+        self.assertEqual(pack_grandparent.u_package_depth, 3)
+        self.assertIn(pack_grandparent,
+                      Package.search([('u_package_depth', '=', 3)]))
+
+        pack_child.package_id = False
+        self.assertEqual(pack_parent.u_package_depth, 1)
+        self.assertEqual(pack_grandparent.u_package_depth, 2)
+        self.assertIn(pack_grandparent,
+                      Package.search([('u_package_depth', '=', 2)]))
+
+    def test9_result_package_relations_with_new_package(self):
+        """Test The Result Package Relations Are Read For New Packages"""
+        MoveLine = self.env['stock.move.line']
+        Package = self.env['stock.quant.package']
+
+        pack = self.create_package()
+        new_pack = Package.new({'name': 'test9_new_package'})
+        children, parents = MoveLine._get_result_package_relations(
+            pack | new_pack)
+        self.assertFalse(children)
+        self.assertFalse(parents)
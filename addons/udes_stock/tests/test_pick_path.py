@@ -0,0 +1,84 @@
+# -*- coding: utf-8 -*-
+
+from . import common
+from .. import pick_path
+
+
+class TestPickPath(common.BaseUDES):
+
+    @classmethod
+    def setUpClass(cls):
+        super(TestPickPath, cls).setUpClass()
+        # Two aisles of three bays, named so that name order walks both
+        # aisles from the front
+        cls.points = {
+            'A1': (1, 1, 0), 'A2': (1, 5, 0), 'A3': (1, 9, 0),
+            'B1': (3, 1, 0), 'B2': (3, 5, 0), 'B3': (3, 9, 0),
+        }
+
+    def test01_strategies_visit_every_pick_face_once(self):
+        """ Test that every strategy returns a route through all the points """
+        for name, strategy in pick_path.STRATEGIES.items():
+            route = strategy(self.points)
+            self.assertEqual(sorted(route), sorted(self.points), name)
+
+    def test02_s_shape_alternates_aisle_direction(self):
+        """ Test that the S-shape route walks up and down the aisles """
+        route = pick_path.s_shape(self.points)
+        self.assertEqual(route, ['A1', 'A2', 'A3', 'B3', 'B2', 'B1'])
+        self.assertLess(pick_path.route_length(route, self.points),
+                        pick_path.route_length(sorted(self.points), self.points))
+
+    def test03_largest_gap_skips_largest_gap(self):
+        """ Test that the largest gap route does not walk the largest gap of
+            the middle aisles
+        """
+        points = dict(self.points)
+        points.update({'C1': (5, 1, 0), 'C3': (5, 9, 0)})
+        # Aisle B has its largest gap between B2 and B3
+        points['B2'] = (3, 2, 0)
+        route = pick_path.largest_gap(points)
+        self.assertEqual(
+            route, ['A1', 'A2', 'A3', 'B3', 'C3', 'C1', 'B1', 'B2'])
+
+    def test04_two_opt_removes_crossings(self):
+        """ Test that two_opt shortens a route that crosses itself """
+        route = ['A1', 'B3', 'A3', 'B1']
+        improved = pick_path.two_opt(route, self.points)
+        self.assertLess(pick_path.route_length(improved, self.points),
+                        pick_path.route_length(route, self.points))
+
+    def test05_get_pick_path_orders_locations(self):
+        """ Test that get_pick_path returns the locations in route order """
+        self.test_location_01.write({'posx': 3, 'posy': 1})
+        self.test_location_02.write({'posx': 1, 'posy': 1})
+        route = self.test_locations.get_pick_path('s_shape')
+        self.assertEqual(route.ids,
+                         [self.test_location_02.id, self.test_location_01.id])
+
+    def test06_task_grouping_follows_pick_path(self):
+        """ Test that the tasks of a batch follow the pick path of the
+            picking type
+        """
+        Package = self.env['stock.quant.package']
+        self.picking_type_pick.u_pick_path_strategy = 's_shape'
+        self.test_location_01.write({'posx': 3, 'posy': 1})
+        self.test_location_02.write({'posx': 1, 'posy': 1})
+
+        package_a = Package.get_package('test_package_a', create=True)
+        package_b = Package.get_package('test_package_b', create=True)
+        self.create_quant(self.apple.id, self.test_location_01.id, 4,
+                          package_id=package_a.id)
+        self.create_quant(self.banana.id, self.test_location_02.id, 4,
+                          package_id=package_b.id)
+        products_info = [{'product': self.apple, 'qty': 4},
+                         {'product': self.banana, 'qty': 4}]
+        picking = self.create_picking(self.picking_type_pick,
+                                      products_info=products_info,
+                                      confirm=True,
+                                      assign=True)
+        batch = self.create_batch(user=self.outbound_user)
+        picking.batch_id = batch.id
+
+        task = batch.get_next_task()
+        self.assertEqual(task['package_id']['name'], 'test_package_b')
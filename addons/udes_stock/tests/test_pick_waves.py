@@ -0,0 +1,63 @@
+# -*- coding: utf-8 -*-
+
+from . import common
+
+
+class TestPickWaves(common.BaseUDES):
+
+    @classmethod
+    def setUpClass(cls):
+        super(TestPickWaves, cls).setUpClass()
+        cls.picking_type_pick.write({'u_build_waves': True,
+                                     'u_wave_max_pickings': 2,
+                                     'u_wave_max_lines': 0})
+
+        cls.create_quant(cls.apple.id, cls.test_location_01.id, 10)
+        cls.create_quant(cls.banana.id, cls.test_location_02.id, 10)
+
+        apple_info = [{'product': cls.apple, 'qty': 2}]
+        banana_info = [{'product': cls.banana, 'qty': 2}]
+        cls.picking_01 = cls.create_picking(cls.picking_type_pick,
+                                            products_info=apple_info,
+                                            confirm=True, assign=True)
+        cls.picking_02 = cls.create_picking(cls.picking_type_pick,
+                                            products_info=banana_info,
+                                            confirm=True, assign=True)
+        cls.picking_03 = cls.create_picking(cls.picking_type_pick,
+                                            products_info=apple_info,
+                                            confirm=True, assign=True)
+        cls.pickings = cls.picking_01 | cls.picking_02 | cls.picking_03
+
+    def test01_plan_waves_groups_shared_locations(self):
+        """ Pickings picking from the same locations share a wave """
+        Batch = self.env['stock.picking.batch']
+        waves = Batch._plan_waves(self.picking_type_pick, self.pickings)
+        self.assertEqual(waves, [self.picking_01 | self.picking_03,
+                                 self.picking_02])
+
+    def test02_plan_waves_respects_line_limit(self):
+        """ A wave never has more move lines than the picking type allows """
+        Batch = self.env['stock.picking.batch']
+        self.picking_type_pick.u_wave_max_lines = 1
+        waves = Batch._plan_waves(self.picking_type_pick, self.pickings)
+        self.assertEqual(waves, [self.picking_01, self.picking_02,
+                                 self.picking_03])
+
+    def test03_plan_waves_respects_priority(self):
+        """ Pickings of different priorities are not in the same wave, and
+            the waves of higher priority come first
+        """
+        Batch = self.env['stock.picking.batch']
+        self.picking_03.priority = '2'
+        waves = Batch._plan_waves(self.picking_type_pick, self.pickings)
+        self.assertEqual(waves, [self.picking_03,
+                                 self.picking_01 | self.picking_02])
+
+    def test04_build_waves_creates_ready_batches(self):
+        """ build_waves batches the pickings into ready batches """
+        Batch = self.env['stock.picking.batch']
+        batches = Batch.build_waves()
+        self.assertEqual(len(batches), 2)
+        self.assertEqual(batches.mapped('picking_ids'), self.pickings)
+        self.assertEqual(set(batches.mapped('state')), {'ready'})
+        self.assertFalse(batches.mapped('user_id'))
@@ -167,3 +167,77 @@ class TestGoodsInPicking(common.BaseUDES):
         _, pick = self.generate_picks_and_pallets_for_check_entire_pack()
         pick._check_entire_pack()
         self.assertFalse(pick.move_line_ids.u_result_parent_package_id)
+
+    def test13_get_info_shares_related_info(self):
+        """
+            Test that get_info prepares the info of related records shared
+            by several moves only once, and returns independent copies
+        """
+        products_info = [{'product': self.apple, 'qty': 5},
+                         {'product': self.banana, 'qty': 5}]
+        pick = self.create_picking(self.picking_type_in,
+                                   products_info=products_info,
+                                   confirm=True)
+        info = pick.get_info()[0]
+        moves_info = info['moves_lines']
+        self.assertEqual(len(moves_info), 2)
+        self.assertEqual(moves_info[0]['location_id'],
+                         moves_info[1]['location_id'])
+        self.assertIsNot(moves_info[0]['location_id'],
+                         moves_info[1]['location_id'])
+        self.assertEqual(moves_info[0]['location_id'],
+                         pick.location_id.get_info()[0])
+
+    def test14_get_info_nested_fields(self):
+        """ Tests get_info requesting nested fields of the moves """
+        fields_to_fetch = ['id',
+                           'moves_lines.product_id.barcode',
+                           'moves_lines.location_id.name']
+        info = self.test_picking.get_info(fields_to_fetch=fields_to_fetch)
+        self.assertEqual(sorted(info[0].keys()), ['id', 'moves_lines'])
+        move_info = info[0]['moves_lines'][0]
+        self.assertEqual(sorted(move_info.keys()),
+                         ['location_id', 'product_id'])
+        self.assertEqual(move_info['product_id'],
+                         {'barcode': self.apple.barcode})
+        self.assertEqual(move_info['location_id'],
+                         {'name': self.test_picking.location_id.name})
+
+    def test15_get_info_full_and_nested_fields(self):
+        """ Tests that a field requested in full takes precedence over
+            nested paths of the same field
+        """
+        fields_to_fetch = ['moves_lines', 'moves_lines.product_id.barcode']
+        info = self.test_picking.get_info(fields_to_fetch=fields_to_fetch)
+        self.assertEqual(info[0]['moves_lines'],
+                         self.test_picking.move_lines.get_info())
+
+    def test16_get_pickings_page(self):
+        """ Tests that get_pickings_page returns the pickings of
+            get_pickings one page at a time
+        """
+        products_info = [{'product': self.apple, 'qty': 1}]
+        for _i in range(2):
+            self.create_picking(self.picking_type_in,
+                                origin="test_picking_origin",
+                                products_info=products_info,
+                                confirm=True)
+        expected = self.SudoPicking.get_pickings(origin="test_picking_origin")
+        self.assertEqual(len(expected), 3)
+
+        first, cursor = self.SudoPicking.get_pickings_page(
+            2, origin="test_picking_origin")
+        self.assertEqual(first, expected[:2])
+        self.assertTrue(cursor)
+
+        second, cursor = self.SudoPicking.get_pickings_page(
+            2, cursor=cursor, origin="test_picking_origin")
+        self.assertEqual(second, expected[2:])
+        self.assertIsNone(cursor)
+
+    def test17_get_pickings_page_invalid_cursor(self):
+        """ Tests that get_pickings_page rejects a malformed cursor """
+        with self.assertRaises(ValidationError) as e:
+            self.SudoPicking.get_pickings_page(
+                2, cursor='DUMMY', origin="test_picking_origin")
+        self.assertEqual(e.exception.name, 'Invalid cursor: DUMMY')
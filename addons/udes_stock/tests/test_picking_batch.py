@@ -834,6 +834,56 @@ class TestGoodsInPickingBatch(common.BaseUDES):
         self.assertEqual(len(inv_picking.move_line_ids), 1)
         self.assertEqual(inv_picking.move_line_ids[0].product_qty, 3)
 
+    def test28_drop_off_async_frees_user(self):
+        """
+        Dropping off the pickings of a picking type that validates
+        asynchronously queues their validation, and the user can create a
+        new batch before the job is run.
+
+        """
+        Batch = self.env['stock.picking.batch']
+        Package = self.env['stock.quant.package']
+        Batch = Batch.sudo(self.outbound_user)
+
+        self.picking_type_pick.u_validate_async = True
+        self.create_quant(self.apple.id, self.test_location_01.id, 4,
+                          package_id=self.package_one.id)
+        picking = self.create_picking(self.picking_type_pick,
+                                      products_info=self.pack_4apples_info,
+                                      confirm=True,
+                                      assign=True)
+        batch = Batch.create_batch(self.picking_type_pick.id, None)
+        for ml in picking.move_line_ids:
+            ml.qty_done = ml.product_qty
+
+        batch.drop_off_picked(continue_batch=True,
+                              move_line_ids=None,
+                              location_barcode=self.test_output_location_01.name,
+                              result_package_name=None)
+
+        # The picking waits for the job in the batch, which is not running
+        job = batch.u_validation_job_ids
+        self.assertEqual(job.state, 'queued')
+        self.assertEqual(job.picking_ids, picking)
+        self.assertEqual(batch.picking_ids, picking)
+        self.assertEqual(picking.state, 'assigned')
+        self.assertNotEqual(batch.state, 'in_progress')
+        self.assertFalse(Batch.get_user_batches())
+
+        other_pack = Package.get_package("test_other_package", create=True)
+        self.create_quant(self.apple.id, self.test_location_01.id, 4,
+                          package_id=other_pack.id)
+        other_picking = self.create_picking(self.picking_type_pick,
+                                            products_info=self.pack_4apples_info,
+                                            confirm=True,
+                                            assign=True)
+        new_batch = Batch.create_batch(self.picking_type_pick.id, None)
+        self.assertEqual(new_batch.picking_ids, other_picking)
+
+        job._run()
+        self.assertEqual(picking.state, 'done')
+        self.assertEqual(batch.state, 'done')
+
 
 class TestPickingBatchDisabledUnpickableItems(common.BaseUDES):
 
@@ -932,6 +982,50 @@ class TestBatchGetNextTask(common.BaseUDES):
         # In the same way, we should now get '10'
         self.assertEqual(task['package_id']['name'], '10')
 
+    def test02_task_queue_is_updated_when_lines_are_picked(self):
+        """ Ensure that the task queue of the batch skips the picked move
+            lines and is rebuilt when move lines are added
+        """
+        Package = self.env['stock.quant.package']
+        package_a = Package.get_package("1", create=True)
+        package_b = Package.get_package("2", create=True)
+
+        self.create_quant(self.apple.id, self.test_location_01.id, 4,
+                          package_id=package_a.id)
+        self.create_quant(self.banana.id, self.test_location_02.id, 4,
+                          package_id=package_b.id)
+        picking = self.create_picking(self.picking_type_pick,
+                                      products_info=self.pack_2prods_info,
+                                      confirm=True,
+                                      assign=True)
+        batch = self.create_batch(user=self.outbound_user)
+        picking.batch_id = batch.id
+        self.assertFalse(any(picking.move_line_ids.mapped('u_task_sequence')))
+
+        task = batch.get_next_task()
+        self.assertEqual(
+            sorted(picking.move_line_ids.mapped('u_task_sequence')), [1, 2])
+        self.assertEqual(task['num_tasks_to_pick'], 2)
+        self.assertFalse(task['tasks_picked'])
+
+        first_mls = picking.move_line_ids.browse(task['move_line_ids'])
+        for ml in first_mls:
+            ml.qty_done = ml.product_uom_qty
+
+        task = batch.get_next_task()
+        self.assertEqual(task['num_tasks_to_pick'], 1)
+        self.assertTrue(task['tasks_picked'])
+        self.assertEqual(
+            task['move_line_ids'],
+            (picking.move_line_ids - first_mls).ids)
+
+        # Removing the picking from the batch takes its lines out of the
+        # queue
+        picking.batch_id = False
+        self.assertFalse(any(picking.move_line_ids.mapped('u_task_sequence')))
+        task = batch.get_next_task()
+        self.assertEqual(task['move_line_ids'], [])
+
 
 class TestBatchAddRemoveWork(common.BaseUDES):
 
@@ -1373,6 +1467,37 @@ class TestBatchState(common.BaseUDES):
         self.batch01._compute_state()
         self.assertEqual(self.batch01.state, 'done')
 
+    def test13_assign_batch_filters_picking_types(self):
+        """ Test that assign_batch only assigns ready batches with pickings
+            of the requested picking type
+        """
+        Batch = self.env['stock.picking.batch']
+        self.draft_to_ready()
+        self.assertEqual(self.batch01.state, 'ready')
+
+        Batch = Batch.sudo(self.outbound_user)
+        self.assertIsNone(Batch.assign_batch(self.picking_type_internal.id))
+
+        batch = Batch.assign_batch(self.picking_type_pick.id)
+        self.assertEqual(batch, self.batch01)
+        self.assertEqual(batch.user_id, self.outbound_user)
+        self.assertEqual(batch.state, 'in_progress')
+
+    def test14_picking_state_counts(self):
+        """ Test that the picking state counts follow the state of the
+            pickings of the batch
+        """
+        self.assertEqual(self.batch01.u_num_unready_pickings, 1)
+        self.assertEqual(self.batch01.u_num_ready_pickings, 0)
+
+        self.draft_to_ready()
+        self.assertEqual(self.batch01.u_num_unready_pickings, 0)
+        self.assertEqual(self.batch01.u_num_ready_pickings, 1)
+
+        self.picking02.batch_id = self.batch01
+        self.assertEqual(self.batch01.u_num_unready_pickings, 1)
+        self.assertEqual(self.batch01.u_num_done_pickings, 0)
+
 
 class TestBatchMultiDropOff(common.BaseUDES):
 
@@ -630,3 +630,151 @@ class TestPickingType(common.BaseUDES):
         picking.move_line_ids.write({
             'location_dest_id': self.test_location_02.id
         })
+
+    def test20_location_occupancy(self):
+        """Check the stored occupancy of a location follows its quants and
+           the move lines of available pickings dropping off in it
+        """
+        self.picking_type_putaway.write({
+            'u_drop_location_policy': 'by_height_speed',
+            'u_drop_location_preprocess': True,
+        })
+        self.assertFalse(self.test_location_01.u_occupied)
+        self.assertEqual(self.test_location_01.u_quant_count, 0)
+
+        self.create_quant(
+            self.apple.id,
+            self.picking_type_putaway.default_location_src_id.id,
+            4,
+            package_id=self.package_one.id,
+        )
+        picking = self.create_picking(
+            self.picking_type_putaway,
+            products_info=self.pack_4apples_info,
+            confirm=True,
+            assign=True,
+        )
+        self.assertEqual(picking.move_line_ids.location_dest_id,
+                         self.test_location_01)
+        self.assertEqual(self.test_location_01.u_incoming_move_line_count, 1)
+        self.assertTrue(self.test_location_01.u_occupied)
+
+        self.create_quant(self.banana.id, self.test_location_02.id, 3)
+        self.assertEqual(self.test_location_02.u_quant_count, 1)
+        self.assertTrue(self.test_location_02.u_occupied)
+        self.assertNotIn(self.test_location_02, picking.get_empty_locations())
+
+    def test21_held_suggested_locations(self):
+        """Check a suggested location is held for the picking it is
+           suggested to, and released when the picking is cancelled
+        """
+        self.picking_type_putaway.write({
+            'u_drop_location_policy': 'by_height_speed',
+            'u_drop_location_hold_ttl': 60,
+        })
+        self.test_location_02.write(self.short_slow)
+
+        for package in (self.package_one, self.package_two):
+            self.create_quant(
+                self.apple.id,
+                self.picking_type_putaway.default_location_src_id.id,
+                4,
+                package_id=package.id,
+            )
+        picking1 = self.create_picking(
+            self.picking_type_putaway,
+            products_info=self.pack_4apples_info,
+            confirm=True,
+            assign=True,
+        )
+        picking2 = self.create_picking(
+            self.picking_type_putaway,
+            products_info=self.pack_4apples_info,
+            confirm=True,
+            assign=True,
+        )
+
+        location1 = picking1.get_suggested_locations(
+            picking1.move_line_ids, hold=True)
+        location2 = picking2.get_suggested_locations(
+            picking2.move_line_ids, hold=True)
+        self.assertEqual(len(location1), 1)
+        self.assertEqual(len(location2), 1)
+        self.assertNotEqual(location1, location2)
+        self.assertEqual(
+            picking1.get_suggested_locations(
+                picking1.move_line_ids, hold=True),
+            location1)
+
+        picking1.action_cancel()
+        self.assertFalse(self.env['stock.location.hold'].search(
+            [('picking_id', '=', picking1.id)]))
+
+    def test22_occupancy_only_changes_with_its_counts(self):
+        """Check the occupancy date of a location only changes when its
+           counts change, and that Input locations are not counted, also
+           after the Input location of a picking type is changed
+        """
+        self.create_quant(self.apple.id, self.test_location_01.id, 4)
+        date_changed = self.test_location_01.u_date_occupancy_changed
+        self.assertTrue(date_changed)
+
+        self.test_location_01.quant_ids.write({'quantity': 2})
+        self.test_location_01.modified(['quant_ids'])
+        self.assertEqual(self.test_location_01.u_date_occupancy_changed,
+                         date_changed)
+        self.assertEqual(self.test_location_01.u_quant_count, 1)
+
+        self.create_quant(self.apple.id, self.received_location.id, 4)
+        self.assertEqual(self.received_location.u_quant_count, 0)
+        self.assertFalse(self.received_location.u_occupied)
+
+        # The cached Input and Output locations follow the picking types
+        self.picking_type_in.default_location_dest_id = self.test_location_02
+        self.create_quant(self.apple.id, self.test_location_02.id, 4)
+        self.assertEqual(self.test_location_02.u_quant_count, 0)
+
+    def test23_validation_does_not_hold_locations(self):
+        """Check validating a drop off location does not hold it, and that
+           a location held for another picking is not a valid drop off
+        """
+        LocationHold = self.env['stock.location.hold']
+
+        self.picking_type_putaway.write({
+            'u_drop_location_policy': 'by_height_speed',
+            'u_drop_location_constraint': 'enforce',
+            'u_drop_location_hold_ttl': 60,
+        })
+        self.test_location_02.write(self.short_slow)
+
+        for package in (self.package_one, self.package_two):
+            self.create_quant(
+                self.apple.id,
+                self.picking_type_putaway.default_location_src_id.id,
+                4,
+                package_id=package.id,
+            )
+        picking1, picking2 = [
+            self.create_picking(
+                self.picking_type_putaway,
+                products_info=self.pack_4apples_info,
+                confirm=True,
+                assign=True,
+            )
+            for _i in range(2)
+        ]
+
+        candidates = picking2.get_suggested_locations(picking2.move_line_ids)
+        self.assertEqual(len(candidates), 2)
+        picking2.move_line_ids._validate_location_dest(candidates[0])
+        self.assertFalse(LocationHold.search(
+            [('picking_id', 'in', (picking1 | picking2).ids)]))
+
+        location1 = picking1.get_suggested_locations(
+            picking1.move_line_ids, hold=True)
+        picking1.move_line_ids._validate_location_dest(location1)
+        with self.assertRaises(ValidationError) as e:
+            picking2.move_line_ids._validate_location_dest(location1)
+        self.assertEqual(
+            e.exception.name,
+            'Drop off location must be one of the suggested locations')
@@ -0,0 +1,108 @@
+# -*- coding: utf-8 -*-
+
+from . import common
+
+
+class TestReservationTrigger(common.BaseUDES):
+
+    @classmethod
+    def setUpClass(cls):
+        super(TestReservationTrigger, cls).setUpClass()
+        Package = cls.env['stock.quant.package']
+
+        cls.package = Package.get_package('test_package', create=True)
+        cls.create_quant(cls.apple.id, cls.received_location.id, 3,
+                         package_id=cls.package.id)
+        create_info = [{'product': cls.apple, 'qty': 3}]
+        cls.putaway = cls.create_picking(cls.picking_type_putaway,
+                                         products_info=create_info,
+                                         confirm=True,
+                                         assign=True)
+
+    def _validate_putaway(self):
+        self.putaway.update_picking(package_name=self.package.name,
+                                    location_dest_id=self.test_location_02.id)
+        self.putaway.update_picking(validate=True)
+
+    def test01_no_trigger_without_reserve_on_arrival(self):
+        """ Stock arriving does not queue triggers when no picking type
+            reserves on stock arrival
+        """
+        Trigger = self.env['stock.reservation.trigger']
+
+        self._validate_putaway()
+        self.assertEqual(self.putaway.state, 'done')
+        self.assertFalse(Trigger.search([]))
+
+    def test02_trigger_queued_on_arrival(self):
+        """ Stock arriving at an internal location queues a trigger for
+            the product and location
+        """
+        Trigger = self.env['stock.reservation.trigger']
+        self.picking_type_pick.u_reserve_on_stock_arrival = True
+
+        self._validate_putaway()
+        self.assertEqual(self.putaway.state, 'done')
+        triggers = Trigger.search([('product_id', '=', self.apple.id)])
+        self.assertEqual(len(triggers), 1)
+        self.assertEqual(triggers.location_id, self.test_location_02)
+
+    def test03_process_triggers_reserves_waiting_picking(self):
+        """ Processing the triggers reserves the confirmed pickings that
+            need the products that arrived, and deletes the triggers
+        """
+        Trigger = self.env['stock.reservation.trigger']
+        self.picking_type_pick.u_reserve_on_stock_arrival = True
+        self.picking_type_pick.u_num_reservable_pickings = -1
+
+        pick = self.create_picking(self.picking_type_pick,
+                                   products_info=[{'product': self.apple,
+                                                   'qty': 3}],
+                                   confirm=True)
+        self.assertEqual(pick.state, 'confirmed')
+
+        self._validate_putaway()
+        self.assertTrue(Trigger.search([('product_id', '=', self.apple.id)]))
+
+        # Do not commit the reservation of the test transaction
+        Trigger.with_context(reservation_dry_run=True).process_triggers()
+
+        self.assertEqual(pick.state, 'assigned')
+        self.assertEqual(pick.move_line_ids.location_id,
+                         self.test_location_02)
+        self.assertFalse(Trigger.search([]))
+
+    def test04_triggers_share_the_cycle_budget(self):
+        """ Processing the triggers does not reserve more pickings than the
+            last reservation cycle left to reserve
+        """
+        Trigger = self.env['stock.reservation.trigger']
+        self.picking_type_pick.write({
+            'u_reserve_on_stock_arrival': True,
+            'u_num_reservable_pickings': 1,
+        })
+        self.picking_type_pick.sudo().u_num_reserved_in_cycle = 1
+
+        pick = self.create_picking(self.picking_type_pick,
+                                   products_info=[{'product': self.apple,
+                                                   'qty': 3}],
+                                   confirm=True)
+        self._validate_putaway()
+
+        Trigger.with_context(reservation_dry_run=True).process_triggers()
+
+        self.assertEqual(pick.state, 'confirmed')
+        self.assertFalse(Trigger.search([]))
+
+    def test05_trigger_queued_once(self):
+        """ Stock arriving again at a location before the triggers are
+            processed does not queue another trigger
+        """
+        Trigger = self.env['stock.reservation.trigger']
+        self.picking_type_pick.u_reserve_on_stock_arrival = True
+
+        self._validate_putaway()
+        Trigger.queue_move_lines(self.putaway.move_line_ids)
+
+        triggers = Trigger.search([('product_id', '=', self.apple.id)])
+        self.assertEqual(len(triggers), 1)
@@ -0,0 +1,159 @@
+# -*- coding: utf-8 -*-
+
+import time
+from unittest.mock import patch
+
+from . import common
+from ..models.stock_picking import RESERVATION_LOCK_NAMESPACE
+
+
+class TestReserveStock(common.BaseUDES):
+
+    @classmethod
+    def setUpClass(cls):
+        super(TestReserveStock, cls).setUpClass()
+        cls.picking_type_pick.u_num_reservable_pickings = -1
+        cls.products_info = [{'product': cls.apple, 'qty': 2}]
+
+    def _create_picks(self, n):
+        Picking = self.env['stock.picking']
+
+        picks = Picking.browse()
+        for _i in range(n):
+            picks |= self.create_picking(self.picking_type_pick,
+                                         products_info=self.products_info,
+                                         confirm=True)
+        return picks
+
+    def test01_shard_skipped_when_locked(self):
+        """ A picking type is not reserved while another worker holds its
+            advisory lock
+        """
+        Picking = self.env['stock.picking']
+
+        self.create_quant(self.apple.id, self.test_location_01.id, 2)
+        pick = self._create_picks(1)
+
+        lock_key = (RESERVATION_LOCK_NAMESPACE, self.picking_type_pick.id)
+        with self.registry.cursor() as other_cr:
+            other_cr.execute("SELECT pg_advisory_lock(%s, %s)", lock_key)
+            reserved = Picking.with_context(
+                reservation_dry_run=True
+            )._reserve_stock_shard(self.picking_type_pick)
+            other_cr.execute("SELECT pg_advisory_unlock(%s, %s)", lock_key)
+
+        self.assertFalse(reserved)
+        self.assertEqual(pick.state, 'confirmed')
+
+        reserved = Picking.with_context(
+            reservation_dry_run=True
+        )._reserve_stock_shard(self.picking_type_pick)
+        self.assertTrue(reserved)
+        self.assertEqual(pick.state, 'assigned')
+
+    def test02_candidates_span_several_pages(self):
+        """ All the confirmed pickings are yielded in order when there are
+            more of them than the page size
+        """
+        Picking = self.env['stock.picking']
+        self.picking_type_pick.u_reservation_page_size = 2
+
+        picks = self._create_picks(5)
+
+        candidates = Picking.browse()
+        for picking in Picking._iter_reservation_candidates(
+                self.picking_type_pick):
+            candidates |= picking
+        self.assertEqual(candidates & picks, picks)
+        self.assertEqual((candidates & picks).ids,
+                         Picking.search([('id', 'in', picks.ids)]).ids)
+
+    def test03_unsatisfiable_picking_skipped(self):
+        """ A picking that cannot be reserved with the stock available is
+            reported without trying to reserve it
+        """
+        Picking = self.env['stock.picking']
+        Move = self.env['stock.move']
+
+        pick = self._create_picks(1)
+
+        with patch.object(type(Move), '_action_assign') as action_assign:
+            report = Picking.with_context(
+                reservation_dry_run=True
+            )._reserve_stock_for_picking_type(self.picking_type_pick)
+
+        action_assign.assert_not_called()
+        self.assertIn((pick.ids, 'Not enough stock available.'),
+                      report['failures'])
+        self.assertEqual(pick.state, 'confirmed')
+
+    def test04_deadline_stops_reservation(self):
+        """ Reservation stops once the deadline has passed, which is
+            recorded in the statistics of the run
+        """
+        Picking = self.env['stock.picking']
+        Stat = self.env['stock.reservation.stat']
+
+        self.create_quant(self.apple.id, self.test_location_01.id, 2)
+        pick = self._create_picks(1)
+
+        with patch.object(self.env.cr, 'commit'):
+            report = Picking._reserve_stock_for_picking_type(
+                self.picking_type_pick, deadline=time.time() - 1)
+
+        self.assertEqual(report['picking_ids'], [])
+        self.assertEqual(pick.state, 'confirmed')
+        stat = Stat.search(
+            [('picking_type_id', '=', self.picking_type_pick.id)])
+        self.assertEqual(len(stat), 1)
+        self.assertTrue(stat.deadline_reached)
+
+    def test05_one_stat_per_run(self):
+        """ Each reservation run of a picking type records one statistics
+            row
+        """
+        Picking = self.env['stock.picking']
+        Stat = self.env['stock.reservation.stat']
+
+        self.create_quant(self.apple.id, self.test_location_01.id, 4)
+        picks = self._create_picks(2)
+
+        with patch.object(self.env.cr, 'commit'):
+            Picking._reserve_stock_for_picking_type(self.picking_type_pick)
+            Picking._reserve_stock_for_picking_type(self.picking_type_pick)
+
+        self.assertEqual(set(picks.mapped('state')), {'assigned'})
+        stats = Stat.search(
+            [('picking_type_id', '=', self.picking_type_pick.id)])
+        self.assertEqual(len(stats), 2)
+        self.assertEqual(sorted(stats.mapped('num_reserved')), [0, 2])
+        self.assertFalse(any(stats.mapped('deadline_reached')))
+
+    def test06_retry_wait_is_bounded(self):
+        """ The wait before a retry is never longer than the backoff of the
+            picking type doubled for each try, up to 30 times the backoff
+        """
+        Picking = self.env['stock.picking']
+        self.picking_type_pick.u_reservation_backoff = 0.5
+
+        for tries, bound in [(1, 0.5), (2, 1.0), (3, 2.0), (10, 15.0)]:
+            wait = Picking._get_reservation_retry_wait(
+                self.picking_type_pick, tries)
+            self.assertTrue(0 <= wait <= bound)
+
+    def test07_changed_candidates_not_yielded(self):
+        """ Pickings of a page fetched before they were cancelled are not
+            yielded
+        """
+        Picking = self.env['stock.picking']
+
+        picks = self._create_picks(3)
+
+        candidates = Picking._iter_reservation_candidates(
+            self.picking_type_pick)
+        first = next(candidates)
+        (picks - first)[0].action_cancel()
+        remaining = Picking.browse()
+        for picking in candidates:
+            remaining |= picking
+        self.assertEqual(remaining & picks, (picks - first)[1:])
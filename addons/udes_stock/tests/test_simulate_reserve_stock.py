@@ -0,0 +1,51 @@
+# -*- coding: utf-8 -*-
+
+from . import common
+
+
+class TestSimulateReserveStock(common.BaseUDES):
+
+    @classmethod
+    def setUpClass(cls):
+        super(TestSimulateReserveStock, cls).setUpClass()
+        cls.picking_type_pick.u_num_reservable_pickings = -1
+        cls.products_info = [{'product': cls.apple, 'qty': 10}]
+
+    def _simulate(self):
+        Picking = self.env['stock.picking']
+        res = Picking.simulate_reserve_stock(
+            picking_type_ids=self.picking_type_pick.ids)
+        return res[self.picking_type_pick.id]
+
+    def test01_reports_reservable_pickings(self):
+        """ The simulation reports the pickings that would be reserved
+            without reserving them
+        """
+        self.create_quant(self.apple.id, self.test_location_01.id, 10)
+        pick = self.create_picking(self.picking_type_pick,
+                                   products_info=self.products_info,
+                                   confirm=True)
+
+        info = self._simulate()
+        self.assertEqual(info['num_pickings'], 1)
+        self.assertEqual(info['pickings'], [pick.name])
+        self.assertEqual(info['failures'], [])
+        self.assertIn('assign', info['timings'])
+        self.assertIn('search', info['timings'])
+        self.assertEqual(pick.state, 'confirmed')
+        self.assertFalse(pick.move_line_ids)
+
+    def test02_reports_failures(self):
+        """ The simulation reports the pickings that would not be reserved
+            and why
+        """
+        pick = self.create_picking(self.picking_type_pick,
+                                   products_info=self.products_info,
+                                   confirm=True)
+
+        info = self._simulate()
+        self.assertEqual(info['num_pickings'], 0)
+        self.assertEqual(len(info['failures']), 1)
+        self.assertEqual(info['failures'][0]['pickings'], [pick.name])
+        self.assertTrue(info['failures'][0]['reason'])
+        self.assertEqual(pick.state, 'confirmed')
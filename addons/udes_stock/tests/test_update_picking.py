@@ -862,3 +862,34 @@ class TestUpdatePickingMarksMoveLinesAsDone(common.BaseUDES):
                                    location_dest_id=self.test_location_01.id)
 
         self.assertEqual(e_2.exception.name, err)
+
+    def test04_mark_as_done_splits_partially_done_move_lines(self):
+        """ Marking as done part of the quantity of several move lines
+            updates all of them and splits the partially done one.
+        """
+        self.create_quant(self.apple.id, self.test_location_01.id, 4)
+        self.create_quant(self.apple.id, self.test_location_02.id, 4)
+        create_info = [{'product': self.apple, 'qty': 8}]
+
+        picking = self.create_picking(self.picking_type_pick,
+                                      products_info=create_info,
+                                      confirm=True,
+                                      assign=True)
+        picking = picking.sudo(self.outbound_user)
+        self.assertEqual(len(picking.move_line_ids), 2)
+
+        mls_done = picking.move_line_ids.mark_as_done(
+            location_dest=self.test_output_location_01.id,
+            product_ids=[{'barcode': self.apple.barcode, 'qty': 6}])
+
+        self.assertEqual(len(mls_done), 2)
+        self.assertEqual(sum(mls_done.mapped('qty_done')), 6)
+        self.assertEqual(mls_done.mapped('qty_done'),
+                         mls_done.mapped('product_uom_qty'))
+        self.assertEqual(mls_done.mapped('location_dest_id'),
+                         self.test_output_location_01)
+
+        remainder = picking.move_line_ids - mls_done
+        self.assertEqual(len(remainder), 1)
+        self.assertEqual(remainder.qty_done, 0)
+        self.assertEqual(remainder.product_uom_qty, 2)
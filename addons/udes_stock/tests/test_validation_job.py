@@ -0,0 +1,107 @@
+# -*- coding: utf-8 -*-
+
+from unittest.mock import patch
+
+from odoo import fields
+from odoo.exceptions import ValidationError
+
+from . import common
+from ..models.stock_validation_job import MAX_ATTEMPTS
+
+
+class TestValidationJob(common.BaseUDES):
+
+    @classmethod
+    def setUpClass(cls):
+        super(TestValidationJob, cls).setUpClass()
+        cls.picking_type_in.u_target_storage_format = 'product'
+        cls.picking_type_in.u_validate_async = True
+
+    def _create_picked_picking(self):
+        create_info = [{'product': self.apple, 'qty': 4}]
+        picking = self.create_picking(self.picking_type_in,
+                                      products_info=create_info,
+                                      confirm=True)
+        picking = picking.sudo(self.inbound_user)
+        product_ids = [{'barcode': self.apple.barcode, 'qty': 4}]
+        picking.update_picking(product_ids=product_ids)
+        return picking
+
+    def test01_update_picking_queues_validation(self):
+        """ Validating a picking of a picking type that validates
+            asynchronously queues a job, which validates the picking
+            when it is run.
+        """
+        picking = self._create_picked_picking()
+
+        job = picking.update_picking(validate=True)
+
+        self.assertEqual(job._name, 'stock.validation.job')
+        self.assertEqual(job.state, 'queued')
+        self.assertEqual(job.picking_ids, picking)
+        self.assertEqual(picking.state, 'assigned')
+
+        job._run()
+        self.assertEqual(job.state, 'done')
+        self.assertEqual(job.attempts, 1)
+        self.assertEqual(picking.state, 'done')
+
+        info = job.get_info()[0]
+        self.assertEqual(info['state'], 'done')
+        self.assertEqual(info['picking_ids'], picking.ids)
+
+    def test02_jobs_of_a_picking_run_in_order(self):
+        """ A job is not picked up while an older job of one of its
+            pickings is queued, but is once the older job has failed.
+        """
+        ValidationJob = self.env['stock.validation.job']
+
+        picking = self._create_picked_picking()
+        first = ValidationJob.enqueue(picking)
+        second = ValidationJob.enqueue(picking)
+
+        self.assertEqual(ValidationJob._get_next_job(), first)
+
+        first.write({'state': 'failed'})
+        self.assertEqual(ValidationJob._get_next_job(), second)
+
+    def test03_failed_job_is_retried_after_a_delay(self):
+        """ A job whose attempt fails is queued again, but not picked up
+            before its next attempt is due.
+        """
+        ValidationJob = self.env['stock.validation.job']
+        Picking = self.env['stock.picking']
+
+        picking = self._create_picked_picking()
+        job = ValidationJob.enqueue(picking)
+
+        with patch.object(type(Picking), 'action_done',
+                          side_effect=ValidationError('Cannot validate')):
+            self.assertFalse(job._run())
+        self.assertEqual(job.state, 'queued')
+        self.assertEqual(job.attempts, 1)
+        self.assertTrue(job.date_next_attempt > fields.Datetime.now())
+        self.assertFalse(ValidationJob._get_next_job())
+
+        job.date_next_attempt = fields.Datetime.now()
+        self.assertEqual(ValidationJob._get_next_job(), job)
+
+    def test04_failure_is_reported(self):
+        """ A job failing its last attempt is flagged as failed and the
+            failure is posted on its pickings.
+        """
+        ValidationJob = self.env['stock.validation.job']
+        Picking = self.env['stock.picking']
+
+        picking = self._create_picked_picking()
+        job = ValidationJob.enqueue(picking)
+        num_messages = len(picking.message_ids)
+
+        with patch.object(type(Picking), 'action_done',
+                          side_effect=ValidationError('Cannot validate')):
+            for _i in range(MAX_ATTEMPTS):
+                job._run()
+        self.assertEqual(job.state, 'failed')
+        self.assertEqual(job.attempts, MAX_ATTEMPTS)
+        self.assertEqual(len(picking.message_ids), num_messages + 1)
+        self.assertEqual(picking.state, 'assigned')